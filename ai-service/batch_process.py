@@ -0,0 +1,216 @@
+"""
+Batch replay / re-scoring of stored incidents without the HTTP service.
+
+The manifest is JSONL, one incident per line:
+    {"incidentId": "inc-1", "audioUrl": "https://...", "timestamp": 1700000000, "latitude": 28.6, "longitude": 77.2}
+"audioUrl" may also be a local file path (or use "audioPath").
+
+Results are appended to the output JSONL as each incident finishes (the IncidentOutput
+fields, or {"incidentId", "error"} on failure). The output doubles as the checkpoint:
+re-running with the same --output skips incidents that already have a result.
+
+Usage (from ai-service/):
+    python batch_process.py manifest.jsonl --output results.jsonl --workers 4 --prefetch 8
+    # after a crash or Ctrl-C, the same command resumes; add --retry-failed to redo errors
+
+Downloads and decoding of upcoming incidents overlap inference of the current ones
+(--prefetch), while --workers bounds how many incidents run the models at once, so
+concurrent threat classifications share the classifier's micro-batches. Set
+RESULT_CACHE_DIR so stages whose model version did not change are served from cache.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+from config import config
+from models.registry import ModelRegistry
+from utils.audio_loader import AsyncAudioLoader
+from utils.incident_pipeline import IncidentPipeline, load_pipeline_models
+from utils.incident_store import IncidentStore
+from utils.pipeline import PipelineExecutor
+from utils.resources import ResourceManager
+from utils.result_cache import ResultCache
+from utils.scheduler import IncidentScheduler
+from utils.worker_pool import pool_size
+
+logger = logging.getLogger("batch")
+
+def read_checkpoint(path: str, retry_failed: bool) -> set:
+    """incidentIds that already have a result in the output file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by a crash; that incident is re-run
+            if retry_failed and "error" in record:
+                continue
+            done.add(record.get("incidentId"))
+    return done
+
+def read_manifest(path: str):
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+                source = entry.get("audioUrl") or entry["audioPath"]
+                yield entry["incidentId"], source, entry
+            except (json.JSONDecodeError, KeyError) as e:
+                logger.error(f"Skipping manifest line {number}: {e}")
+
+class BatchStats:
+    def __init__(self, skipped: int):
+        self.started_at = time.time()
+        self.skipped = skipped
+        self.completed = 0
+        self.failed = 0
+        self.audio_sec = 0.0
+        self.stage_totals = {}
+
+    def record(self, result: dict):
+        if "error" in result:
+            self.failed += 1
+            return
+        self.completed += 1
+        details = result.get("details") or {}
+        self.audio_sec += details.get("audio_duration_sec", 0.0)
+        for stage, seconds in details.get("stage_timings", {}).items():
+            self.stage_totals[stage] = self.stage_totals.get(stage, 0.0) + seconds
+
+    def report(self) -> dict:
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        processed = self.completed + self.failed
+        return {
+            "processed": processed,
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped_from_checkpoint": self.skipped,
+            "elapsed_sec": round(elapsed, 1),
+            "incidents_per_sec": round(processed / elapsed, 3),
+            "audio_sec_per_sec": round(self.audio_sec / elapsed, 2),
+            "mean_stage_sec": {
+                stage: round(total / max(self.completed, 1), 3) for stage, total in self.stage_totals.items()
+            },
+        }
+
+async def run_batch(args) -> dict:
+    done = read_checkpoint(args.output, args.retry_failed)
+    logger.info(f"{len(done)} incidents already in {args.output}, skipping them")
+
+    # Each running incident has two stages in parallel (Whisper + stress) and every
+    # prefetched incident may be decoding, so size the thread pool for both
+    executor = PipelineExecutor(max(config.PIPELINE_MAX_WORKERS, 2 * args.workers + args.prefetch))
+    # As in the service: with a worker pool, Whisper is loaded by the workers only
+    registry = ModelRegistry(
+        exclude=("transcription",) if pool_size() else (),
+        skip_warmup=("threat",) if pool_size() else ()
+    )
+    # On the main thread, before any other thread starts, so the worker pool can fork
+    models, pool = load_pipeline_models(registry)
+    # Never shed or degrade a replay: the scheduler only bounds concurrent inference
+    scheduler = IncidentScheduler(max_concurrent=args.workers, queue_limit=sys.maxsize, degrade_depth=sys.maxsize)
+    resources = ResourceManager(budget_bytes=0)
+    pipeline = IncidentPipeline(
+        executor,
+        models["transcription"],
+        models["emotion"],
+        models["threat"],
+        scheduler,
+        voice_activity_detector=models["vad"],
+        result_cache=ResultCache() if config.RESULT_CACHE_ENABLED else None,
+        # A replay keeps its own history (never snapshotted) so it cannot overwrite the service's
+        incident_store=IncidentStore(path="") if config.INCIDENT_STORE_ENABLED else None,
+        # Pooled decode buffers and peak-memory reporting, but no budget: --prefetch bounds what is in flight
+        resources=resources,
+        mode="batch"
+    )
+
+    stats = BatchStats(skipped=len(done))
+    # Incidents in flight: up to --workers in the models plus --prefetch downloading/decoding ahead
+    in_flight = asyncio.Semaphore(args.workers + args.prefetch)
+    pending = set()
+
+    with open(args.output, "a") as out:
+        async def process(incident_id: str, source: str, entry: dict):
+            try:
+                output = await pipeline.run(
+                    incident_id, source, entry.get("latitude"), entry.get("longitude"), entry.get("timestamp")
+                )
+                result = json.loads(output.json())
+            except Exception as e:
+                logger.error(f"Incident {incident_id} failed: {e}")
+                result = {"incidentId": incident_id, "error": str(e)}
+            finally:
+                in_flight.release()
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            stats.record(result)
+
+        async def progress():
+            while True:
+                await asyncio.sleep(args.report_every)
+                report = stats.report()
+                logger.info(
+                    f"{report['processed']} processed ({report['failed']} failed), "
+                    f"{report['incidents_per_sec']} incidents/s, {report['audio_sec_per_sec']}x real time"
+                )
+
+        reporter = asyncio.create_task(progress())
+        try:
+            for incident_id, source, entry in read_manifest(args.manifest):
+                if incident_id in done:
+                    continue
+                done.add(incident_id)  # duplicate ids in the manifest run once
+                await in_flight.acquire()
+                task = asyncio.create_task(process(incident_id, source, entry))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+        finally:
+            reporter.cancel()
+            await AsyncAudioLoader.close()
+            if pool:
+                pool.shutdown()
+            executor.shutdown()
+
+    return {**stats.report(), "memory": resources.report()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("manifest", help="JSONL manifest of incidents")
+    parser.add_argument("--output", required=True, help="Results JSONL (appended to; also the resume checkpoint)")
+    parser.add_argument("--workers", type=int, default=config.SCHEDULER_MAX_CONCURRENT,
+                        help="Incidents running the models at once")
+    parser.add_argument("--prefetch", type=int, default=None,
+                        help="Extra incidents downloading/decoding ahead of inference (default: 2 x workers)")
+    parser.add_argument("--retry-failed", action="store_true", help="Re-run incidents whose result is an error")
+    parser.add_argument("--report-every", type=float, default=10.0, help="Seconds between progress lines")
+    parser.add_argument("--report", help="Write the final throughput report (JSON) to this file")
+    args = parser.parse_args()
+    args.prefetch = args.prefetch if args.prefetch is not None else 2 * args.workers
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # Per-stage pipeline logs would drown the progress lines
+    logging.getLogger("utils.incident_pipeline").setLevel(logging.WARNING)
+
+    report = asyncio.run(run_batch(args))
+    text = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(text)
+    print(text)
+    return 1 if report["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Shared benchmark audio: synthetic speech-like clips, recorded corpora on disk, and a
+local HTTP file server that stands in for the signed storage URLs.
+"""
+import functools
+import glob
+import http.server
+import os
+import threading
+
+import numpy as np
+
+from config import config
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".ogg", ".opus", ".flac", ".m4a", ".webm")
+
+def synthetic_clip(duration_sec: float, base_f0: float = 220.0, seed: int = 0):
+    """
+    Harmonic 'voice' with vibrato and pitch glides, interleaved with silent pauses and
+    background noise. Returns (waveform, per-sample ground-truth f0 with NaN for pauses).
+    """
+    rng = np.random.default_rng(seed)
+    sr = config.AUDIO_SAMPLE_RATE
+    n = int(duration_sec * sr)
+    t = np.arange(n) / sr
+    
+    f0 = base_f0 * (1.0 + 0.15 * np.sin(2 * np.pi * 0.3 * t)) * (1.0 + 0.02 * np.sin(2 * np.pi * 5.5 * t))
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    voice = sum((0.5 / k) * np.sin(k * phase) for k in range(1, 6))
+    
+    # ~1.5 s utterances separated by ~0.5 s pauses
+    voiced = (t % 2.0) < 1.5
+    envelope = np.where(voiced, 0.3, 0.0)
+    y = voice * envelope + 0.005 * rng.standard_normal(n)
+    
+    truth = np.where(voiced, f0, np.nan)
+    return y.astype(np.float32), truth
+
+def write_synthetic_corpus(directory: str, durations: list, formats: tuple = ("wav",)) -> list:
+    """Writes one synthetic clip per duration and format; returns [(name, path, duration_sec)]."""
+    import soundfile as sf
+    
+    os.makedirs(directory, exist_ok=True)
+    clips = []
+    for i, duration in enumerate(durations):
+        y, _ = synthetic_clip(duration, base_f0=180.0 + 40.0 * i, seed=i)
+        for fmt in formats:
+            name = f"synthetic_{duration:g}s.{fmt}"
+            path = os.path.join(directory, name)
+            if fmt == "ogg":
+                sf.write(path, y, config.AUDIO_SAMPLE_RATE, format="OGG", subtype="VORBIS")
+            else:
+                sf.write(path, y, config.AUDIO_SAMPLE_RATE)
+            clips.append((name, path, float(duration)))
+    return clips
+
+def recorded_corpus(directory: str) -> list:
+    """Lists recorded clips in a directory; returns [(name, path, duration_sec)]."""
+    from utils.audio_decoder import AudioDecoder
+    
+    clips = []
+    for path in sorted(glob.glob(os.path.join(directory, "*"))):
+        if path.lower().endswith(AUDIO_EXTENSIONS):
+            duration = AudioDecoder.duration_sec(AudioDecoder.decode(path))
+            clips.append((os.path.basename(path), path, round(duration, 2)))
+    return clips
+
+class LocalFileServer:
+    """Serves a directory over HTTP on a background thread (context manager)."""
+    def __init__(self, directory: str, port: int = 0):
+        handler = functools.partial(_QuietHandler, directory=directory)
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, name: str) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/{name}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
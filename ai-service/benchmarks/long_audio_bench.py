@@ -0,0 +1,120 @@
+"""
+Compares long-audio (chunked, parallel) transcription with the sequential path:
+wall-clock time and word-level agreement of the transcripts, per recording length
+and number of chunk workers.
+
+Recordings from --corpus are tiled (with short pauses) up to each --durations length,
+so a handful of real clips covers 1-5 minute incidents. Without --corpus, synthetic
+clips are used; they time the decoder but produce no words to compare.
+
+Usage (from ai-service/):
+    python benchmarks/long_audio_bench.py --corpus /data/sos_recordings --durations 60 120 300 --workers 2 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import recorded_corpus, synthetic_clip
+from config import config
+from utils.audio_decoder import AudioDecoder
+
+def tile(clip: np.ndarray, duration_sec: float, pause_sec: float = 0.7) -> np.ndarray:
+    """Repeats clip, separated by silence, to exactly duration_sec."""
+    sr = config.AUDIO_SAMPLE_RATE
+    piece = np.concatenate([clip, np.zeros(int(pause_sec * sr), dtype=np.float32)])
+    n = int(duration_sec * sr)
+    return np.tile(piece, n // len(piece) + 1)[:n]
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level edit distance divided by the reference length."""
+    ref, hyp = reference.lower().split(), hypothesis.lower().split()
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / len(ref)
+
+def timed_transcribe(service, audio: np.ndarray) -> tuple:
+    start = time.perf_counter()
+    result = service.transcribe(audio)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Directory of recorded clips")
+    parser.add_argument("--durations", type=float, nargs="+", default=[60, 120, 300])
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4], help="LONG_AUDIO_WORKERS values to try")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.corpus:
+        sources = [(name, AudioDecoder.decode(path)) for name, path, _ in recorded_corpus(args.corpus)]
+    else:
+        print("No --corpus given: synthetic clips have no words, agreement will be trivial", file=sys.stderr)
+        sources = [("synthetic", synthetic_clip(20.0)[0])]
+
+    rows = []
+    for workers in args.workers:
+        # Workers are fixed when the models load, so each setting gets its own service
+        config.LONG_AUDIO_WORKERS = workers
+        from models.transcription import TranscriptionService
+        service = TranscriptionService()
+        service.warmup()
+        long_min_sec = config.LONG_AUDIO_MIN_SEC
+
+        for name, clip in sources:
+            for duration in args.durations:
+                audio = tile(clip, duration)
+                config.LONG_AUDIO_MIN_SEC = float("inf")  # force the sequential path
+                sequential_sec, sequential = timed_transcribe(service, audio)
+                config.LONG_AUDIO_MIN_SEC = min(long_min_sec, duration - 1)
+                chunked_sec, chunked = timed_transcribe(service, audio)
+                config.LONG_AUDIO_MIN_SEC = long_min_sec
+
+                row = {
+                    "clip": name,
+                    "duration_sec": duration,
+                    "workers": workers,
+                    "chunks": chunked["chunks"],
+                    "sequential_sec": round(sequential_sec, 3),
+                    "chunked_sec": round(chunked_sec, 3),
+                    "speedup": round(sequential_sec / max(chunked_sec, 1e-9), 2),
+                    "words": len(sequential["text"].split()),
+                    "word_error_rate_vs_sequential": round(word_error_rate(sequential["text"], chunked["text"]), 4),
+                }
+                rows.append(row)
+                print(
+                    f"{name} {duration:>5.0f}s workers={workers} chunks={row['chunks']}  "
+                    f"seq={row['sequential_sec']:.2f}s chunked={row['chunked_sec']:.2f}s x{row['speedup']}  "
+                    f"wer={row['word_error_rate_vs_sequential']}",
+                    file=sys.stderr
+                )
+        service.chunk_executor.shutdown()
+
+    report = {
+        "benchmark": "long_audio",
+        "model": config.WHISPER_MODEL_SIZE,
+        "chunk_sec": config.LONG_AUDIO_CHUNK_SEC,
+        "overlap_sec": config.LONG_AUDIO_OVERLAP_SEC,
+        "cpu_count": os.cpu_count(),
+        "results": rows,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
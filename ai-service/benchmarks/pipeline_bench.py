@@ -0,0 +1,286 @@
+"""
+End-to-end and per-model performance benchmark for the SOS AI service.
+
+Drives each model class (TranscriptionService, AudioStressDetector, ThreatClassifier,
+FusionEngine) directly, then the full /process-incident pipeline in-process at several
+concurrency levels, with audio served from a local HTTP file server. Reports p50/p95/p99
+latency, throughput, peak RSS and per-stage breakdowns as JSON that can be diffed
+across commits with --compare.
+
+Usage (from ai-service/):
+    python benchmarks/pipeline_bench.py --durations 5 30 120 --concurrency 1 4 8 --output bench.json
+    python benchmarks/pipeline_bench.py --corpus /data/sos_recordings --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+# Every request must do real work: no result cache, no idempotent replays, and no threat
+# shortcuts (the synthetic clips repeat transcripts, which the text cache and index would answer)
+os.environ.setdefault("RESULT_CACHE_ENABLED", "False")
+os.environ.setdefault("THREAT_TEXT_CACHE_SIZE", "0")
+os.environ.setdefault("THREAT_INDEX_ENABLED", "False")
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import LocalFileServer, recorded_corpus, write_synthetic_corpus
+from config import config
+from models.fusion import FusionEngine
+from models.registry import ModelRegistry
+from utils.audio_decoder import AudioDecoder
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    arr = np.asarray(values, dtype=np.float64)
+    return {
+        "count": len(values),
+        "mean": round(float(arr.mean()), 4),
+        "p50": round(float(np.percentile(arr, 50)), 4),
+        "p95": round(float(np.percentile(arr, 95)), 4),
+        "p99": round(float(np.percentile(arr, 99)), 4),
+        "max": round(float(arr.max()), 4),
+    }
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+def bench_models(models: dict, clips: list, repeats: int) -> dict:
+    transcription = models["transcription"]
+    emotion = models["emotion"]
+    threat = models["threat"]
+    report = {}
+    
+    for name, path, duration in clips:
+        waveform = AudioDecoder.decode(path)
+        rows = {"decode": [], "transcription": [], "emotion": [], "threat": [], "fusion": []}
+        for _ in range(repeats):
+            latency, _ = timed(AudioDecoder.decode, path)
+            rows["decode"].append(latency)
+            latency, transcription_result = timed(transcription.transcribe, waveform)
+            rows["transcription"].append(latency)
+            latency, emotion_result = timed(emotion.analyze, waveform)
+            rows["emotion"].append(latency)
+            latency, threat_result = timed(threat.classify, transcription_result["text"])
+            rows["threat"].append(latency)
+            latency, _ = timed(
+                FusionEngine.compute_severity, emotion_result["stress_score"], threat_result
+            )
+            rows["fusion"].append(latency)
+        
+        report[name] = {
+            "duration_sec": duration,
+            "stages": {stage: percentiles(values) for stage, values in rows.items()},
+            "real_time_factor": {
+                stage: round(float(np.median(rows[stage])) / max(duration, 1e-9), 5)
+                for stage in ("decode", "transcription", "emotion")
+            },
+        }
+        print(f"[models] {name}: " + ", ".join(
+            f"{stage}={report[name]['stages'][stage]['p50']:.3f}s" for stage in rows
+        ), file=sys.stderr)
+    
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+async def bench_pipeline(models: dict, clips: list, server: LocalFileServer,
+                         concurrency_levels: list, requests_per_level: int) -> dict:
+    import httpx
+    import main
+    from utils.incident_pipeline import IncidentPipeline
+    from utils.pipeline import PipelineExecutor
+    
+    # Reuse the already-loaded models instead of running the startup event again
+    main.transcription_service = models["transcription"]
+    main.audio_stress_detector = models["emotion"]
+    main.threat_classifier = models["threat"]
+    main.pipeline_executor = PipelineExecutor()
+    main.incident_pipeline = IncidentPipeline(
+        main.pipeline_executor, models["transcription"], models["emotion"], models["threat"], main.scheduler,
+        voice_activity_detector=models.get("vad"), result_cache=main.result_cache
+    )
+    
+    transport = httpx.ASGITransport(app=main.app)
+    report = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for concurrency in concurrency_levels:
+            semaphore = asyncio.Semaphore(concurrency)
+            latencies, stage_times, errors = [], {}, {}
+            
+            async def one(i: int):
+                name, _, _ = clips[i % len(clips)]
+                payload = {
+                    "incidentId": f"bench-{uuid.uuid4()}",
+                    "audioUrl": server.url(name),
+                    "timestamp": int(time.time()),
+                }
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.post("/process-incident", json=payload)
+                    latency = time.perf_counter() - start
+                if response.status_code != 200:
+                    errors[response.status_code] = errors.get(response.status_code, 0) + 1
+                    return
+                latencies.append(latency)
+                for stage, seconds in response.json()["details"].get("stage_timings", {}).items():
+                    stage_times.setdefault(stage, []).append(seconds)
+            
+            start = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(requests_per_level)))
+            wall = time.perf_counter() - start
+            
+            report[f"concurrency_{concurrency}"] = {
+                "concurrency": concurrency,
+                "requests": requests_per_level,
+                "errors": errors,
+                "wall_sec": round(wall, 3),
+                "throughput_rps": round(len(latencies) / wall, 4) if wall else 0.0,
+                "latency": percentiles(latencies),
+                "stages": {stage: percentiles(values) for stage, values in sorted(stage_times.items())},
+                "queue": main.scheduler.metrics(),
+            }
+            print(
+                f"[pipeline] concurrency={concurrency}: p50={report[f'concurrency_{concurrency}']['latency'].get('p50')}s "
+                f"throughput={report[f'concurrency_{concurrency}']['throughput_rps']} rps errors={errors}",
+                file=sys.stderr
+            )
+    
+    main.pipeline_executor.shutdown()
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+def flatten(report: dict, prefix: str = "") -> dict:
+    """Flattens nested dicts into 'a.b.c' -> number, for comparing reports."""
+    flat = {}
+    for key, value in report.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+def compare(current: dict, baseline: dict, threshold_pct: float) -> list:
+    """Returns regressions: latency/RSS metrics that grew, or throughput that dropped, by more than threshold_pct."""
+    current_flat = flatten({k: current[k] for k in ("models", "pipeline") if k in current})
+    baseline_flat = flatten({k: baseline[k] for k in ("models", "pipeline") if k in baseline})
+    regressions = []
+    for path, value in sorted(current_flat.items()):
+        base = baseline_flat.get(path)
+        if not base:
+            continue
+        higher_is_better = path.endswith("throughput_rps")
+        tracked = path.endswith((".p50", ".p95", ".p99", "peak_rss_mb")) or higher_is_better
+        if not tracked:
+            continue
+        change = (value - base) / base * 100.0
+        if (change > threshold_pct and not higher_is_better) or (change < -threshold_pct and higher_is_better):
+            regressions.append({"metric": path, "baseline": base, "current": value, "change_pct": round(change, 1)})
+    return regressions
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", type=float, nargs="+", default=[5, 30, 120], help="Synthetic clip lengths (seconds)")
+    parser.add_argument("--formats", nargs="+", default=["wav"], choices=["wav", "ogg"])
+    parser.add_argument("--corpus", help="Directory of recorded clips to add to the synthetic ones")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=16, help="Pipeline requests per concurrency level")
+    parser.add_argument("--repeats", type=int, default=3, help="Per-model repetitions per clip")
+    parser.add_argument("--skip-models", action="store_true")
+    parser.add_argument("--skip-pipeline", action="store_true")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    parser.add_argument("--compare", help="Baseline JSON report to check for regressions")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+    args = parser.parse_args()
+    
+    registry = ModelRegistry()
+    models = registry.load_all()
+    
+    with tempfile.TemporaryDirectory(prefix="sos_bench_") as corpus_dir:
+        clips = write_synthetic_corpus(corpus_dir, args.durations, tuple(args.formats))
+        if args.corpus:
+            for name, path, duration in recorded_corpus(args.corpus):
+                link = os.path.join(corpus_dir, name)
+                os.symlink(os.path.abspath(path), link)
+                clips.append((name, link, duration))
+        
+        report = {
+            "benchmark": "pipeline",
+            "commit": git_commit(),
+            "timestamp": int(time.time()),
+            "host": {"python": platform.python_version(), "cpu_count": os.cpu_count(), "machine": platform.machine()},
+            "config": {
+                "whisper_model_size": config.WHISPER_MODEL_SIZE,
+                "threat_model_id": config.THREAT_MODEL_ID,
+                "stress_pitch_engine": config.STRESS_PITCH_ENGINE,
+                "pipeline_max_workers": config.PIPELINE_MAX_WORKERS,
+                "scheduler_max_concurrent": config.SCHEDULER_MAX_CONCURRENT,
+                "result_cache_enabled": config.RESULT_CACHE_ENABLED,
+                "threat_text_cache_size": config.THREAT_TEXT_CACHE_SIZE,
+                "threat_index_enabled": config.THREAT_INDEX_ENABLED,
+            },
+            "clips": [{"name": name, "duration_sec": duration} for name, _, duration in clips],
+            "startup": registry.report(),
+        }
+        
+        if not args.skip_models:
+            report["models"] = bench_models(models, clips, args.repeats)
+        if not args.skip_pipeline:
+            with LocalFileServer(corpus_dir) as server:
+                report["pipeline"] = asyncio.run(
+                    bench_pipeline(models, clips, server, args.concurrency, args.requests)
+                )
+    
+    report["peak_rss_mb"] = peak_rss_mb()
+    
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report["comparison"] = {
+            "baseline_commit": baseline.get("commit"),
+            "threshold_pct": args.threshold,
+            "regressions": compare(report, baseline, args.threshold),
+        }
+        for regression in report["comparison"]["regressions"]:
+            print(
+                f"REGRESSION {regression['metric']}: {regression['baseline']} -> {regression['current']} "
+                f"({regression['change_pct']:+.1f}%)",
+                file=sys.stderr
+            )
+        exit_code = 1 if report["comparison"]["regressions"] else 0
+    
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,108 @@
+"""
+Compares the 'pyin' and 'fast' stress pitch engines of AudioStressDetector on
+synthetic speech-like clips with a known pitch contour.
+
+Usage (from ai-service/):
+    python benchmarks/stress_engine_bench.py --durations 5 30 120 --output stress_bench.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import synthetic_clip
+from config import config
+from models.emotion import AudioStressDetector
+from models.stress_features import FastStressFeatures
+
+def frame_truth(truth: np.ndarray, n_frames: int, hop: int) -> np.ndarray:
+    idx = np.minimum(np.arange(n_frames) * hop, len(truth) - 1)
+    return truth[idx]
+
+def cents_error(estimate: np.ndarray, truth: np.ndarray) -> float:
+    mask = ~np.isnan(estimate) & ~np.isnan(truth)
+    if not mask.any():
+        return float("nan")
+    return float(np.median(np.abs(1200 * np.log2(estimate[mask] / truth[mask]))))
+
+def pyin_f0(y: np.ndarray) -> tuple:
+    """The pyin engine's f0 track and hop, with the settings AudioStressDetector uses."""
+    import librosa
+    hop_length = 512  # librosa.pyin default: frame_length 2048 // 4
+    f0, _, _ = librosa.pyin(
+        y, fmin=librosa.note_to_hz('C2'), fmax=librosa.note_to_hz('C7'), sr=config.AUDIO_SAMPLE_RATE,
+        hop_length=hop_length
+    )
+    return f0, hop_length
+
+def time_call(func, repeats: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", type=float, nargs="+", default=[5, 30, 120])
+    parser.add_argument("--pitches", type=float, nargs="+", default=[140, 260, 380])
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+    
+    detector = AudioStressDetector()
+    fast = FastStressFeatures()
+    rows = []
+    
+    for duration in args.durations:
+        for base_f0 in args.pitches:
+            y, truth = synthetic_clip(duration, base_f0)
+            row = {"duration_sec": duration, "base_f0_hz": base_f0}
+            
+            for engine in ("pyin", "fast"):
+                latency, result = time_call(lambda: detector.analyze(y, pitch_engine=engine), args.repeats)
+                row[engine] = {
+                    "latency_sec": round(latency, 4),
+                    "real_time_factor": round(latency / duration, 5),
+                    "stress_score": result["stress_score"],
+                    "avg_pitch_hz": result["details"].get("avg_pitch_hz"),
+                }
+            
+            # Frame-level pitch accuracy of both engines against the synthetic ground truth
+            tracks = {"pyin": pyin_f0(y), "fast": (fast.compute(y)["f0"], fast.hop_length)}
+            for engine, (f0, hop_length) in tracks.items():
+                row[engine]["median_pitch_error_cents"] = round(
+                    cents_error(f0, frame_truth(truth, len(f0), hop_length)), 2
+                )
+            row["speedup"] = round(row["pyin"]["latency_sec"] / max(row["fast"]["latency_sec"], 1e-9), 1)
+            row["score_agrees"] = row["pyin"]["stress_score"] == row["fast"]["stress_score"]
+            rows.append(row)
+            print(
+                f"{duration:>6.0f}s f0={base_f0:>4.0f}Hz  pyin={row['pyin']['latency_sec']:.3f}s  "
+                f"fast={row['fast']['latency_sec']:.3f}s  x{row['speedup']}  agree={row['score_agrees']}  "
+                f"error pyin={row['pyin']['median_pitch_error_cents']}c fast={row['fast']['median_pitch_error_cents']}c",
+                file=sys.stderr
+            )
+    
+    report = {
+        "benchmark": "stress_engine",
+        "sample_rate": config.AUDIO_SAMPLE_RATE,
+        "results": rows,
+        "score_agreement": round(sum(r["score_agrees"] for r in rows) / max(len(rows), 1), 3),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
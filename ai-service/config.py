@@ -4,18 +4,140 @@ class Config:
     # Model Paths (can be local paths or HuggingFace IDs)
     WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL_SIZE", "tiny") # Use 'tiny' or 'base' for speed, 'small'/'medium' for accuracy
     THREAT_MODEL_ID = os.getenv("THREAT_MODEL_ID", "distilbert-base-uncased-finetuned-sst-2-english") # Placeholder, usually would be a fine-tuned model
+    THREAT_BACKEND = os.getenv("THREAT_BACKEND", "torch").lower()  # 'torch' (fp32), 'torch-int8' (dynamic quantization) or 'onnx'
+    THREAT_ONNX_PATH = os.getenv("THREAT_ONNX_PATH", "models/onnx/threat.int8.onnx")  # written by threat_export.py
     
     # Audio Settings
     MAX_AUDIO_DURATION_SEC = 300  # 5 minutes
-    ALLOWED_AUDIO_TYPES = ["audio/wav", "audio/mpeg", "audio/mp3", "audio/ogg", "audio/x-wav"]
+    AUDIO_SAMPLE_RATE = 16000  # Every model consumes the same decoded 16 kHz mono buffer
+    MAX_AUDIO_BYTES = int(os.getenv("MAX_AUDIO_BYTES", 50 * 1024 * 1024))
+    
+    # Audio Download
+    DOWNLOAD_TIMEOUT_SEC = float(os.getenv("DOWNLOAD_TIMEOUT_SEC", 10))
+    DOWNLOAD_MAX_CONNECTIONS = int(os.getenv("DOWNLOAD_MAX_CONNECTIONS", 32))  # pooled keep-alive connections
+    DOWNLOAD_CHUNK_BYTES = 64 * 1024
+    AUDIO_SPOOL_MAX_BYTES = int(os.getenv("AUDIO_SPOOL_MAX_BYTES", 8 * 1024 * 1024))  # larger downloads spill to disk
+    ALLOWED_AUDIO_TYPES = [
+        "audio/wav", "audio/mpeg", "audio/mp3", "audio/ogg", "audio/x-wav",
+        "audio/opus", "audio/webm", "audio/mp4", "audio/aac"
+    ]
+    
+    # Keyword Matching (critical phrases feeding the threat override and the fusion keyword_score)
+    KEYWORD_LEXICON_PATH = os.getenv(
+        "KEYWORD_LEXICON_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "lexicons", "keywords.json")
+    )
+    
+    # Location Risk (fusion location_risk: static risk map + decayed density of recent nearby incidents)
+    LOCATION_RISK_MAP_PATH = os.getenv("LOCATION_RISK_MAP_PATH")  # cells or GeoJSON polygons; unset = density only
+    LOCATION_RISK_RELOAD_SEC = float(os.getenv("LOCATION_RISK_RELOAD_SEC", 30))  # map file change check interval
+    LOCATION_DENSITY_CELL_DEG = float(os.getenv("LOCATION_DENSITY_CELL_DEG", 0.01))  # ~1.1 km density grid
+    LOCATION_DENSITY_HALF_LIFE_SEC = float(os.getenv("LOCATION_DENSITY_HALF_LIFE_SEC", 3600))
+    LOCATION_DENSITY_SATURATION = float(os.getenv("LOCATION_DENSITY_SATURATION", 5.0))  # nearby incidents for score ~0.63
+    
+    # Incident History: bounded in-memory ring of processed incidents for burst and duplicate checks
+    INCIDENT_STORE_ENABLED = os.getenv("INCIDENT_STORE_ENABLED", "True").lower() == "true"
+    INCIDENT_STORE_CAPACITY = int(os.getenv("INCIDENT_STORE_CAPACITY", 100000))  # ~90 bytes per incident
+    INCIDENT_STORE_PATH = os.getenv("INCIDENT_STORE_PATH")  # .npy snapshot, reloaded on startup; unset = memory only
+    INCIDENT_STORE_SNAPSHOT_SEC = float(os.getenv("INCIDENT_STORE_SNAPSHOT_SEC", 60))
+    INCIDENT_BURST_RADIUS_M = float(os.getenv("INCIDENT_BURST_RADIUS_M", 500))
+    INCIDENT_BURST_WINDOW_SEC = float(os.getenv("INCIDENT_BURST_WINDOW_SEC", 60))
+    INCIDENT_DUPLICATE_WINDOW_SEC = float(os.getenv("INCIDENT_DUPLICATE_WINDOW_SEC", 600))
+    
+    # Pipeline Concurrency
+    # Worker threads for the CPU-bound stages (Whisper / CTranslate2 and torch release the GIL)
+    PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", os.cpu_count() or 2))
+    
+    # Model Worker Pool: N model-serving processes forked after the shared weights are loaded
+    # 0 disables the pool (models run on threads in the API process), "auto" sizes it to the cores
+    WORKER_POOL_SIZE = os.getenv("WORKER_POOL_SIZE", "0")
+    WORKER_THREADS = int(os.getenv("WORKER_THREADS", 2))  # torch / CTranslate2 threads per worker process
+    # "fork" shares the loaded weights copy-on-write; "forkserver" workers load their own models
+    WORKER_START_METHOD = os.getenv("WORKER_START_METHOD", "fork")
+    WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", 0))  # 0 = CTranslate2 default
+    TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", 0))  # 0 = torch default
+    
+    # Threat Classifier Micro-Batching
+    THREAT_BATCHING_ENABLED = os.getenv("THREAT_BATCHING_ENABLED", "True").lower() == "true"
+    THREAT_MAX_BATCH_SIZE = int(os.getenv("THREAT_MAX_BATCH_SIZE", 16))
+    THREAT_MAX_BATCH_WAIT_MS = float(os.getenv("THREAT_MAX_BATCH_WAIT_MS", 10))
+    THREAT_BUCKET_PAD_RATIO = 1.5  # Max longest/shortest token length within one padded bucket
+    
+    # Threat Shortcuts: repeated and near-duplicate transcripts skip DistilBERT
+    THREAT_TEXT_CACHE_SIZE = int(os.getenv("THREAT_TEXT_CACHE_SIZE", 4096))  # normalized transcripts, 0 = off
+    THREAT_INDEX_ENABLED = os.getenv("THREAT_INDEX_ENABLED", "True").lower() == "true"
+    THREAT_INDEX_CAPACITY = int(os.getenv("THREAT_INDEX_CAPACITY", 10000))  # ~10 MB at 256 dimensions
+    THREAT_INDEX_DIM = 256
+    THREAT_INDEX_K = int(os.getenv("THREAT_INDEX_K", 5))
+    THREAT_INDEX_MIN_SIMILARITY = float(os.getenv("THREAT_INDEX_MIN_SIMILARITY", 0.9))  # cosine, trigram embeddings
+    THREAT_INDEX_MIN_CONFIDENCE = float(os.getenv("THREAT_INDEX_MIN_CONFIDENCE", 0.9))  # model results added to the index
+    THREAT_INDEX_SEED_PATH = os.getenv("THREAT_INDEX_SEED_PATH")  # optional JSONL of labelled transcripts
+    
+    # Voice Activity Detection (speech regions computed once, shared by Whisper and the stress features)
+    VAD_ENABLED = os.getenv("VAD_ENABLED", "True").lower() == "true"
+    VAD_ENGINE = os.getenv("VAD_ENGINE", "silero").lower()  # 'silero' (faster-whisper's ONNX model) or 'energy'
+    VAD_MIN_SILENCE_MS = int(os.getenv("VAD_MIN_SILENCE_MS", 1000))  # shorter pauses stay inside a segment
+    VAD_SPEECH_PAD_MS = int(os.getenv("VAD_SPEECH_PAD_MS", 200))
+    
+    # Stress Analysis
+    STRESS_PITCH_ENGINE = os.getenv("STRESS_PITCH_ENGINE", "pyin").lower()  # 'pyin' (accurate) or 'fast' (vectorized YIN)
+    STRESS_VOICED_ONLY = os.getenv("STRESS_VOICED_ONLY", "False").lower() == "true"  # fast engine: analyze only high-energy frames
+    
+    # Streaming Incidents (WebSocket)
+    STREAM_UPDATE_SEC = float(os.getenv("STREAM_UPDATE_SEC", 2.0))  # new audio required before re-scoring
+    STREAM_MIN_WINDOW_SEC = 1.0  # don't run Whisper on less audio than this
+    STREAM_COMMIT_LAG_SEC = 3.0  # segments ending this far before the window end are final
+    STREAM_MAX_WINDOW_SEC = 30.0  # Whisper's native context; longer windows force a commit
+    
+    # Result Cache (keyed by audio hash + model version) and incidentId idempotency
+    RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "True").lower() == "true"
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 2048))
+    RESULT_CACHE_TTL_SEC = float(os.getenv("RESULT_CACHE_TTL_SEC", 3600))
+    RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR")  # optional on-disk backend, e.g. /tmp/sos-cache
+    IDEMPOTENCY_TTL_SEC = float(os.getenv("IDEMPOTENCY_TTL_SEC", 600))
+    
+    # Startup
+    MODEL_WARMUP = os.getenv("MODEL_WARMUP", "True").lower() == "true"  # run one synthetic inference per model on startup
+    LAZY_MODEL_LOADING = os.getenv("LAZY_MODEL_LOADING", "False").lower() == "true"  # bind the port first, load models in the background
+    
+    # Scheduling and Admission Control
+    SCHEDULER_MAX_CONCURRENT = int(os.getenv("SCHEDULER_MAX_CONCURRENT", max(1, (os.cpu_count() or 2) // 2)))  # incidents in the model stages at once
+    SCHEDULER_QUEUE_LIMIT = int(os.getenv("SCHEDULER_QUEUE_LIMIT", 32))  # waiting incidents before new ones are rejected (503)
+    SCHEDULER_DEGRADE_DEPTH = int(os.getenv("SCHEDULER_DEGRADE_DEPTH", 8))  # queue depth at which incidents take the cheap model paths
+    SCHEDULER_TRIAGE_SEC = 10.0  # audio used for the preliminary stress score that sets priority
+    DEGRADED_WHISPER_MODEL_SIZE = os.getenv("DEGRADED_WHISPER_MODEL_SIZE", "tiny")
+    
+    # Resources: audio held by in-flight incidents (spooled bodies + decoded waveforms) is capped per process
+    AUDIO_MEMORY_BUDGET_MB = float(os.getenv("AUDIO_MEMORY_BUDGET_MB", 512))  # 0 = unlimited; incidents over it are shed (503)
+    WAVEFORM_POOL_MAX_MB = float(os.getenv("WAVEFORM_POOL_MAX_MB", 64))  # idle decode buffers kept for reuse
+    WAVEFORM_POOL_PREALLOC = int(os.getenv("WAVEFORM_POOL_PREALLOC", 4))  # 30 s buffers allocated at startup
+    SCRATCH_DIR = os.getenv("SCRATCH_DIR")  # scratch files and spilled spools; default: the system temp dir
+    SCRATCH_MAX_AGE_SEC = float(os.getenv("SCRATCH_MAX_AGE_SEC", 3600))  # startup sweep also removes older files of live processes
+    
+    # Transcription Tiers: "name:model_size:beam_size", most accurate first. Each incident gets the
+    # most accurate tier predicted to finish within the SLO at the current load; degraded ones get the last
+    WHISPER_TIERS = os.getenv("WHISPER_TIERS", f"accurate:{WHISPER_MODEL_SIZE}:5,fast:{DEGRADED_WHISPER_MODEL_SIZE}:1")
+    WHISPER_TIER_SLO_SEC = float(os.getenv("WHISPER_TIER_SLO_SEC", 8.0))  # transcription latency target per incident
+    
+    # Long Audio: speech longer than LONG_AUDIO_MIN_SEC is cut at quiet points into overlapping
+    # chunks that are transcribed in parallel (one CTranslate2 worker each); 1 worker disables it
+    LONG_AUDIO_WORKERS = int(os.getenv("LONG_AUDIO_WORKERS", 1))
+    LONG_AUDIO_MIN_SEC = float(os.getenv("LONG_AUDIO_MIN_SEC", 45.0))
+    LONG_AUDIO_CHUNK_SEC = float(os.getenv("LONG_AUDIO_CHUNK_SEC", 30.0))  # Whisper's own window length
+    LONG_AUDIO_OVERLAP_SEC = float(os.getenv("LONG_AUDIO_OVERLAP_SEC", 1.0))  # decoder context on each side of a cut
+    
+    # Observability
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"  # Prometheus histograms on GET /metrics
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "False").lower() == "true"  # needs opentelemetry-sdk + opentelemetry-exporter-otlp
+    OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4317")
+    OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "sos-ai-service")
     
     # Feature Toggles
     ENABLE_EMOTION_DETECTION = os.getenv("ENABLE_EMOTION_DETECTION", "True").lower() == "true"
     
-    # Weights for Severity Fusion
-    WEIGHT_STRESS = 0.4
-    WEIGHT_THREAT = 0.3
-    WEIGHT_KEYWORD = 0.2
-    WEIGHT_LOCATION = 0.1
+    # Severity Fusion: weights, threat severities and thresholds live in a versioned policy file
+    FUSION_POLICY_PATH = os.getenv(
+        "FUSION_POLICY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "policies", "fusion.json")
+    )
+    FUSION_POLICY_RELOAD_SEC = float(os.getenv("FUSION_POLICY_RELOAD_SEC", 30))  # policy file change check interval
 
 config = Config()
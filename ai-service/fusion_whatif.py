@@ -0,0 +1,139 @@
+"""
+What-if evaluation of fusion policies over historical incidents.
+
+Re-scores stored incident results (the JSONL written by batch_process.py, or any file of
+IncidentOutput objects) under a baseline policy and one or more candidate policies,
+without re-running any model: fusion only needs the stored stress score, threat type,
+confidence, keyword score and location risk. Each policy scores all incidents in one
+vectorized pass.
+
+Usage (from ai-service/):
+    python fusion_whatif.py results.jsonl --policy candidate.json
+    # sweep several threshold sets against the deployed policy and keep the numbers
+    python fusion_whatif.py results.jsonl --policy p1.json p2.json --report whatif.json
+    # per-incident severities under each policy
+    python fusion_whatif.py results.jsonl --policy p1.json --output rescored.jsonl
+
+The report gives, per candidate, the severity distribution, the baseline -> candidate
+severity transition counts, how many incidents change dispatch action, and scoring throughput.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+from config import config
+from models.fusion import FusionPolicy
+
+logger = logging.getLogger("whatif")
+
+def load_incidents(path: str) -> dict:
+    """Column arrays of the fusion inputs; error records and unparsable lines are skipped."""
+    ids, stress, threat_types, confidence, keyword, location = [], [], [], [], [], []
+    skipped = 0
+    with open(path) as f:
+        for line in f:
+            # Read every field before appending any, so a partial record cannot misalign the columns
+            try:
+                record = json.loads(line)
+                details = record.get("details") or {}
+                fields = (
+                    record["incidentId"], record["stressScore"], record["threatType"], record["confidence"],
+                    (details.get("keywords") or {}).get("keyword_score", 0.0),
+                    (details.get("location") or {}).get("location_risk", 0.0)
+                )
+            except (json.JSONDecodeError, KeyError, AttributeError, TypeError):
+                skipped += 1
+                continue
+            for column, value in zip((ids, stress, threat_types, confidence, keyword, location), fields):
+                column.append(value)
+    if skipped:
+        logger.info(f"Skipped {skipped} lines without a scored incident")
+    return {
+        "incident_ids": ids,
+        "stress_scores": np.array(stress, dtype=np.float64),
+        "threat_types": np.array(threat_types, dtype=str),
+        "confidences": np.array(confidence, dtype=np.float64),
+        "keyword_scores": np.array(keyword, dtype=np.float64),
+        "location_risks": np.array(location, dtype=np.float64),
+    }
+
+def evaluate(policy: FusionPolicy, incidents: dict) -> tuple:
+    start = time.perf_counter()
+    scored = policy.score_batch(
+        incidents["stress_scores"], incidents["threat_types"], incidents["confidences"],
+        incidents["keyword_scores"], incidents["location_risks"]
+    )
+    elapsed = time.perf_counter() - start
+    return scored, elapsed
+
+def compare(baseline: dict, candidate: dict) -> dict:
+    transitions = Counter(zip(baseline["severity_level"], candidate["severity_level"]))
+    return {
+        "transitions": {f"{old}->{new}": count for (old, new), count in sorted(transitions.items()) if old != new},
+        "severity_changed": int(np.sum(baseline["severity_level"] != candidate["severity_level"])),
+        "action_changed": int(np.sum(baseline["recommended_action"] != candidate["recommended_action"])),
+        "mean_score_delta": round(float(np.mean(candidate["final_score"] - baseline["final_score"])), 4)
+            if len(baseline["final_score"]) else 0.0,
+    }
+
+def summarize(policy: FusionPolicy, scored: dict, elapsed: float) -> dict:
+    n = len(scored["final_score"])
+    return {
+        "version": policy.version,
+        "path": policy.path,
+        "severity_counts": dict(Counter(scored["severity_level"])),
+        "action_counts": dict(Counter(scored["recommended_action"])),
+        "mean_score": round(float(np.mean(scored["final_score"])), 4) if n else 0.0,
+        "scoring_sec": round(elapsed, 4),
+        "incidents_per_sec": round(n / max(elapsed, 1e-9)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("results", help="JSONL of incident results (e.g. batch_process.py --output)")
+    parser.add_argument("--policy", nargs="+", required=True, help="Candidate fusion policy file(s)")
+    parser.add_argument("--baseline", default=config.FUSION_POLICY_PATH,
+                        help="Policy to compare against (default: FUSION_POLICY_PATH)")
+    parser.add_argument("--output", help="Write per-incident severities under every policy to this JSONL")
+    parser.add_argument("--report", help="Write the report (JSON) to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    start = time.perf_counter()
+    incidents = load_incidents(args.results)
+    logger.info(f"Loaded {len(incidents['incident_ids'])} incidents in {time.perf_counter() - start:.1f}s")
+
+    baseline = FusionPolicy(args.baseline)
+    baseline_scored, elapsed = evaluate(baseline, incidents)
+    report = {"incidents": len(incidents["incident_ids"]), "baseline": summarize(baseline, baseline_scored, elapsed),
+              "candidates": []}
+    candidates = []
+    for path in args.policy:
+        policy = FusionPolicy(path)
+        scored, elapsed = evaluate(policy, incidents)
+        candidates.append((policy, scored))
+        report["candidates"].append({**summarize(policy, scored, elapsed), **compare(baseline_scored, scored)})
+
+    if args.output:
+        with open(args.output, "w") as out:
+            for i, incident_id in enumerate(incidents["incident_ids"]):
+                record = {"incidentId": incident_id, "baseline": baseline_scored["severity_level"][i]}
+                for policy, scored in candidates:
+                    record[policy.path] = scored["severity_level"][i]
+                out.write(json.dumps(record) + "\n")
+
+    text = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(text)
+    print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,32 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from schemas import IncidentInput, IncidentOutput
-from utils.audio_loader import AudioLoader, logger as audio_logger
-from models.transcription import TranscriptionService, logger as trans_logger
-from models.emotion import AudioStressDetector, logger as emotion_logger
-from models.threat_classifier import ThreatClassifier, logger as threat_logger
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response
+from pydantic import ValidationError
+from schemas import IncidentInput, IncidentOutput, StreamStart, StreamUpdate
+from utils.audio_loader import AsyncAudioLoader, AudioUpload, logger as audio_logger
+from models.registry import ModelRegistry
 from models.fusion import FusionEngine
+from models.location_risk import LocationRiskIndex
+from config import config
+from utils.audio_decoder import AudioTooLongError
+from utils.incident_pipeline import IncidentPipeline, incident_output, load_pipeline_models
+from utils.incident_store import IncidentStore
+from utils.pipeline import PipelineExecutor
+from utils.resources import ResourceManager, sweep_scratch
+from utils.result_cache import ResultCache, IdempotencyRegistry
+from utils.scheduler import IncidentScheduler, OverloadedError, priority_from_stress
+from utils.streaming import StreamingIncidentSession, StreamProtocolError, control_event
+from utils import metrics, tracing
+from utils.worker_pool import pool_size
+import asyncio
+import json
 import logging
 import os
 import uvicorn
 import time
+from typing import Optional
+
+# Startup-time instrumentation: readiness reports seconds since this point
+PROCESS_START = time.time()
 
 # Configure Logging
 logging.basicConfig(
@@ -23,99 +41,339 @@ app = FastAPI(title="SOS Intelligence AI Service", version="1.0.0")
 transcription_service = None
 audio_stress_detector = None
 threat_classifier = None
+voice_activity_detector = None
+pipeline_executor = None
+incident_pipeline = None
+worker_pool = None
+# In worker-pool mode Whisper is loaded by the workers only, and DistilBERT is loaded here
+# but not run, so the workers can fork with clean thread pools and share its weights
+model_registry = ModelRegistry(
+    exclude=("transcription",) if pool_size() else (),
+    skip_warmup=("threat",) if pool_size() else ()
+)
+result_cache = ResultCache() if config.RESULT_CACHE_ENABLED else None
+idempotency = IdempotencyRegistry()
+incident_store = IncidentStore() if config.INCIDENT_STORE_ENABLED else None
+scheduler = IncidentScheduler()
+resources = ResourceManager()
 
 @app.on_event("startup")
 async def startup_event():
-    global transcription_service, audio_stress_detector, threat_classifier
+    global pipeline_executor
+    # Scratch files and shared memory left by a crashed or OOM-killed predecessor
+    sweep_scratch()
+    pipeline_executor = PipelineExecutor()
+    if config.LAZY_MODEL_LOADING:
+        # Bind the port immediately; /ready reports 503 until the models are warm
+        logger.info("Lazy model loading enabled, loading models in the background...")
+        asyncio.get_running_loop().create_task(_load_models())
+    else:
+        await _load_models()
+
+async def _load_models():
+    global transcription_service, audio_stress_detector, threat_classifier, voice_activity_detector
+    global worker_pool, incident_pipeline
     logger.info("Initializing models...")
     try:
-        transcription_service = TranscriptionService()
-        audio_stress_detector = AudioStressDetector()
-        threat_classifier = ThreatClassifier()
-        logger.info("All models initialized successfully.")
+        if config.LAZY_MODEL_LOADING:
+            # The server is already serving: load off the event loop (worker processes use forkserver)
+            loop = asyncio.get_running_loop()
+            models, worker_pool = await loop.run_in_executor(None, load_pipeline_models, model_registry)
+        else:
+            # Blocks startup on the main thread, still the only thread, so the worker pool can fork
+            models, worker_pool = load_pipeline_models(model_registry)
+        # Background threads start only now, so the model workers were forked without them
+        tracing.setup()
+        if incident_store:
+            incident_store.start()
+        voice_activity_detector = models["vad"]
+        incident_pipeline = IncidentPipeline(
+            pipeline_executor,
+            models["transcription"],
+            models["emotion"],
+            models["threat"],
+            scheduler,
+            voice_activity_detector=voice_activity_detector,
+            result_cache=result_cache,
+            incident_store=incident_store,
+            resources=resources
+        )
+        transcription_service = models["transcription"]
+        audio_stress_detector = models["emotion"]
+        threat_classifier = models["threat"]
+        logger.info(f"All models initialized successfully, {time.time() - PROCESS_START:.2f}s after process start.")
     except Exception as e:
         logger.critical(f"Model initialization failed: {e}")
         # We might want to exit here if models are critical
-        raise e
+        if not config.LAZY_MODEL_LOADING:
+            raise e
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await AsyncAudioLoader.close()
+    if worker_pool:
+        worker_pool.shutdown()
+    if pipeline_executor:
+        pipeline_executor.shutdown()
+    if incident_store:
+        incident_store.close()
+    tracing.shutdown()
+
+def _models_ready() -> bool:
+    return bool(incident_pipeline and transcription_service and audio_stress_detector and threat_classifier)
 
 @app.get("/health")
 def health_check():
     """Health check endpoint for Cloud Run."""
-    if not (transcription_service and audio_stress_detector and threat_classifier):
+    if not _models_ready():
         raise HTTPException(status_code=503, detail="Models not fully loaded")
     return {"status": "healthy", "version": "1.0.0"}
 
+@app.get("/ready")
+def readiness_check():
+    """Readiness endpoint: per-model import, load and warm-up times; 503 until every model is warm."""
+    report = model_registry.report()
+    report["uptime_sec"] = round(time.time() - PROCESS_START, 3)
+    if pool_size():
+        report["worker_pool"] = worker_pool.report() if worker_pool else None
+        report["ready"] = report["ready"] and worker_pool is not None
+    if transcription_service:
+        report["transcription_tiers"] = transcription_service.tiers.report()
+    report["location_risk"] = LocationRiskIndex.shared().report()
+    report["fusion_policy"] = FusionEngine.policy().as_dict()
+    if incident_store:
+        report["incident_store"] = incident_store.report()
+    report["resources"] = resources.report()
+    if model_registry.ready_at:
+        report["startup_to_ready_sec"] = round(model_registry.ready_at - PROCESS_START, 3)
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
+@app.get("/queue")
+def queue_metrics():
+    """Scheduler queue depth, admission, shedding and wait-time counters."""
+    return scheduler.metrics()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus exposition: per-stage latency, audio size/duration, real-time factor, queue wait, batch sizes."""
+    body, content_type = metrics.render(scheduler, resources)
+    return Response(content=body, headers={"Content-Type": content_type})
+
 @app.post("/process-incident", response_model=IncidentOutput)
-async def process_incident(incident: IncidentInput, background_tasks: BackgroundTasks):
+async def process_incident(incident: IncidentInput):
     """
     Main processing pipeline for SOS incidents.
+    Retries with the same incidentId share or replay the first attempt's result.
     """
     logger.info(f"Received processing request for incident: {incident.incidentId}")
-    start_time = time.time()
-    temp_audio_path = None
+    return await _process(
+        incident.incidentId, incident.audioUrl, incident.latitude, incident.longitude, incident.timestamp
+    )
+
+@app.post("/process-incident/audio", response_model=IncidentOutput)
+async def process_incident_audio(
+    request: Request,
+    incidentId: str = Query(..., description="Unique ID of the incident"),
+    timestamp: int = Query(..., description="Unix timestamp"),
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180)
+):
+    """
+    Same as /process-incident for clients that already hold the recording: the audio is the
+    request body (raw, with its audio/* Content-Type, or a multipart/form-data "audio" part)
+    instead of a URL. The body is decoded while it is still arriving, with no storage round-trip.
+    """
+    logger.info(f"Received audio upload for incident: {incidentId}")
+    upload = AudioUpload(
+        request.stream(), request.headers.get("Content-Type", ""), int(request.headers.get("Content-Length") or 0)
+    )
+    return await _process(incidentId, upload, latitude, longitude, timestamp)
+
+async def _process(incident_id: str, audio_source, latitude: Optional[float], longitude: Optional[float],
+                   timestamp: int) -> IncidentOutput:
+    """Runs the pipeline for one incident through the idempotency registry."""
+    if not _models_ready():
+        raise HTTPException(status_code=503, detail="Models not fully loaded")
+    try:
+        response, replayed = await idempotency.run_once(
+            incident_id, lambda: _run_pipeline(incident_id, audio_source, latitude, longitude, timestamp)
+        )
+    except OverloadedError as e:
+        logger.warning(f"Shedding incident {incident_id}: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        logger.error(f"Error processing incident {incident_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if replayed:
+        logger.info(f"Returning existing result for retried incident {incident_id}")
+    return response
+
+async def _run_pipeline(incident_id: str, audio_source, latitude: Optional[float], longitude: Optional[float],
+                        timestamp: int) -> IncidentOutput:
+    logger.info(f"Processing incident: {incident_id}")
+    response = await incident_pipeline.run(incident_id, audio_source, latitude, longitude, timestamp)
+    logger.info(
+        f"Processing complete for {incident_id}. Severity: {response.finalSeverity}, "
+        f"stage timings: {json.dumps(response.details['stage_timings'])}"
+    )
+    return response
+
+@app.websocket("/stream-incident")
+async def stream_incident(websocket: WebSocket):
+    """
+    Streaming incident mode.
+    Protocol: one JSON text message matching StreamStart, then binary frames of raw mono PCM
+    as they are recorded, then the text message {"event": "end"}.
+    The server pushes a StreamUpdate after every STREAM_UPDATE_SEC of new audio and an
+    IncidentOutput (type "final") once the stream ends.
+    Close codes: 1007 for a malformed message, 1009 once the audio exceeds
+    MAX_AUDIO_DURATION_SEC, 1011 for a processing error and 1013 when overloaded.
+    """
+    await websocket.accept()
+    if not _models_ready():
+        await websocket.close(code=1013, reason="Models not fully loaded")
+        return
+    # A stream counts against the scheduler queue like any incident, and its updates run in inference slots;
+    # its audio buffer is charged to the memory budget through a lease
+    try:
+        with scheduler.admit():
+            resources.check_admission()
+            with resources.lease() as lease:
+                await _stream_incident(websocket, lease)
+    except OverloadedError as e:
+        logger.warning(f"Rejected stream: {e}")
+        await websocket.close(code=1013, reason=str(e)[:120])
+
+async def _stream_incident(websocket: WebSocket, lease):
+    try:
+        start = StreamStart(**await websocket.receive_json())
+        session = StreamingIncidentSession(
+            incident_id=start.incidentId,
+            transcription_service=transcription_service,
+            audio_stress_detector=audio_stress_detector,
+            threat_classifier=threat_classifier,
+            sample_rate=start.sampleRate,
+            sample_format=start.sampleFormat,
+            latitude=start.latitude,
+            longitude=start.longitude,
+            timestamp=start.timestamp,
+            lease=lease
+        )
+    except WebSocketDisconnect:
+        logger.warning("Client disconnected from stream before the start message")
+        return
+    except (ValidationError, ValueError, TypeError, KeyError) as e:
+        await websocket.close(code=1007, reason=str(e)[:120])
+        return
+    
+    logger.info(f"Streaming session started for incident: {session.incident_id}")
+    stage_timings = {}
+    new_audio = asyncio.Event()
+    ended = False
+    
+    async def run_update(final: bool = False) -> dict:
+        async with scheduler.slot(priority_from_stress(session.stress_score), admitted=True):
+            return await pipeline_executor.run_stage(
+                "stream_final" if final else "stream_update", stage_timings, session.update, final
+            )
+    
+    async def push_updates():
+        # At most one update runs at a time; chunks that arrive meanwhile are picked up by the next one
+        while True:
+            await new_audio.wait()
+            new_audio.clear()
+            if ended:
+                return
+            result = await run_update()
+            await websocket.send_json(_stream_update(session, result).dict())
     
+    updater = asyncio.create_task(push_updates())
     try:
-        # 1. Download Audio
-        logger.info("Step 1: Downloading audio...")
-        temp_audio_path = AudioLoader.download_audio(incident.audioUrl)
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes"):
+                session.append(message["bytes"])
+                if session.ready_for_update():
+                    new_audio.set()
+            elif message.get("text") and control_event(message["text"]) == "end":
+                break
+            if updater.done():
+                updater.result()  # surface errors from the update loop
         
-        # 2. Transcription
-        logger.info("Step 2: Transcribing audio...")
-        transcription_result = transcription_service.transcribe(temp_audio_path)
-        transcript_text = transcription_result["text"]
+        ended = True
+        new_audio.set()
+        await updater
         
-        # 3. Emotion/Stress Analysis
-        logger.info("Step 3: Analyzing emotion/stress...")
-        emotion_result = audio_stress_detector.analyze(temp_audio_path)
-        stress_score = emotion_result["stress_score"]
-        
-        # 4. Threat Classification
-        logger.info("Step 4: Classifying threat...")
-        threat_result = threat_classifier.classify(transcript_text)
-        
-        # 5. Fusion
-        logger.info("Step 5: Computing fusion score...")
-        # Simple location risk heuristic (placeholder: real system would query a risk map)
-        location_risk = 0.0 
-        
-        # Keyword score is partially handled in threat classifier override, 
-        # but we can pass explicit 1.0 if specific keywords were found if we wanted to separate it.
-        # For now, we assume threat_classifier handles the text-based logic.
-        
-        fusion_result = FusionEngine.compute_severity(
-            stress_score=stress_score,
-            threat_data=threat_result,
-            keyword_score=0.0, # handled within threat/stress implicitly for this MVP
-            location_risk=location_risk
-        )
-        
-        response = IncidentOutput(
-            incidentId=incident.incidentId,
-            transcript=transcript_text,
-            stressScore=stress_score,
-            threatType=threat_result["threat_type"],
-            severityScore=fusion_result["final_score"],
-            finalSeverity=fusion_result["severity_level"],
-            confidence=threat_result["confidence"],
-            recommendedAction=fusion_result["recommended_action"],
+        result = await run_update(final=True)
+        history = None
+        if incident_store:
+            incident_time = LocationRiskIndex.normalize_timestamp(session.timestamp)
+            history = incident_store.context(
+                incident_time, session.latitude, session.longitude, transcript=result["transcript"]
+            )
+            incident_store.add(
+                session.incident_id, incident_time, session.latitude, session.longitude,
+                result["threat_result"]["threat_type"], result["fusion_result"]["severity_level"],
+                result["fusion_result"]["final_score"], transcript=result["transcript"]
+            )
+        response = incident_output(
+            session.incident_id,
+            result["transcript"],
+            result["emotion_result"],
+            result["threat_result"],
+            result["fusion_result"],
             details={
-                "processing_time_sec": round(time.time() - start_time, 2),
-                "emotion_details": emotion_result.get("details"),
-                "fusion_breakdown": fusion_result.get("breakdown")
+                "processing_time_sec": round(time.time() - session.started_at, 2),
+                "audio_duration_sec": result["audio_sec"],
+                "first_critical_sec": result["first_critical_sec"],
+                "keywords": result["keyword_result"],
+                "location": result["location_result"],
+                "history": history,
+                "stream_updates": session.updates,
+                "memory": lease.report(),
+                "stage_timings": stage_timings
             }
         )
+        await websocket.send_json({"type": "final", **json.loads(response.json())})
+        metrics.observe_incident("stream", time.time() - session.started_at, response)
+        await websocket.close()
+        logger.info(f"Streaming complete for {session.incident_id}. Severity: {response.finalSeverity}")
         
-        logger.info(f"Processing complete for {incident.incidentId}. Severity: {response.finalSeverity}")
-        return response
-
+    except WebSocketDisconnect:
+        logger.warning(f"Client disconnected from stream for incident {session.incident_id}")
+    except AudioTooLongError as e:
+        logger.error(f"Rejected stream for incident {session.incident_id}: {e}")
+        await websocket.close(code=1009, reason=str(e)[:120])
+    except StreamProtocolError as e:
+        logger.error(f"Rejected stream for incident {session.incident_id}: {e}")
+        await websocket.close(code=1007, reason=str(e)[:120])
+    except OverloadedError as e:
+        logger.warning(f"Shed stream for incident {session.incident_id}: {e}")
+        await websocket.close(code=1013, reason=str(e)[:120])
     except Exception as e:
-        logger.error(f"Error processing incident {incident.incidentId}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-        
+        logger.error(f"Error streaming incident {session.incident_id}: {e}")
+        await websocket.close(code=1011, reason=str(e)[:120])
     finally:
-        # Clean up temp file in background
-        if temp_audio_path:
-            background_tasks.add_task(AudioLoader.cleanup_file, temp_audio_path)
+        # The lease closes after this returns: wait until no update is reading the buffer
+        updater.cancel()
+        await asyncio.gather(updater, return_exceptions=True)
+
+def _stream_update(session: StreamingIncidentSession, result: dict) -> StreamUpdate:
+    return StreamUpdate(
+        incidentId=session.incident_id,
+        transcript=result["transcript"],
+        stressScore=result["emotion_result"]["stress_score"],
+        threatType=result["threat_result"]["threat_type"],
+        keywordScore=result["keyword_result"]["keyword_score"],
+        severityScore=result["fusion_result"]["final_score"],
+        finalSeverity=result["fusion_result"]["severity_level"],
+        recommendedAction=result["fusion_result"]["recommended_action"],
+        audioSec=result["audio_sec"],
+        firstCriticalSec=result["first_critical_sec"]
+    )
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=int(os.environ.get("PORT", 8080)))
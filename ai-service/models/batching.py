@@ -0,0 +1,78 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching front-end for a model.
+    Concurrent callers submit single items; a background thread collects them until
+    max_batch_size items are queued or max_wait_ms has passed since the first one,
+    runs batch_fn once on the whole list and fans the results back out to each caller.
+    batch_fn must return one result per input item, in order.
+    """
+    def __init__(self, batch_fn, max_batch_size: int = 16, max_wait_ms: float = 10.0, name: str = "micro-batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_sec = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        """Blocking single-item call, transparently batched with concurrent callers."""
+        return self.submit(item).result()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait_sec
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            
+            self._flush(batch)
+
+    def _flush(self, batch: list):
+        items = [item for item, _ in batch]
+        metrics.observe_batch(self.name, len(items))
+        try:
+            results = self.batch_fn(items)
+        except Exception as e:
+            logger.error(f"{self.name}: batch of {len(items)} failed: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
@@ -1,78 +1,199 @@
-import librosa
 import numpy as np
 import logging
+from config import config
+from models.stress_features import FastStressFeatures
 
 logger = logging.getLogger(__name__)
 
 class AudioStressDetector:
-    def __init__(self):
+    def __init__(self, pitch_engine: str = None):
         # Constants for heuristics (calibrated for standard speech)
         self.PITCH_THRESHOLD = 300.0  # Hz, simplistic high pitch threshold
         self.ENERGY_THRESHOLD = 0.05  # RMS energy threshold
         
-    def analyze(self, audio_path: str) -> dict:
+        # "pyin" (librosa, slow but robust) or "fast" (vectorized YIN, see FastStressFeatures)
+        self.pitch_engine = (pitch_engine or config.STRESS_PITCH_ENGINE).lower()
+        if self.pitch_engine not in ("pyin", "fast"):
+            raise ValueError(f"Unknown stress pitch engine: {self.pitch_engine}")
+        self.fast_features = FastStressFeatures()
+        # Identifies the feature engine in result-cache keys
+        self.version = self.version_for(self.pitch_engine)
+        
+    def version_for(self, pitch_engine: str) -> str:
+        return f"stress:{pitch_engine}:voiced_only={config.STRESS_VOICED_ONLY}"
+        
+    def warmup(self):
+        """
+        Analyzes one second of a synthetic voiced tone, which (for the pyin engine)
+        triggers librosa's numba compilation of pYIN before the first real request.
+        """
+        t = np.arange(config.AUDIO_SAMPLE_RATE, dtype=np.float32) / config.AUDIO_SAMPLE_RATE
+        tone = (0.1 * np.sin(2 * np.pi * 220.0 * t)).astype(np.float32)
+        self.analyze(tone)
+
+    def quick_score(self, audio: np.ndarray) -> float:
         """
-        Analyzes audio for stress indicators using acoustic features.
+        Cheap preliminary stress score from the first SCHEDULER_TRIAGE_SEC seconds with the
+        fast engine, used to prioritize the incident before the full analysis.
+        """
+        head = audio[:int(config.SCHEDULER_TRIAGE_SEC * config.AUDIO_SAMPLE_RATE)]
+        return self.analyze(head, pitch_engine="fast")["stress_score"]
+
+    def analyze(self, audio: np.ndarray, pitch_engine: str = None, speech_map=None) -> dict:
+        """
+        Analyzes a decoded 16 kHz mono float32 waveform (see AudioDecoder.decode)
+        for stress indicators using acoustic features.
+        pitch_engine overrides the configured engine for this call.
+        With a speech_map (see VoiceActivityDetector), features are computed over its
+        speech regions only, so silence does not dilute the averages.
         Returns a dictionary with stress score and details.
         """
+        engine = (pitch_engine or self.pitch_engine).lower()
+        if speech_map is not None:
+            if not speech_map.has_speech:
+                result = self._score(0.0, 0.0, 0.0)
+                result["details"].update({"pitch_engine": engine, "metrics": ["No speech detected"]})
+                return result
+            audio = speech_map.audio
         try:
-            # Load audio (downsample to 16kHz for speed)
-            y, sr = librosa.load(audio_path, sr=16000)
+            # The waveform is shared with the transcription stage, so it is only read here
+            if engine == "fast":
+                avg_energy, avg_pitch, avg_zcr = self._fast_features(audio)
+            else:
+                avg_energy, avg_pitch, avg_zcr = self._pyin_features(audio)
             
-            # 1. RMS Energy (Loudness/Intensity)
-            rms = librosa.feature.rms(y=y)
-            avg_energy = np.mean(rms)
+            result = self._score(avg_energy, avg_pitch, avg_zcr)
+            result["details"]["pitch_engine"] = engine
+            return result
             
-            # 2. Pitch (Fundamental Frequency - F0) using pYIN
-            # This is slower but accurate. For speed, we might skip steps, 
-            # but for "explainability" pitch is key.
-            f0, voiced_flag, voiced_probs = librosa.pyin(
-                y, fmin=librosa.note_to_hz('C2'), fmax=librosa.note_to_hz('C7')
-            )
+        except Exception as e:
+            logger.error(f"Emotion analysis failed: {e}")
+            # Fallback for error safety
+            return {"stress_score": 0.0, "error": str(e), "details": {}}
+
+    def _pyin_features(self, y: np.ndarray) -> tuple:
+        # Imported here so the fast engine and the streaming path never pay librosa's import cost
+        import librosa
+        sr = config.AUDIO_SAMPLE_RATE
+        
+        # 1. RMS Energy (Loudness/Intensity)
+        rms = librosa.feature.rms(y=y)
+        avg_energy = np.mean(rms)
+        
+        # 2. Pitch (Fundamental Frequency - F0) using pYIN
+        # This is slower but accurate. For speed, use the "fast" engine,
+        # but for "explainability" pitch is key.
+        f0, voiced_flag, voiced_probs = librosa.pyin(
+            y, fmin=librosa.note_to_hz('C2'), fmax=librosa.note_to_hz('C7'), sr=sr
+        )
+        
+        # Filter distinct pitches
+        valid_pitches = f0[~np.isnan(f0)]
+        avg_pitch = np.mean(valid_pitches) if len(valid_pitches) > 0 else 0
+        
+        # 3. Speech Rate / Zero Crossing Rate (Agitation)
+        zcr = librosa.feature.zero_crossing_rate(y)
+        avg_zcr = np.mean(zcr)
+        
+        return avg_energy, avg_pitch, avg_zcr
+
+    def _fast_features(self, y: np.ndarray) -> tuple:
+        # One shared framing pass for energy, ZCR and batched YIN pitch
+        features = self.fast_features.compute(y, voiced_only=config.STRESS_VOICED_ONLY)
+        active = features["active"]
+        if not active.any():
+            return 0.0, 0.0, 0.0
+        
+        avg_energy = np.mean(features["rms"][active])
+        avg_zcr = np.mean(features["zcr"][active])
+        
+        f0 = features["f0"][active]
+        valid_pitches = f0[~np.isnan(f0)]
+        avg_pitch = np.mean(valid_pitches) if len(valid_pitches) > 0 else 0
+        
+        # float32 reductions would otherwise round to noisy values in the response
+        return float(avg_energy), float(avg_pitch), float(avg_zcr)
+
+    def _score(self, avg_energy: float, avg_pitch: float, avg_zcr: float) -> dict:
+        # heuristic scoring (0.0 to 1.0)
+        # High pitch + High Energy + Fast Speech = Panic
+        
+        score = 0.0
+        explanations = []
+
+        # Energy Contribution (0.4 max)
+        if avg_energy > self.ENERGY_THRESHOLD:
+            score += 0.4
+            explanations.append("High voice intensity detected")
+        elif avg_energy > self.ENERGY_THRESHOLD * 0.5:
+            score += 0.2
+        
+        # Pitch Contribution (0.4 max)
+        if avg_pitch > self.PITCH_THRESHOLD:
+            score += 0.4
+            explanations.append("High pitch/screaming detected")
+        elif avg_pitch > self.PITCH_THRESHOLD * 0.7:
+            score += 0.2
             
-            # Filter distinct pitches
-            valid_pitches = f0[~np.isnan(f0)]
-            avg_pitch = np.mean(valid_pitches) if len(valid_pitches) > 0 else 0
+        # ZCR/Agitation (0.2 max)
+        if avg_zcr > 0.1: # Threshold for noisy/breathless speech
+            score += 0.2
+            explanations.append("Rapid/agitated speech pattern")
             
-            # 3. Speech Rate / Zero Crossing Rate (Agitation)
-            zcr = librosa.feature.zero_crossing_rate(y)
-            avg_zcr = np.mean(zcr)
+        return {
+            "stress_score": round(min(score, 1.0), 2),
+            "details": {
+                "avg_pitch_hz": float(round(avg_pitch, 2)),
+                "avg_energy": float(round(avg_energy, 4)),
+                "metrics": explanations
+            }
+        }
+
+class StreamingStressAnalyzer:
+    """
+    Incremental stress analysis for audio that arrives in chunks.
+    Each update() frames only the samples added since the previous call and folds
+    them into running sums, so the cost per chunk does not grow with the recording.
+    Always uses the fast engine, since pYIN cannot be updated incrementally.
+    """
+    def __init__(self, detector: AudioStressDetector):
+        self.detector = detector
+        self.features = detector.fast_features
+        self._next_frame = 0  # sample offset of the first frame not yet analyzed
+        self._frames = 0
+        self._energy_sum = 0.0
+        self._zcr_sum = 0.0
+        self._pitch_sum = 0.0
+        self._pitch_count = 0
+
+    def update(self, audio: np.ndarray) -> dict:
+        """Analyzes the new frames of the growing waveform and returns the stress result so far."""
+        try:
+            features = self.features.compute(
+                audio[self._next_frame:], voiced_only=config.STRESS_VOICED_ONLY, center=False
+            )
+            self._next_frame += len(features["rms"]) * self.features.hop_length
             
-            # heuristic scoring (0.0 to 1.0)
-            # High pitch + High Energy + Fast Speech = Panic
+            active = features["active"]
+            self._frames += int(np.count_nonzero(active))
+            self._energy_sum += float(np.sum(features["rms"][active]))
+            self._zcr_sum += float(np.sum(features["zcr"][active]))
+            f0 = features["f0"][active]
+            valid_pitches = f0[~np.isnan(f0)]
+            self._pitch_sum += float(np.sum(valid_pitches))
+            self._pitch_count += len(valid_pitches)
             
-            score = 0.0
-            explanations = []
-
-            # Energy Contribution (0.4 max)
-            if avg_energy > self.ENERGY_THRESHOLD:
-                score += 0.4
-                explanations.append("High voice intensity detected")
-            elif avg_energy > self.ENERGY_THRESHOLD * 0.5:
-                score += 0.2
+            if self._frames == 0:
+                avg_energy, avg_pitch, avg_zcr = 0.0, 0.0, 0.0
+            else:
+                avg_energy = self._energy_sum / self._frames
+                avg_zcr = self._zcr_sum / self._frames
+                avg_pitch = self._pitch_sum / self._pitch_count if self._pitch_count else 0.0
             
-            # Pitch Contribution (0.4 max)
-            if avg_pitch > self.PITCH_THRESHOLD:
-                score += 0.4
-                explanations.append("High pitch/screaming detected")
-            elif avg_pitch > self.PITCH_THRESHOLD * 0.7:
-                score += 0.2
-                
-            # ZCR/Agitation (0.2 max)
-            if avg_zcr > 0.1: # Threshold for noisy/breathless speech
-                score += 0.2
-                explanations.append("Rapid/agitated speech pattern")
-                
-            return {
-                "stress_score": round(min(score, 1.0), 2),
-                "details": {
-                    "avg_pitch_hz": float(round(avg_pitch, 2)),
-                    "avg_energy": float(round(avg_energy, 4)),
-                    "metrics": explanations
-                }
-            }
+            result = self.detector._score(avg_energy, avg_pitch, avg_zcr)
+            result["details"]["pitch_engine"] = "fast"
+            return result
             
         except Exception as e:
-            logger.error(f"Emotion analysis failed: {e}")
-            # Fallback for error safety
+            logger.error(f"Streaming emotion analysis failed: {e}")
             return {"stress_score": 0.0, "error": str(e), "details": {}}
@@ -1,78 +1,196 @@
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
 from config import config
 
-class FusionEngine:
-    @staticmethod
-    def compute_severity(stress_score: float, threat_data: dict, keyword_score: float = 0.0, location_risk: float = 0.0) -> dict:
-        """
-        Computes the final severity score based on weighted fusion.
-        
-        Formula:
-        0.4 * stress + 0.3 * threat + 0.2 * keyword + 0.1 * location
-        
-        Args:
-            stress_score: 0.0 to 1.0 (from audio analysis)
-            threat_data: Dict containing 'threat_type' and 'confidence'
-            keyword_score: 0.0 to 1.0 (derived from keyword presence or manual boost)
-            location_risk: 0.0 to 1.0 (external input, default 0)
-            
-        Returns:
-            Dict with final_score, severity_level, and recommended_action.
-        """
-        
-        # Threat score mapping (0.0 to 1.0) based on threat type severity
-        THREAT_SEVERITY_MAP = {
-            "ASSAULT": 1.0,
-            "KIDNAP": 1.0,
-            "FIRE": 0.9,
-            "PANIC": 0.8,
-            "MEDICAL": 0.7,
-            "FALSE_ALARM": 0.0,
-            "UNKNOWN": 0.3
-        }
-        
+logger = logging.getLogger(__name__)
+
+class FusionPolicy:
+    """
+    Fusion weights, threat-type severities and severity thresholds, loaded from a versioned
+    JSON file (FUSION_POLICY_PATH) and precompiled once: a weight vector, a threat lookup
+    table and an ascending threshold array, so both the per-incident path and the batch
+    path do no per-call setup.
+
+    final_score = w_stress * stress + w_threat * threat + w_keyword * keyword + w_location * location
+    where threat = threat_severity[type] * (confidence_floor + (1 - confidence_floor) * confidence).
+    """
+    INPUTS = ("stress", "threat", "keyword", "location")
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.mtime = os.path.getmtime(path)
+            self.version = f"fusion:{data['version']}"
+            self.weights = np.array([float(data["weights"][name]) for name in self.INPUTS])
+            self.threat_severity = {label: float(score) for label, score in data["threat_severity"].items()}
+            self.default_threat_severity = float(data.get("default_threat_severity", 0.3))
+            self.confidence_floor = float(data.get("confidence_floor", 0.5))
+            levels = sorted(
+                ((float(level["min_score"]), level["severity"], level["action"]) for level in data["levels"]),
+                reverse=True
+            )
+        except (OSError, json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Failed to load fusion policy {path}: {e}")
+        if not self.threat_severity:
+            raise ValueError(f"Fusion policy {path} defines no threat_severity entries")
+        if not levels or levels[-1][0] > 0.0:
+            raise ValueError(f"Fusion policy {path} needs a level with min_score 0 so every score maps to a severity")
+
+        self._weights = tuple(float(w) for w in self.weights)  # scalar path avoids numpy overhead
+        self._labels = np.array(sorted(self.threat_severity))  # sorted, for searchsorted lookups in score_batch
+        self._label_scores = np.array([self.threat_severity[label] for label in self._labels])
+        self.levels = levels  # highest threshold first, for the scalar ladder
+        self.thresholds = np.array([level[0] for level in reversed(levels)])
+        self.severities = np.array([level[1] for level in reversed(levels)], dtype=object)
+        self.actions = np.array([level[2] for level in reversed(levels)], dtype=object)
+
+    def level(self, score: float) -> tuple:
+        """(severity, action) of the highest level whose min_score the score reaches."""
+        for min_score, severity, action in self.levels:
+            if score >= min_score:
+                return severity, action
+        return self.levels[-1][1], self.levels[-1][2]
+
+    def score(self, stress_score: float, threat_data: dict, keyword_score: float = 0.0,
+              location_risk: float = 0.0) -> dict:
         threat_type = threat_data.get("threat_type", "UNKNOWN")
-        threat_confidence = threat_data.get("confidence", 0.0)
-        
-        # Base threat score depends on the TYPE of threat detected
-        base_threat_score = THREAT_SEVERITY_MAP.get(threat_type, 0.3)
-        
-        # Adjust by confidence (if model is unsure, lower the impact slightly, but keep high for critical classes)
-        # We don't want to zero it out if confidence is low but it's "ASSAULT"
-        threat_score = base_threat_score * (0.5 + 0.5 * threat_confidence)
-        
-        # Calculate Weighted Sum
-        final_score = (
-            (config.WEIGHT_STRESS * stress_score) +
-            (config.WEIGHT_THREAT * threat_score) +
-            (config.WEIGHT_KEYWORD * keyword_score) + 
-            (config.WEIGHT_LOCATION * location_risk)
+        base_threat_score = self.threat_severity.get(threat_type, self.default_threat_severity)
+        # Low confidence lowers the impact but never zeroes it, so an unsure "ASSAULT" still counts
+        threat_score = base_threat_score * (
+            self.confidence_floor + (1.0 - self.confidence_floor) * threat_data.get("confidence", 0.0)
         )
-        
-        # Clamp to 0-1
-        final_score = min(max(final_score, 0.0), 1.0)
-        
-        # Determine Severity Level
-        if final_score >= 0.8:
-            severity = "CRITICAL"
-            action = "EMERGENCY_DISPATCH"
-        elif final_score >= 0.6:
-            severity = "HIGH"
-            action = "EMERGENCY_DISPATCH"
-        elif final_score >= 0.4:
-            severity = "MEDIUM"
-            action = "ESCALATE"
-        else:
-            severity = "LOW"
-            action = "NOTIFY"
-            
+
+        w_stress, w_threat, w_keyword, w_location = self._weights
+        final_score = min(max(
+            w_stress * stress_score + w_threat * threat_score + w_keyword * keyword_score + w_location * location_risk,
+            0.0
+        ), 1.0)
+        severity, action = self.level(final_score)
+
         return {
             "final_score": round(final_score, 2),
             "severity_level": severity,
             "recommended_action": action,
+            "policy_version": self.version,
             "breakdown": {
-                "stress_contribution": round(config.WEIGHT_STRESS * stress_score, 2),
-                "threat_contribution": round(config.WEIGHT_THREAT * threat_score, 2),
-                "keyword_contribution": round(config.WEIGHT_KEYWORD * keyword_score, 2),
-                "location_contribution": round(config.WEIGHT_LOCATION * location_risk, 2)
+                "stress_contribution": round(w_stress * stress_score, 2),
+                "threat_contribution": round(w_threat * threat_score, 2),
+                "keyword_contribution": round(w_keyword * keyword_score, 2),
+                "location_contribution": round(w_location * location_risk, 2)
             }
         }
+
+    def score_batch(self, stress_scores, threat_types, confidences, keyword_scores=None,
+                    location_risks=None) -> dict:
+        """
+        Scores n incidents in one vectorized pass; inputs are length-n sequences or arrays
+        (keyword and location default to 0). Returns arrays: final_score (unrounded),
+        level (index into the ascending thresholds), severity_level, recommended_action
+        and contributions (n x 4, in INPUTS order). Matches score() incident for incident.
+        """
+        stress = np.asarray(stress_scores, dtype=np.float64)
+        n = len(stress)
+        confidence = np.asarray(confidences, dtype=np.float64)
+        keyword = np.zeros(n) if keyword_scores is None else np.asarray(keyword_scores, dtype=np.float64)
+        location = np.zeros(n) if location_risks is None else np.asarray(location_risks, dtype=np.float64)
+
+        base = self._threat_base(threat_types, n)
+        threat = base * (self.confidence_floor + (1.0 - self.confidence_floor) * confidence)
+
+        contributions = np.stack([stress, threat, keyword, location], axis=1) * self.weights
+        # Summed column by column in the scalar path's order, so thresholds cut at the same scores
+        final = np.clip(
+            contributions[:, 0] + contributions[:, 1] + contributions[:, 2] + contributions[:, 3], 0.0, 1.0
+        )
+        level = np.searchsorted(self.thresholds, final, side="right") - 1
+        return {
+            "final_score": final,
+            "level": level,
+            "severity_level": self.severities[level],
+            "recommended_action": self.actions[level],
+            "contributions": contributions
+        }
+
+    def _threat_base(self, threat_types, n: int) -> np.ndarray:
+        """Per-incident threat severity. Fixed-width string arrays are looked up in C against the sorted labels."""
+        types = np.asarray(threat_types)
+        if types.dtype.kind != "U":
+            default = self.default_threat_severity
+            return np.fromiter((self.threat_severity.get(t, default) for t in types), dtype=np.float64, count=n)
+        index = np.minimum(np.searchsorted(self._labels, types), len(self._labels) - 1)
+        return np.where(self._labels[index] == types, self._label_scores[index], self.default_threat_severity)
+
+    def as_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "path": self.path,
+            "weights": dict(zip(self.INPUTS, self._weights)),
+            "levels": [{"severity": s, "min_score": m, "action": a} for m, s, a in self.levels]
+        }
+
+class FusionEngine:
+    """
+    Severity fusion under the current FusionPolicy. The policy file is checked every
+    FUSION_POLICY_RELOAD_SEC on a daemon thread and a changed policy is swapped in
+    atomically, so thresholds can be tuned without a restart; an invalid file is logged
+    and the previous policy stays active.
+    """
+    _policy = None
+    _lock = threading.Lock()
+    _failed_mtime = None
+    reloads = 0
+
+    @classmethod
+    def policy(cls) -> FusionPolicy:
+        if cls._policy is None:
+            with cls._lock:
+                if cls._policy is None:
+                    cls._policy = FusionPolicy(config.FUSION_POLICY_PATH)
+                    logger.info(f"Fusion policy {cls._policy.version} loaded from {config.FUSION_POLICY_PATH}")
+                    threading.Thread(target=cls._watch, name="fusion-policy-watcher", daemon=True).start()
+        return cls._policy
+
+    @classmethod
+    def compute_severity(cls, stress_score: float, threat_data: dict, keyword_score: float = 0.0,
+                         location_risk: float = 0.0) -> dict:
+        """
+        Computes the final severity score based on weighted fusion.
+
+        Args:
+            stress_score: 0.0 to 1.0 (from audio analysis)
+            threat_data: Dict containing 'threat_type' and 'confidence'
+            keyword_score: 0.0 to 1.0 (from the critical-phrase scan)
+            location_risk: 0.0 to 1.0 (risk map and recent nearby incidents)
+
+        Returns:
+            Dict with final_score, severity_level, recommended_action, policy_version and breakdown.
+        """
+        return cls.policy().score(stress_score, threat_data, keyword_score, location_risk)
+
+    @classmethod
+    def score_batch(cls, stress_scores, threat_types, confidences, keyword_scores=None, location_risks=None) -> dict:
+        """Vectorized compute_severity for batch re-scoring; see FusionPolicy.score_batch."""
+        return cls.policy().score_batch(stress_scores, threat_types, confidences, keyword_scores, location_risks)
+
+    @classmethod
+    def _watch(cls):
+        path = config.FUSION_POLICY_PATH
+        while True:
+            time.sleep(config.FUSION_POLICY_RELOAD_SEC)
+            mtime = None
+            try:
+                mtime = os.path.getmtime(path)
+                if mtime == cls._policy.mtime or mtime == cls._failed_mtime:
+                    continue
+                cls._policy = FusionPolicy(path)
+                cls.reloads += 1
+                logger.info(f"Fusion policy reloaded: {cls._policy.version}")
+            except (OSError, ValueError) as e:
+                cls._failed_mtime = mtime
+                logger.error(f"Fusion policy reload failed, keeping {cls._policy.version}: {e}")
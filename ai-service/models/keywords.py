@@ -0,0 +1,148 @@
+import json
+import logging
+import re
+import threading
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Word characters for match boundaries. Python's \w excludes combining marks, so Indic
+# vowel signs (e.g. the "े" in "आगे") are added explicitly; otherwise "आग" would match inside "आगे".
+_WORD = r"[\w\u0300-\u036f\u0900-\u0dff]"
+_WORD_CHAR = re.compile(_WORD)
+
+class KeywordMatcher:
+    """
+    Matches the critical-phrase lexicon (KEYWORD_LEXICON_PATH) against transcripts.
+    All phrases are compiled once into a single regex with Unicode word boundaries,
+    so "kill" does not match "skill" and one pass over the lowercased text finds every
+    phrase. Entries marked "stem" also match when the last word continues ("kill" matches
+    "killed" and "killing"). Cheap enough (tens of microseconds per transcript) to run
+    before DistilBERT.
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: str = None):
+        self.path = path or config.KEYWORD_LEXICON_PATH
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lexicon = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"Failed to load keyword lexicon {self.path}: {e}")
+
+        self.entries = {}
+        self.stems = set()
+        for entry in lexicon["keywords"]:
+            phrase = " ".join(entry["phrase"].lower().split())
+            self.entries[phrase] = {
+                "label": entry["label"],
+                "weight": float(entry["weight"]),
+                "lang": entry.get("lang")
+            }
+            if entry.get("stem"):
+                self.stems.add(phrase)
+        if not self.entries:
+            raise ValueError(f"Keyword lexicon {self.path} is empty")
+
+        # Identifies the lexicon in result-cache keys
+        self.version = f"kw:{lexicon.get('version', 'unversioned')}"
+        self.max_phrase_len = max(len(p) for p in self.entries)
+        # Longest phrases first so "heart attack" wins over a shorter phrase at the same position
+        alternatives = "|".join(
+            r"\s+".join(map(re.escape, p.split())) + (f"{_WORD}*" if p in self.stems else "")
+            for p in sorted(self.entries, key=len, reverse=True)
+        )
+        source = rf"(?<!{_WORD})(?:{alternatives})(?!{_WORD})"
+        # Matching lowercased text is several times faster than re.IGNORECASE, which is
+        # only needed when lowercasing changes the text's length (so positions would shift)
+        self.pattern = re.compile(source)
+        self.pattern_ignorecase = re.compile(source, re.IGNORECASE)
+        logger.info(f"Keyword lexicon {self.version} loaded with {len(self.entries)} phrases")
+
+    @classmethod
+    def shared(cls) -> "KeywordMatcher":
+        """Process-wide matcher, compiled on first use."""
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls()
+        return cls._shared
+
+    def find(self, text: str, start: int = 0) -> list:
+        """Returns the matches in text[start:] as dicts with phrase, label, weight, lang, start and end."""
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            found = self.pattern.finditer(lowered, start)
+        else:
+            found = self.pattern_ignorecase.finditer(text, start)
+        
+        matches = []
+        for m in found:
+            phrase = self._phrase(" ".join(m.group(0).lower().split()))
+            entry = self.entries.get(phrase)
+            if entry is None:
+                continue
+            matches.append({"phrase": phrase, **entry, "start": m.start(), "end": m.end()})
+        return matches
+
+    def _phrase(self, matched: str) -> str:
+        """The lexicon phrase for a match: itself, or the longest stem it continues."""
+        if matched in self.entries:
+            return matched
+        return max((p for p in self.stems if matched.startswith(p)), key=len, default=matched)
+
+    def scan(self, text: str) -> dict:
+        return self.summarize(self.find(text or ""))
+
+    @staticmethod
+    def summarize(matches: list) -> dict:
+        """
+        Combines matches into keyword_score = 1 - prod(1 - weight) over distinct phrases,
+        so repeating one phrase does not inflate the score but independent cues add up.
+        top_label is the label of the strongest match (earliest on ties).
+        """
+        weights = {}
+        for match in matches:
+            weights[match["phrase"]] = max(weights.get(match["phrase"], 0.0), match["weight"])
+        remaining = 1.0
+        for weight in weights.values():
+            remaining *= 1.0 - min(max(weight, 0.0), 1.0)
+
+        top = max(matches, key=lambda m: m["weight"], default=None)
+        return {
+            "keyword_score": round(1.0 - remaining, 4),
+            "top_label": top["label"] if top else None,
+            "matches": matches
+        }
+
+class StreamingKeywordScanner:
+    """
+    Keyword matching for a transcript that is re-emitted on every streaming update.
+    Only the part after the unchanged prefix (minus the word at the boundary and the
+    longest phrase, so phrases straddling the boundary are found) is re-scanned;
+    earlier matches are kept.
+    """
+    def __init__(self, matcher: KeywordMatcher = None):
+        self.matcher = matcher or KeywordMatcher.shared()
+        self._text = ""
+        self._matches = []
+
+    def update(self, text: str) -> dict:
+        if text.startswith(self._text):
+            prefix = len(self._text)  # the common case: committed text only grows
+        else:
+            prefix = 0
+            limit = min(len(text), len(self._text))
+            while prefix < limit and text[prefix] == self._text[prefix]:
+                prefix += 1
+
+        # A stem match can end anywhere in a word, so back up to the start of the word first
+        while prefix > 0 and _WORD_CHAR.match(text[prefix - 1]):
+            prefix -= 1
+        rescan_from = max(0, prefix - self.matcher.max_phrase_len - 1)
+        kept = [m for m in self._matches if m["start"] < rescan_from]
+        start = max([rescan_from] + [m["end"] for m in kept])
+        self._matches = kept + self.matcher.find(text, start)
+        self._text = text
+        return KeywordMatcher.summarize(self._matches)
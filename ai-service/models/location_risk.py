@@ -0,0 +1,271 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from config import config
+
+logger = logging.getLogger(__name__)
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+MAX_MAP_CELLS = 1_000_000  # guards against rasterizing a huge polygon at a fine precision
+
+def _spread(value: int) -> int:
+    # Inserts a zero bit between each of the low 32 bits (Morton interleave)
+    value &= 0xFFFFFFFF
+    value = (value | (value << 16)) & 0x0000FFFF0000FFFF
+    value = (value | (value << 8)) & 0x00FF00FF00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F0F0F0F0F
+    value = (value | (value << 2)) & 0x3333333333333333
+    return (value | (value << 1)) & 0x5555555555555555
+
+def geohash(latitude: float, longitude: float, precision: int) -> str:
+    """Standard geohash (precision <= 12); every prefix of a cell's hash is the hash of its enclosing coarser cell."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    lat = min(int((latitude + 90.0) / 180.0 * (1 << lat_bits)), (1 << lat_bits) - 1)
+    lon = min(int((longitude + 180.0) / 360.0 * (1 << lon_bits)), (1 << lon_bits) - 1)
+    # Bits alternate starting with longitude, so longitude holds the lowest bit when the total is odd
+    if lon_bits == lat_bits:
+        code = (_spread(lon) << 1) | _spread(lat)
+    else:
+        code = _spread(lon) | (_spread(lat) << 1)
+    return "".join(_BASE32[(code >> shift) & 31] for shift in range(5 * (precision - 1), -1, -5))
+
+def cell_size(precision: int) -> tuple:
+    """(lat_degrees, lon_degrees) of a geohash cell at this precision."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+def _inside(lat: float, lon: float, rings: list) -> bool:
+    # Even-odd ray casting over all rings, so holes are excluded. GeoJSON rings are [lon, lat]
+    inside = False
+    for ring in rings:
+        j = len(ring) - 1
+        for i in range(len(ring)):
+            xi, yi = ring[i][0], ring[i][1]
+            xj, yj = ring[j][0], ring[j][1]
+            if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+                inside = not inside
+            j = i
+    return inside
+
+class RiskMap:
+    """
+    Static risk per geohash cell, loaded from LOCATION_RISK_MAP_PATH. Two formats:
+    {"version": ..., "cells": {"<geohash>": risk, ...}} with cells of any precision, or a
+    GeoJSON FeatureCollection of (Multi)Polygons with properties.risk (and optional
+    properties.precision, default 6), rasterized to cells at load time.
+    A point's risk is that of its finest enclosing cell, so lookups are at most
+    max_precision dict probes regardless of map size.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"Failed to load risk map {path}: {e}")
+
+        self.mtime = os.path.getmtime(path)
+        self.version = str(data.get("version", int(self.mtime)))
+        self.cells = {}
+        if data.get("type") == "FeatureCollection":
+            for feature in data.get("features", []):
+                self._rasterize(feature)
+        else:
+            for cell, risk in data.get("cells", {}).items():
+                self.cells[cell.lower()] = min(max(float(risk), 0.0), 1.0)
+        self.max_precision = max((len(cell) for cell in self.cells), default=0)
+
+    def _rasterize(self, feature: dict):
+        geometry = feature.get("geometry") or {}
+        props = feature.get("properties") or {}
+        risk = min(max(float(props.get("risk", 0.0)), 0.0), 1.0)
+        precision = int(props.get("precision", 6))
+        polygons = geometry.get("coordinates", [])
+        if geometry.get("type") == "Polygon":
+            polygons = [polygons]
+        elif geometry.get("type") != "MultiPolygon":
+            return
+
+        dlat, dlon = cell_size(precision)
+        for rings in polygons:
+            lons = [point[0] for point in rings[0]]
+            lats = [point[1] for point in rings[0]]
+            rows = range(int(math.floor((min(lats) + 90) / dlat)), int(math.floor((max(lats) + 90) / dlat)) + 1)
+            cols = range(int(math.floor((min(lons) + 180) / dlon)), int(math.floor((max(lons) + 180) / dlon)) + 1)
+            if len(self.cells) + len(rows) * len(cols) > MAX_MAP_CELLS:
+                raise ValueError(f"Risk map {self.path} rasterizes to more than {MAX_MAP_CELLS} cells; lower the precision")
+            for row in rows:
+                lat = (row + 0.5) * dlat - 90
+                for col in cols:
+                    lon = (col + 0.5) * dlon - 180
+                    if _inside(lat, lon, rings):
+                        cell = geohash(lat, lon, precision)
+                        self.cells[cell] = max(self.cells.get(cell, 0.0), risk)
+
+    def lookup(self, latitude: float, longitude: float) -> tuple:
+        """Returns (risk, cell) of the finest map cell containing the point, or (0.0, None)."""
+        if not self.max_precision:
+            return 0.0, None
+        code = geohash(latitude, longitude, self.max_precision)
+        for precision in range(self.max_precision, 0, -1):
+            risk = self.cells.get(code[:precision])
+            if risk is not None:
+                return risk, code[:precision]
+        return 0.0, None
+
+class IncidentDensity:
+    """
+    Exponentially decayed count of recent incidents on a lat/lon grid
+    (LOCATION_DENSITY_CELL_DEG). The score at a point sums its cell and the eight
+    neighbours, so clusters straddling a cell edge are not split.
+    """
+    def __init__(self, cell_deg: float = None, half_life_sec: float = None, saturation: float = None):
+        self.cell_deg = cell_deg or config.LOCATION_DENSITY_CELL_DEG
+        self.decay = math.log(2) / (half_life_sec or config.LOCATION_DENSITY_HALF_LIFE_SEC)
+        self.saturation = saturation or config.LOCATION_DENSITY_SATURATION
+        self._cells = {}  # (row, col) -> [decayed_count, as_of_timestamp]
+        self.latest = 0.0  # newest incident timestamp seen; replayed history is pruned against it, not the clock
+        self._lock = threading.Lock()
+
+    def _cell(self, latitude: float, longitude: float) -> tuple:
+        return int(math.floor(latitude / self.cell_deg)), int(math.floor(longitude / self.cell_deg))
+
+    def _value(self, entry: list, at: float) -> float:
+        return entry[0] * math.exp(-self.decay * max(at - entry[1], 0.0))
+
+    def record(self, latitude: float, longitude: float, at: float):
+        key = self._cell(latitude, longitude)
+        with self._lock:
+            self.latest = max(self.latest, at)
+            entry = self._cells.get(key)
+            if entry is None:
+                self._cells[key] = [1.0, at]
+            elif at >= entry[1]:
+                self._cells[key] = [self._value(entry, at) + 1.0, at]
+            else:
+                # Out-of-order (e.g. batch replay): add the older incident's decayed weight
+                entry[0] += math.exp(-self.decay * (entry[1] - at))
+
+    def score(self, latitude: float, longitude: float, at: float) -> tuple:
+        """Returns (score in [0, 1), decayed incident count nearby)."""
+        row, col = self._cell(latitude, longitude)
+        total = 0.0
+        with self._lock:
+            for dr in (-1, 0, 1):
+                for dc in (-1, 0, 1):
+                    entry = self._cells.get((row + dr, col + dc))
+                    if entry is not None:
+                        total += self._value(entry, at)
+        return 1.0 - math.exp(-total / self.saturation), total
+
+    def prune(self, floor: float = 0.01):
+        """Drops cells whose decayed count has fallen below floor, bounding memory."""
+        with self._lock:
+            at = self.latest
+            stale = [key for key, entry in self._cells.items() if self._value(entry, at) < floor]
+            for key in stale:
+                del self._cells[key]
+        return len(stale)
+
+    def __len__(self):
+        return len(self._cells)
+
+class LocationRiskIndex:
+    """
+    location_risk for FusionEngine: the static risk map combined with the density of recent
+    nearby incidents as 1 - (1 - map_risk) * (1 - density_score). Lookups are a handful of
+    dict probes (microseconds). A daemon thread reloads the map when its file changes and
+    swaps it in atomically, so requests never wait on a reload.
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, map_path: str = None, reload_sec: float = None):
+        self.map_path = map_path if map_path is not None else config.LOCATION_RISK_MAP_PATH
+        self.reload_sec = reload_sec or config.LOCATION_RISK_RELOAD_SEC
+        self.risk_map = RiskMap(self.map_path) if self.map_path else None
+        self.density = IncidentDensity()
+        self.reloads = 0
+        self._failed_mtime = None
+        if self.risk_map:
+            logger.info(f"Risk map {self.risk_map.version} loaded with {len(self.risk_map.cells)} cells")
+        self._watcher = threading.Thread(target=self._watch, name="risk-map-watcher", daemon=True)
+        self._watcher.start()
+
+    @classmethod
+    def shared(cls) -> "LocationRiskIndex":
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls()
+        return cls._shared
+
+    @staticmethod
+    def normalize_timestamp(timestamp) -> float:
+        """Unix seconds; millisecond timestamps (as sent by mobile clients) are scaled down."""
+        if not timestamp:
+            return time.time()
+        return timestamp / 1000.0 if timestamp > 1e11 else float(timestamp)
+
+    def lookup(self, latitude: float, longitude: float, timestamp=None) -> dict:
+        risk_map = self.risk_map  # one read, so a concurrent reload cannot mix two maps
+        if latitude is None or longitude is None:
+            map_risk, cell, density_score, nearby = 0.0, None, 0.0, 0.0
+        else:
+            map_risk, cell = risk_map.lookup(latitude, longitude) if risk_map else (0.0, None)
+            density_score, nearby = self.density.score(latitude, longitude, self.normalize_timestamp(timestamp))
+        return {
+            "location_risk": round(1.0 - (1.0 - map_risk) * (1.0 - density_score), 4),
+            "map_risk": map_risk,
+            "density_score": round(density_score, 4),
+            "recent_nearby_incidents": round(nearby, 2),
+            "cell": cell,
+            "map_version": risk_map.version if risk_map else None
+        }
+
+    def record(self, latitude: float, longitude: float, timestamp=None):
+        """Adds a processed incident to the recent-incident density."""
+        if latitude is not None and longitude is not None:
+            self.density.record(latitude, longitude, self.normalize_timestamp(timestamp))
+
+    def _watch(self):
+        while True:
+            time.sleep(self.reload_sec)
+            try:
+                self.density.prune()
+            except Exception as e:
+                logger.error(f"Incident density prune failed: {e}")
+            if self.map_path:
+                self._reload()
+
+    def _reload(self):
+        mtime = None
+        try:
+            mtime = os.path.getmtime(self.map_path)
+            if (self.risk_map and mtime == self.risk_map.mtime) or mtime == self._failed_mtime:
+                return
+            start = time.perf_counter()
+            self.risk_map = RiskMap(self.map_path)
+            self.reloads += 1
+            logger.info(
+                f"Risk map reloaded: version {self.risk_map.version}, {len(self.risk_map.cells)} cells "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+        except Exception as e:
+            # Any malformed map (wrong types, missing keys) is rejected; the watcher thread must keep running
+            self._failed_mtime = mtime
+            logger.error(f"Risk map reload failed, keeping the previous map: {e}")
+
+    def report(self) -> dict:
+        return {
+            "map_path": self.map_path,
+            "map_version": self.risk_map.version if self.risk_map else None,
+            "map_cells": len(self.risk_map.cells) if self.risk_map else 0,
+            "reloads": self.reloads,
+            "density_cells": len(self.density)
+        }
@@ -0,0 +1,80 @@
+import numpy as np
+from config import config
+
+FRAME_SEC = 0.05  # resolution of the quiet-point search
+
+class Chunk:
+    """
+    One piece of a long recording, in samples. The model sees [start, end); segments whose
+    midpoint falls in the core [keep_start, keep_end) belong to this chunk, the rest of
+    the window is overlap that only gives the decoder context at the cut.
+    """
+    __slots__ = ("start", "end", "keep_start", "keep_end")
+
+    def __init__(self, start: int, end: int, keep_start: int, keep_end: int):
+        self.start = start
+        self.end = end
+        self.keep_start = keep_start
+        self.keep_end = keep_end
+
+def plan_chunks(audio: np.ndarray, chunk_sec: float = None, overlap_sec: float = None,
+                boundaries=None) -> list:
+    """
+    Splits a 16 kHz waveform into chunks of at most chunk_sec (plus overlap). Each cut is
+    placed in the last third before the target point: at the latest of the given boundaries
+    (e.g. the joins between VAD speech regions) in that range, otherwise at the latest
+    near-quietest FRAME_SEC frame, so cuts land between words rather than inside them.
+    """
+    sr = config.AUDIO_SAMPLE_RATE
+    chunk = int((chunk_sec or config.LONG_AUDIO_CHUNK_SEC) * sr)
+    overlap = int((overlap_sec if overlap_sec is not None else config.LONG_AUDIO_OVERLAP_SEC) * sr)
+    n = len(audio)
+    if n <= chunk:
+        return [Chunk(0, n, 0, n)]
+
+    frame = int(FRAME_SEC * sr)
+    n_frames = n // frame
+    energy = np.square(audio[:n_frames * frame].reshape(n_frames, frame), dtype=np.float32).mean(axis=1)
+    boundaries = np.asarray(sorted(boundaries), dtype=np.int64) if boundaries is not None and len(boundaries) else None
+
+    cuts = [0]
+    while n - cuts[-1] > chunk:
+        target = cuts[-1] + chunk
+        lo = cuts[-1] + chunk * 2 // 3
+        candidates = boundaries[(boundaries >= lo) & (boundaries <= target)] if boundaries is not None else []
+        if len(candidates):
+            cut = int(candidates[-1])
+        else:
+            first, last = lo // frame, min(target // frame, n_frames)
+            if last > first:
+                # The latest frame about as quiet as the quietest one, so chunks stay close to chunk_sec
+                window = energy[first:last]
+                quiet = np.flatnonzero(window <= window.min() * 2.0 + 1e-10)
+                cut = (first + int(quiet[-1])) * frame + frame // 2
+            else:
+                cut = target
+        cuts.append(cut)
+    cuts.append(n)
+
+    return [
+        Chunk(max(keep_start - overlap, 0), min(keep_end + overlap, n), keep_start, keep_end)
+        for keep_start, keep_end in zip(cuts[:-1], cuts[1:])
+    ]
+
+def merge_segments(chunks: list, chunk_segments: list) -> list:
+    """
+    Merges per-chunk segments [(start_sec, end_sec, text)] (times relative to the chunk
+    window) into one timeline: offsets them by the window start and keeps each segment
+    only in the chunk whose core contains its midpoint, so overlap is not transcribed twice.
+    """
+    sr = float(config.AUDIO_SAMPLE_RATE)
+    merged = []
+    for chunk, segments in zip(chunks, chunk_segments):
+        offset = chunk.start / sr
+        keep_start, keep_end = chunk.keep_start / sr, chunk.keep_end / sr
+        for start, end, text in segments:
+            start, end = start + offset, end + offset
+            if keep_start <= (start + end) / 2 < keep_end:
+                merged.append((start, end, text))
+    merged.sort(key=lambda segment: segment[0])
+    return merged
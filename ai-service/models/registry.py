@@ -0,0 +1,93 @@
+import importlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# name -> (module, class). Modules are imported on load so that importing this
+# registry (and main) does not pull in torch, transformers or faster-whisper.
+MODEL_SPECS = {
+    "transcription": ("models.transcription", "TranscriptionService"),
+    "emotion": ("models.emotion", "AudioStressDetector"),
+    "threat": ("models.threat_classifier", "ThreatClassifier"),
+    "vad": ("models.vad", "VoiceActivityDetector"),
+}
+
+class ModelRegistry:
+    """
+    Loads the pipeline models in parallel, runs a synthetic warm-up inference on each
+    (kernel JIT, numba compilation of pYIN, tokenizer initialization) and keeps per-model
+    import / load / warm-up timings for the readiness endpoint.
+    """
+    def __init__(self, specs: dict = None, exclude: tuple = (), skip_warmup: tuple = ()):
+        self.specs = specs or {
+            name: spec for name, spec in MODEL_SPECS.items()
+            if (name != "vad" or config.VAD_ENABLED) and name not in exclude
+        }
+        # Models that must not run inference in this process (e.g. before forking workers)
+        self.skip_warmup = set(skip_warmup)
+        self.instances = {}
+        self.status = {
+            name: {"state": "pending", "import_sec": None, "load_sec": None, "warmup_sec": None, "error": None}
+            for name in self.specs
+        }
+        self.started_at = None
+        self.ready_at = None
+
+    @property
+    def ready(self) -> bool:
+        return all(s["state"] == "ready" for s in self.status.values())
+
+    def load_all(self) -> dict:
+        """Loads and warms every model concurrently. Returns name -> instance; raises the first failure."""
+        self.started_at = time.time()
+        with ThreadPoolExecutor(max_workers=len(self.specs), thread_name_prefix="model-loader") as pool:
+            futures = {name: pool.submit(self._load, name) for name in self.specs}
+            errors = [f.exception() for f in futures.values() if f.exception()]
+        if errors:
+            raise errors[0]
+        
+        self.ready_at = time.time()
+        logger.info(f"All models loaded and warmed up in {self.ready_at - self.started_at:.2f}s")
+        return dict(self.instances)
+
+    def _load(self, name: str):
+        module_name, class_name = self.specs[name]
+        status = self.status[name]
+        try:
+            status["state"] = "importing"
+            start = time.perf_counter()
+            cls = getattr(importlib.import_module(module_name), class_name)
+            status["import_sec"] = round(time.perf_counter() - start, 3)
+            
+            status["state"] = "loading"
+            start = time.perf_counter()
+            instance = cls()
+            status["load_sec"] = round(time.perf_counter() - start, 3)
+            
+            if config.MODEL_WARMUP and hasattr(instance, "warmup") and name not in self.skip_warmup:
+                status["state"] = "warming_up"
+                start = time.perf_counter()
+                instance.warmup()
+                status["warmup_sec"] = round(time.perf_counter() - start, 3)
+            
+            self.instances[name] = instance
+            status["state"] = "ready"
+            logger.info(
+                f"Model '{name}' ready (import {status['import_sec']}s, load {status['load_sec']}s, "
+                f"warm-up {status['warmup_sec']}s)"
+            )
+        except Exception as e:
+            status["state"] = "failed"
+            status["error"] = str(e)
+            logger.critical(f"Failed to load model '{name}': {e}")
+            raise
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "models": self.status,
+            "load_total_sec": round(self.ready_at - self.started_at, 3) if self.ready_at else None
+        }
@@ -0,0 +1,133 @@
+import logging
+import numpy as np
+import scipy.fft
+from config import config
+
+logger = logging.getLogger(__name__)
+
+class FastStressFeatures:
+    """
+    Vectorized pitch / energy / zero-crossing features for the stress detector.
+    One framing pass over the waveform feeds all three features, and pitch is estimated
+    with YIN evaluated for whole blocks of frames at once (FFT autocorrelation),
+    instead of librosa.pyin's per-frame Viterbi decoding.
+    """
+    def __init__(self, sr: int = None, frame_length: int = 1024, hop_length: int = 256,
+                 fmin: float = 65.41, fmax: float = 2093.0, yin_threshold: float = 0.15,
+                 block_frames: int = 2048):
+        # fmin/fmax default to C2/C7, the same search range as the pyin path
+        self.sr = sr or config.AUDIO_SAMPLE_RATE
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.min_lag = max(2, int(np.floor(self.sr / fmax)))
+        self.max_lag = min(int(np.ceil(self.sr / fmin)), frame_length // 2)
+        self.yin_threshold = yin_threshold
+        # Frames are processed in blocks to bound the FFT scratch memory on 5 minute clips
+        self.block_frames = block_frames
+
+    def frames(self, y: np.ndarray, center: bool = True) -> np.ndarray:
+        """
+        Returns a (n_frames, frame_length) strided view of the signal, zero-padded by half
+        a frame on both sides when center is set (librosa's convention).
+        Without center, only frames lying fully inside y are returned and no sample data is copied.
+        """
+        y = np.asarray(y, dtype=np.float32)
+        if center:
+            pad = self.frame_length // 2
+            y = np.pad(y, (pad, pad))
+            if len(y) < self.frame_length:
+                y = np.pad(y, (0, self.frame_length - len(y)))
+        elif len(y) < self.frame_length:
+            return np.zeros((0, self.frame_length), dtype=np.float32)
+        windows = np.lib.stride_tricks.sliding_window_view(y, self.frame_length)
+        return windows[::self.hop_length]
+
+    def compute(self, y: np.ndarray, voiced_only: bool = False, center: bool = True) -> dict:
+        """
+        Computes per-frame features.
+        Returns a dict of equally long arrays: rms, zcr, f0 (NaN where unvoiced) and
+        'active' (frames that were analyzed). With voiced_only, pitch is only searched
+        in high-energy frames and 'active' marks just those frames.
+        """
+        frames = self.frames(y, center=center)
+        
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / float(self.frame_length)
+        
+        if voiced_only:
+            active = self.energy_gate(rms)
+        else:
+            active = np.ones(len(rms), dtype=bool)
+        
+        f0 = np.full(len(rms), np.nan, dtype=np.float32)
+        active_idx = np.flatnonzero(active)
+        for start in range(0, len(active_idx), self.block_frames):
+            idx = active_idx[start:start + self.block_frames]
+            f0[idx] = self._yin(frames[idx])
+        
+        return {"rms": rms, "zcr": zcr, "f0": f0, "active": active}
+
+    @staticmethod
+    def energy_gate(rms: np.ndarray, floor: float = 0.01) -> np.ndarray:
+        """Marks frames loud enough to contain speech: above an absolute floor and half the median level."""
+        if len(rms) == 0:
+            return np.zeros(0, dtype=bool)
+        return rms > max(floor, 0.5 * float(np.median(rms)))
+
+    def _yin(self, frames: np.ndarray) -> np.ndarray:
+        """YIN pitch estimate for a block of frames; returns f0 in Hz, NaN for unvoiced frames."""
+        n_frames = frames.shape[0]
+        if n_frames == 0:
+            return np.zeros(0, dtype=np.float32)
+        
+        x = np.ascontiguousarray(frames, dtype=np.float32)
+        w = self.frame_length - self.max_lag  # YIN integration window
+        n_fft = scipy.fft.next_fast_len(self.frame_length + w)
+        
+        # Cross-correlation of the first w samples with every lag, one FFT per frame
+        spec_x = scipy.fft.rfft(x, n=n_fft, axis=1)
+        spec_w = scipy.fft.rfft(x[:, :w], n=n_fft, axis=1)
+        acf = scipy.fft.irfft(spec_x * np.conj(spec_w), n=n_fft, axis=1)[:, :self.max_lag + 1]
+        
+        # Energy of x[tau : tau + w] for every lag via a running sum of squares
+        cum_sq = np.concatenate(
+            [np.zeros((n_frames, 1), dtype=np.float32), np.cumsum(np.square(x), axis=1)], axis=1
+        )
+        lags = np.arange(self.max_lag + 1)
+        energy_lag = cum_sq[:, lags + w] - cum_sq[:, lags]
+        diff = energy_lag[:, :1] + energy_lag - 2.0 * acf
+        diff = np.maximum(diff, 0.0)
+        
+        # Cumulative mean normalized difference
+        cmnd = np.ones_like(diff)
+        running = np.cumsum(diff[:, 1:], axis=1)
+        cmnd[:, 1:] = diff[:, 1:] * lags[1:] / np.maximum(running, 1e-12)
+        
+        search = cmnd[:, self.min_lag:]
+        below = search < self.yin_threshold
+        voiced = below.any(axis=1)
+        tau = np.where(voiced, np.argmax(below, axis=1), np.argmin(search, axis=1))
+        
+        # Walk forward to the bottom of the dip the threshold crossing landed in
+        last = search.shape[1] - 1
+        rows = np.arange(n_frames)
+        for _ in range(last):
+            nxt = np.minimum(tau + 1, last)
+            step = search[rows, nxt] < search[rows, tau]
+            if not step.any():
+                break
+            tau = np.where(step, nxt, tau)
+        
+        # Parabolic interpolation around the minimum
+        tau_abs = tau + self.min_lag
+        left = cmnd[rows, np.maximum(tau_abs - 1, 0)]
+        mid = cmnd[rows, tau_abs]
+        right = cmnd[rows, np.minimum(tau_abs + 1, self.max_lag)]
+        denom = left - 2.0 * mid + right
+        shift = np.where(np.abs(denom) > 1e-12, 0.5 * (left - right) / np.where(denom == 0, 1, denom), 0.0)
+        period = tau_abs + np.clip(shift, -1.0, 1.0)
+        
+        f0 = (self.sr / np.maximum(period, 1e-6)).astype(np.float32)
+        f0[~voiced] = np.nan
+        return f0
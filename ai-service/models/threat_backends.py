@@ -0,0 +1,119 @@
+import logging
+import os
+import numpy as np
+from config import config
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "torch-int8", "onnx")
+
+class TorchThreatBackend:
+    """
+    DistilBERT in PyTorch. With quantize=True the Linear layers are converted to
+    dynamic int8 (weights stored as int8, activations quantized per batch), which
+    roughly quarters their memory and speeds up CPU inference. Quantized models run on CPU only.
+    """
+    def __init__(self, model_id: str, quantize: bool = False):
+        import torch
+        from transformers import DistilBertForSequenceClassification
+        self.torch = torch
+        self.name = "torch-int8" if quantize else "torch"
+        self.device = "cuda" if torch.cuda.is_available() and not quantize else "cpu"
+        if config.TORCH_NUM_THREADS:
+            torch.set_num_threads(config.TORCH_NUM_THREADS)
+
+        model = DistilBertForSequenceClassification.from_pretrained(model_id)
+        model.eval()
+        if quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model.to(self.device)
+
+    def set_threads(self, threads: int):
+        self.torch.set_num_threads(threads)
+
+    def logits(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        inputs = {
+            "input_ids": self.torch.from_numpy(input_ids).to(self.device),
+            "attention_mask": self.torch.from_numpy(attention_mask).to(self.device)
+        }
+        with self.torch.no_grad():
+            return self.model(**inputs).logits.float().cpu().numpy()
+
+class OnnxThreatBackend:
+    """
+    DistilBERT exported to ONNX (see threat_export.py) and run with ONNX Runtime.
+    Does not import torch, so the service's memory footprint and import time drop with it.
+    """
+    def __init__(self, path: str = None):
+        self.name = "onnx"
+        self.path = path or config.THREAT_ONNX_PATH
+        if not os.path.exists(self.path):
+            raise ValueError(f"ONNX threat model not found at {self.path}; run threat_export.py export first")
+        self.session = self._session(config.TORCH_NUM_THREADS)
+
+    def _session(self, threads: int):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        return ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+
+    def set_threads(self, threads: int):
+        # ORT's thread pool does not survive fork, so worker processes rebuild the session
+        self.session = self._session(threads)
+
+    def logits(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        return self.session.run(
+            ["logits"],
+            {"input_ids": input_ids.astype(np.int64), "attention_mask": attention_mask.astype(np.int64)}
+        )[0]
+
+def create_backend(name: str, model_id: str):
+    name = name.lower()
+    if name == "torch":
+        return TorchThreatBackend(model_id)
+    if name == "torch-int8":
+        return TorchThreatBackend(model_id, quantize=True)
+    if name == "onnx":
+        return OnnxThreatBackend()
+    raise ValueError(f"Unknown threat classifier backend: {name} (expected one of {', '.join(BACKENDS)})")
+
+def export_onnx(model_id: str, path: str, quantize: bool = True) -> str:
+    """
+    Exports the fp32 PyTorch model to ONNX with dynamic batch and sequence axes.
+    With quantize=True the exported graph is additionally converted to dynamic int8
+    and written to path; the fp32 graph is kept alongside it as <path>.fp32.onnx.
+    Returns the path of the model the ONNX backend should load.
+    """
+    import torch
+    from transformers import DistilBertForSequenceClassification
+
+    model = DistilBertForSequenceClassification.from_pretrained(model_id)
+    model.eval()
+    model.config.return_dict = False  # plain tuple output for the tracer
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fp32_path = f"{os.path.splitext(path)[0]}.fp32.onnx" if quantize else path
+    dummy = (torch.ones(1, 8, dtype=torch.long), torch.ones(1, 8, dtype=torch.long))
+    torch.onnx.export(
+        model,
+        dummy,
+        fp32_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"}
+        },
+        opset_version=14
+    )
+    logger.info(f"Exported {model_id} to {fp32_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+        logger.info(f"Wrote dynamic int8 ONNX model to {path}")
+    return path
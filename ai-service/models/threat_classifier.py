@@ -1,22 +1,32 @@
-import torch
-from transformers import DistilBertTokenizer, DistilBertForSequenceClassification
 import logging
+import numpy as np
+from transformers import DistilBertTokenizer
 from config import config
+from models.batching import MicroBatcher
+from models.keywords import KeywordMatcher
+from models.threat_backends import create_backend
+from models.transcript_index import TranscriptIndex, normalize_transcript
+from utils.result_cache import ResultCache
 
 logger = logging.getLogger(__name__)
 
 class ThreatClassifier:
-    def __init__(self):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+    def __init__(self, backend: str = None):
         self.model_id = config.THREAT_MODEL_ID
+        self.backend_name = (backend or config.THREAT_BACKEND).lower()
+        # Compiled critical-phrase lexicon for the keyword override
+        self.keywords = KeywordMatcher.shared()
+        # Identifies the model, inference backend, lexicon and kNN shortcut in result-cache keys
+        self.version = f"threat:{self.model_id}:{self.backend_name}:{self.keywords.version}"
+        if config.THREAT_INDEX_ENABLED:
+            self.version += f":knn{config.THREAT_INDEX_MIN_SIMILARITY}"
         
-        logger.info(f"Loading Threat Classifier: {self.model_id} on {self.device}")
+        logger.info(f"Loading Threat Classifier: {self.model_id} with the {self.backend_name} backend")
         
         try:
             self.tokenizer = DistilBertTokenizer.from_pretrained(self.model_id)
-            self.model = DistilBertForSequenceClassification.from_pretrained(self.model_id)
-            self.model.to(self.device)
-            self.model.eval()
+            # fp32 torch, dynamic int8 torch or ONNX Runtime (see models/threat_backends.py)
+            self.backend = create_backend(self.backend_name, self.model_id)
             
             # Define labels map (In a real scenario, this matches the fine-tuned model's config)
             # For this MVP, we map standard sentiment/outputs to our specific categories
@@ -30,81 +40,182 @@ class ThreatClassifier:
         except Exception as e:
             logger.critical(f"Failed to load Threat Classifier: {e}")
             raise e
+        
+        # Shortcuts in front of the model: exact repeats of a normalized transcript, then near-duplicates
+        self.text_cache = (
+            ResultCache(max_entries=config.THREAT_TEXT_CACHE_SIZE, disk_dir="") if config.THREAT_TEXT_CACHE_SIZE else None
+        )
+        self.index = TranscriptIndex(self.LABELS) if config.THREAT_INDEX_ENABLED else None
+        
+        self._batcher = None
+        self.start_batcher()
+
+    def start_batcher(self):
+        """
+        Concurrent classify() calls are coalesced into one padded forward pass.
+        Also called in forked worker processes, which do not inherit the batcher thread.
+        """
+        self._batcher = None
+        if config.THREAT_BATCHING_ENABLED:
+            self._batcher = MicroBatcher(
+                self.classify_batch,
+                max_batch_size=config.THREAT_MAX_BATCH_SIZE,
+                max_wait_ms=config.THREAT_MAX_BATCH_WAIT_MS,
+                name="threat-batcher"
+            )
+
+    def stop_batcher(self):
+        """Joins the batcher thread, e.g. before this process forks model workers."""
+        if self._batcher is not None:
+            self._batcher.close()
+            self._batcher = None
+
+    def set_threads(self, threads: int):
+        """Limits the backend's intra-op threads; called in forked worker processes."""
+        self.backend.set_threads(threads)
+
+    def warmup(self):
+        """Runs one forward pass directly (bypassing the batcher) to initialize the tokenizer and kernels."""
+        self.classify_batch(["help me, there is a fire and someone is bleeding"])
 
-    def classify(self, text: str) -> dict:
+    def classify(self, text: str, remember: bool = True) -> dict:
         """
         Classifies the transcript into emergency categories.
+        A transcript seen before (after normalization) is answered from the text cache and a
+        near-duplicate of a labelled one from the kNN index; "source" says which ("lru",
+        "index" or "model"). With remember=False (interim streaming transcripts) both are
+        only read, never written. When batching is enabled, a model call blocks until its
+        micro-batch has been scored.
         """
-        if not text:
-            return {
-                "threat_type": "FALSE_ALARM",
-                "confidence": 0.0,
-                "raw_label": "FALSE_ALARM"
-            }
+        key = normalize_transcript(text) if text else ""
+        if key and self.text_cache:
+            cached = self.text_cache.get("threat", key)
+            if cached is not None:
+                return {**cached, "source": "lru"}
+        
+        result = self._index_lookup(text, key) if key and self.index else None
+        if result is None:
+            result = self._batcher(text) if self._batcher else self.classify_batch([text])[0]
+            result = {**result, "source": "model"}
+            if remember and key and self.index and "error" not in result \
+                    and result["confidence"] >= config.THREAT_INDEX_MIN_CONFIDENCE:
+                self.index.add(key, result["raw_label"], result["confidence"])
+        
+        if remember and key and self.text_cache and "error" not in result:
+            self.text_cache.put("threat", key, result)
+        return result
+
+    def _index_lookup(self, text: str, key: str):
+        match = self.index.lookup(key)
+        if match is None:
+            return None
+        label, confidence, similarity = match
+        return {
+            "threat_type": self._keyword_override(text, label, confidence),
+            "confidence": round(confidence, 4),
+            "raw_label": label,
+            "similarity": round(similarity, 4),
+            "source": "index"
+        }
+
+    def classify_batch(self, texts: list) -> list:
+        """
+        Classifies a list of transcripts, returning one result dict per transcript in order.
+        Transcripts are sorted by token length and split into buckets so short texts
+        are not padded up to the longest one in the batch.
+        """
+        results = [None] * len(texts)
+        pending = []
+        for i, text in enumerate(texts):
+            if not text:
+                results[i] = {
+                    "threat_type": "FALSE_ALARM",
+                    "confidence": 0.0,
+                    "raw_label": "FALSE_ALARM"
+                }
+            else:
+                pending.append(i)
+        
+        if not pending:
+            return results
             
         try:
-            inputs = self.tokenizer(
-                text, 
-                return_tensors="pt", 
-                truncation=True, 
-                padding=True, 
+            encodings = self.tokenizer(
+                [texts[i] for i in pending],
+                truncation=True,
                 max_length=512
-            ).to(self.device)
+            )
+            lengths = [len(ids) for ids in encodings["input_ids"]]
+            order = sorted(range(len(pending)), key=lambda j: lengths[j])
             
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
+            for bucket in self._length_buckets(order, lengths):
+                inputs = self.tokenizer.pad(
+                    {
+                        "input_ids": [encodings["input_ids"][j] for j in bucket],
+                        "attention_mask": [encodings["attention_mask"][j] for j in bucket]
+                    },
+                    return_tensors="np"
+                )
                 
-            # Get top prediction
-            top_prob, top_idx = torch.max(probs, dim=1)
-            
-            # Map index to label (Safe lookup)
-            idx = top_idx.item()
-            label = self.LABELS[idx] if idx < len(self.LABELS) else "UNKNOWN"
-            confidence = top_prob.item()
-            
-            # Keyword boosting (Hybrid approach for reliability)
-            # If model is uncertain but keywords are present, override or boost
-            # This is crucial for "Explainable AI" in government context
-            refined_label = self._keyword_override(text, label, confidence)
-            
-            return {
-                "threat_type": refined_label,
-                "confidence": float(round(confidence, 4)),
-                "raw_label": label
-            }
-            
+                logits = self.backend.logits(inputs["input_ids"], inputs["attention_mask"])
+                logits = logits - logits.max(axis=-1, keepdims=True)
+                probs = np.exp(logits)
+                probs /= probs.sum(axis=-1, keepdims=True)
+                    
+                # Get top prediction per row
+                top_idxs = probs.argmax(axis=1)
+                top_probs = probs[np.arange(len(top_idxs)), top_idxs]
+                for j, top_prob, top_idx in zip(bucket, top_probs.tolist(), top_idxs.tolist()):
+                    i = pending[j]
+                    results[i] = self._build_result(texts[i], top_idx, top_prob)
+                    
         except Exception as e:
             logger.error(f"Classification failed: {e}")
-            return {"threat_type": "FALSE_ALARM", "confidence": 0.0, "error": str(e)}
+            for i in pending:
+                if results[i] is None:
+                    results[i] = {"threat_type": "FALSE_ALARM", "confidence": 0.0, "error": str(e)}
+        
+        return results
 
-    def _keyword_override(self, text: str, label: str, confidence: float) -> str:
-        text_lower = text.lower()
+    @staticmethod
+    def _length_buckets(order: list, lengths: list) -> list:
+        """
+        Groups length-sorted indices into buckets whose longest sequence is at most
+        THREAT_BUCKET_PAD_RATIO times the shortest, bounding padding waste per forward pass.
+        """
+        buckets = []
+        current = []
+        for j in order:
+            if current and lengths[j] > lengths[current[0]] * config.THREAT_BUCKET_PAD_RATIO:
+                buckets.append(current)
+                current = []
+            current.append(j)
+        if current:
+            buckets.append(current)
+        return buckets
+
+    def _build_result(self, text: str, idx: int, confidence: float) -> dict:
+        # Map index to label (Safe lookup)
+        label = self.LABELS[idx] if idx < len(self.LABELS) else "UNKNOWN"
         
-        # Critical keywords that should trigger high alert even if model is unsure
-        critical_keywords = {
-            "fire": "FIRE",
-            "burning": "FIRE",
-            "smoke": "FIRE",
-            "heart attack": "MEDICAL",
-            "ambulance": "MEDICAL",
-            "bleeding": "MEDICAL",
-            "gun": "ASSAULT",
-            "shoot": "ASSAULT",
-            "knife": "ASSAULT",
-            "kill": "ASSAULT",
-            "help me": "PANIC",
-            "kidnap": "KIDNAP",
-            "taken": "KIDNAP"
-        }
+        # Keyword boosting (Hybrid approach for reliability)
+        # If model is uncertain but keywords are present, override or boost
+        # This is crucial for "Explainable AI" in government context
+        refined_label = self._keyword_override(text, label, confidence)
         
-        # Simple override logic
-        for word, override_label in critical_keywords.items():
-            if word in text_lower:
-                # If the model prediction is weak (<0.7) and we find a strong keyword,
-                # we might want to trust the keyword or at least flag it.
-                # For this MVP, we return the keyword label if confidence is low.
-                if confidence < 0.6:
-                    return override_label
+        return {
+            "threat_type": refined_label,
+            "confidence": float(round(confidence, 4)),
+            "raw_label": label
+        }
+
+    def _keyword_override(self, text: str, label: str, confidence: float) -> str:
+        # Critical keywords (see models/lexicons/keywords.json) trigger a high alert even if the model is unsure.
+        # If the model prediction is weak and we find a strong keyword,
+        # we trust the strongest keyword's label.
+        if confidence < 0.6:
+            top_label = self.keywords.scan(text)["top_label"]
+            if top_label:
+                return top_label
                     
         return label
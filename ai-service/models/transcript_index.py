@@ -0,0 +1,125 @@
+import json
+import logging
+import re
+import threading
+import numpy as np
+from config import config
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[^\w']+")
+_HASH_MULTIPLIER = np.uint32(2654435761)  # Knuth's multiplicative hash
+
+def normalize_transcript(text: str) -> str:
+    """Lowercase words only, so "Help me!" and " help me." share cache and index entries."""
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+def embed(text: str, dim: int) -> np.ndarray:
+    """
+    Hashed character-trigram vector of a normalized transcript, L2-normalized, so the dot
+    product of two embeddings is their cosine similarity. Costs microseconds and no model.
+    """
+    data = np.frombuffer(f" {text} ".encode(), dtype=np.uint8).astype(np.uint32)
+    vector = np.zeros(dim, dtype=np.float32)
+    if len(data) < 3:
+        return vector
+    grams = (data[:-2] << np.uint32(16)) | (data[1:-1] << np.uint32(8)) | data[2:]
+    buckets = ((grams * _HASH_MULTIPLIER) >> np.uint32(12)) % np.uint32(dim)
+    vector += np.bincount(buckets, minlength=dim)
+    return vector / np.linalg.norm(vector)
+
+class TranscriptIndex:
+    """
+    Embeddings of labelled transcripts with their threat label and confidence, searched by
+    exact kNN (one matrix-vector product over at most THREAT_INDEX_CAPACITY rows).
+    Transcripts from THREAT_INDEX_SEED_PATH are pinned; confident model results are added
+    as they come in and overwrite each other oldest first.
+    """
+    def __init__(self, labels: list, capacity: int = None, dim: int = None, seed_path: str = None):
+        self.labels = list(labels)
+        self._label_ids = {label: i for i, label in enumerate(self.labels)}
+        self.capacity = capacity or config.THREAT_INDEX_CAPACITY
+        self.dim = dim or config.THREAT_INDEX_DIM
+        self.vectors = np.zeros((self.capacity, self.dim), dtype=np.float32)
+        self.label_ids = np.zeros(self.capacity, dtype=np.int16)
+        self.confidences = np.zeros(self.capacity, dtype=np.float32)
+        self.count = 0
+        self.head = 0
+        self.pinned = 0  # seed rows [0, pinned) are never overwritten
+        self._lock = threading.Lock()
+        seed_path = seed_path if seed_path is not None else config.THREAT_INDEX_SEED_PATH
+        if seed_path:
+            self._load_seed(seed_path)
+
+    def _load_seed(self, path: str):
+        """JSONL of {"transcript": ..., "threat_type": ...} (optional "confidence", default 1.0)."""
+        skipped = 0
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        added = self.add(
+                            normalize_transcript(entry["transcript"]), entry["threat_type"],
+                            float(entry.get("confidence", 1.0))
+                        )
+                    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                        added = False
+                    skipped += not added
+        except OSError as e:
+            raise ValueError(f"Failed to load threat index seed {path}: {e}")
+        self.pinned = min(self.count, self.capacity - 1)
+        self.head = self.pinned
+        logger.info(f"Threat index seeded with {self.count} transcripts from {path} ({skipped} skipped)")
+
+    def add(self, text: str, label: str, confidence: float) -> bool:
+        """Adds a normalized transcript; returns False for unknown labels and near-verbatim repeats."""
+        label_id = self._label_ids.get(label)
+        if label_id is None or not text:
+            return False
+        vector = embed(text, self.dim)
+        with self._lock:
+            if self.count:
+                similarities = self.vectors[:self.count] @ vector
+                best = int(similarities.argmax())
+                # A repeat adds nothing to the vote; keep the slot for a different phrasing
+                if similarities[best] >= 0.99 and self.label_ids[best] == label_id:
+                    return False
+            slot = self.head
+            self.vectors[slot] = vector
+            self.label_ids[slot] = label_id
+            self.confidences[slot] = confidence
+            self.count = min(self.count + 1, self.capacity)
+            self.head = slot + 1 if slot + 1 < self.capacity else self.pinned
+        return True
+
+    def lookup(self, text: str):
+        """
+        Votes among the THREAT_INDEX_K nearest transcripts at least THREAT_INDEX_MIN_SIMILARITY
+        similar, weighted by similarity x confidence. Returns (label, confidence, similarity)
+        or None; confidence is the winning label's share of the vote times its neighbours' confidence.
+        """
+        vector = embed(text, self.dim)
+        with self._lock:
+            if not self.count:
+                return None
+            similarities = self.vectors[:self.count] @ vector
+            k = min(config.THREAT_INDEX_K, self.count)
+            nearest = np.argpartition(-similarities, k - 1)[:k]
+            nearest = nearest[similarities[nearest] >= config.THREAT_INDEX_MIN_SIMILARITY]
+            if not len(nearest):
+                return None
+            weights = similarities[nearest]
+            label_ids = self.label_ids[nearest]
+            confidences = self.confidences[nearest]
+        votes = np.bincount(label_ids, weights=weights * confidences, minlength=len(self.labels))
+        winner = int(votes.argmax())
+        return self.labels[winner], float(votes[winner] / weights.sum()), float(weights.max())
+
+    def report(self) -> dict:
+        return {
+            "entries": self.count,
+            "pinned": self.pinned,
+            "capacity": self.capacity,
+            "memory_mb": round(self.vectors.nbytes / 1e6, 1)
+        }
@@ -1,6 +1,11 @@
 import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from faster_whisper import WhisperModel
 from config import config
+from models.long_audio import merge_segments, plan_chunks
+from models.whisper_tiers import WhisperTierManager
 
 logger = logging.getLogger(__name__)
 
@@ -9,43 +14,129 @@ class TranscriptionService:
         # Load model on initialization
         # Run on CPU for cost efficiency on Cloud Run unless GPU is explicitly provisioned
         # 'int8' quantization is faster on CPU
-        logger.info(f"Loading Whisper model: {config.WHISPER_MODEL_SIZE}...")
+        # Every model size used by a tier (see WhisperTierManager) is loaded once and shared
+        self.tiers = WhisperTierManager()
+        # Identifies the model + decoding settings in result-cache keys
+        self.version = self.tiers.version_for()
+        self.models = {}
         try:
-            self.model = WhisperModel(config.WHISPER_MODEL_SIZE, device="cpu", compute_type="int8")
-            logger.info("Whisper model loaded successfully.")
+            for model_size in self.tiers.model_sizes:
+                logger.info(f"Loading Whisper model: {model_size}...")
+                # cpu_threads=0 lets CTranslate2 pick; worker processes pin it to their share of the cores
+                # num_workers > 1 lets the chunks of one long recording decode concurrently
+                self.models[model_size] = WhisperModel(
+                    model_size, device="cpu", compute_type="int8", cpu_threads=config.WHISPER_CPU_THREADS,
+                    num_workers=max(config.LONG_AUDIO_WORKERS, 1)
+                )
+            self.model = self.models[self.tiers.default.model_size]
+            # Long-audio chunks are submitted from the pipeline thread that called transcribe()
+            self.chunk_executor = (
+                ThreadPoolExecutor(config.LONG_AUDIO_WORKERS, thread_name_prefix="whisper-chunk")
+                if config.LONG_AUDIO_WORKERS > 1 else None
+            )
+            logger.info(f"Whisper models loaded successfully for tiers: {', '.join(self.tiers.by_name)}")
         except Exception as e:
             logger.critical(f"Failed to load Whisper model: {e}")
             raise e
 
-    def transcribe(self, audio_path: str) -> dict:
+    def version_for(self, tier: str = None) -> str:
+        return self.tiers.version_for(tier)
+
+    def select_tier(self, audio_sec: float, load: float = 0.0, degraded: bool = False) -> dict:
+        return self.tiers.select(audio_sec, load, degraded)
+
+    def observe_tier(self, tier: str, audio_sec: float, elapsed_sec: float, load: float = 0.0):
+        self.tiers.observe(tier, audio_sec, elapsed_sec, load)
+
+    def warmup(self):
+        """Runs one short synthetic transcription per loaded model so the first real request does not pay for initialization."""
+        for tier in {t.model_size: t for t in self.tiers.tiers}.values():
+            self.transcribe(np.zeros(config.AUDIO_SAMPLE_RATE, dtype=np.float32), tier.name)
+
+    def transcribe(self, audio: np.ndarray, tier: str = None, speech_map=None) -> dict:
         """
-        Transcribes the audio file.
+        Transcribes a decoded 16 kHz mono float32 waveform (see AudioDecoder.decode).
+        A file path is also accepted, in which case faster-whisper decodes it itself.
+        tier names the model size / beam width to use (see select_tier); default is the most accurate.
+        With a speech_map (see VoiceActivityDetector), only its speech audio is decoded and
+        segment timestamps are mapped back onto the original recording.
         Returns a dictionary with full text and segments.
         """
+        tier = self.tiers.get(tier)
         try:
-            segments, info = self.model.transcribe(audio_path, beam_size=5)
+            if speech_map is not None:
+                if not speech_map.has_speech:
+                    # Nothing but silence/noise: skip the model entirely
+                    return {
+                        "language": None,
+                        "duration": speech_map.total_samples / float(config.AUDIO_SAMPLE_RATE),
+                        "text": "",
+                        "segments": [],
+                        "tier": tier.name
+                    }
+                audio = speech_map.audio
+            
+            model = self.models[tier.model_size]
+            chunks = 1
+            if self._is_long(audio):
+                boundaries = speech_map.joins if speech_map is not None else None
+                raw_segments, language, duration, chunks = self._transcribe_chunked(
+                    model, audio, tier.beam_size, boundaries
+                )
+            else:
+                segments, info = model.transcribe(audio, beam_size=tier.beam_size)
+                # segments is a generator, so we must iterate to get results
+                # This is blocking, but necessary for getting the full text
+                raw_segments = [(segment.start, segment.end, segment.text) for segment in segments]
+                language, duration = info.language, info.duration
             
-            # segments is a generator, so we must iterate to get results
-            # This is blocking, but necessary for getting the full text
             text_segments = []
             full_text = []
             
-            for segment in segments:
+            for start, end, text in raw_segments:
+                if speech_map is not None:
+                    start, end = speech_map.original_time(start), speech_map.original_time(end)
                 text_segments.append({
-                    "start": segment.start,
-                    "end": segment.end,
-                    "text": segment.text
+                    "start": start,
+                    "end": end,
+                    "text": text
                 })
-                full_text.append(segment.text)
+                full_text.append(text)
             
             combined_text = " ".join(full_text).strip()
             
             return {
-                "language": info.language,
-                "duration": info.duration,
+                "language": language,
+                "duration": speech_map.total_samples / float(config.AUDIO_SAMPLE_RATE) if speech_map is not None else duration,
                 "text": combined_text,
-                "segments": text_segments
+                "segments": text_segments,
+                "tier": tier.name,
+                "chunks": chunks
             }
         except Exception as e:
             logger.error(f"Transcription failed: {e}")
             raise ValueError(f"Transcription failed: {str(e)}")
+
+    def _is_long(self, audio) -> bool:
+        return (
+            self.chunk_executor is not None and isinstance(audio, np.ndarray)
+            and len(audio) > config.LONG_AUDIO_MIN_SEC * config.AUDIO_SAMPLE_RATE
+        )
+
+    def _transcribe_chunked(self, model, audio: np.ndarray, beam_size: int, boundaries=None) -> tuple:
+        """
+        Long-audio mode: cuts the waveform at quiet points (or the given sample boundaries)
+        into overlapping chunks, decodes them concurrently and merges the segments onto the
+        waveform's timeline. Returns (segments, language, duration_sec, chunk_count).
+        """
+        chunks = plan_chunks(audio, boundaries=boundaries)
+
+        def decode(chunk):
+            segments, info = model.transcribe(audio[chunk.start:chunk.end], beam_size=beam_size)
+            return [(segment.start, segment.end, segment.text) for segment in segments], info.language
+
+        results = list(self.chunk_executor.map(decode, chunks))
+        # Chunks detect their language independently; report the most common one
+        language = Counter(chunk_language for _, chunk_language in results).most_common(1)[0][0]
+        merged = merge_segments(chunks, [segments for segments, _ in results])
+        return merged, language, len(audio) / float(config.AUDIO_SAMPLE_RATE), len(chunks)
@@ -0,0 +1,121 @@
+import logging
+import numpy as np
+from config import config
+from models.stress_features import FastStressFeatures
+
+logger = logging.getLogger(__name__)
+
+class SpeechMap:
+    """
+    Speech regions of one incident's waveform, computed once and shared by every model.
+    segments are (start_sample, end_sample) pairs on the original waveform; audio is the
+    speech-only waveform (the segments concatenated), which is what the models process.
+    """
+    def __init__(self, waveform: np.ndarray, segments: list):
+        self.segments = segments
+        self.total_samples = len(waveform)
+        
+        if len(segments) == 1 and segments[0] == (0, len(waveform)):
+            self.audio = waveform  # all speech: share the buffer, no copy
+        elif segments:
+            self.audio = np.concatenate([waveform[start:end] for start, end in segments])
+        else:
+            self.audio = waveform[:0]
+        
+        # Start of every segment within self.audio, for mapping timestamps back
+        lengths = np.array([end - start for start, end in segments], dtype=np.int64)
+        self._collected_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]) if segments else np.zeros(0, dtype=np.int64)
+        self._original_starts = np.array([start for start, _ in segments], dtype=np.int64)
+
+    @property
+    def has_speech(self) -> bool:
+        return len(self.audio) > 0
+
+    @property
+    def speech_sec(self) -> float:
+        return len(self.audio) / float(config.AUDIO_SAMPLE_RATE)
+
+    @property
+    def joins(self) -> np.ndarray:
+        """Sample positions in self.audio where two speech regions meet: natural points to cut long audio."""
+        return self._collected_starts[1:]
+
+    def original_time(self, t_sec: float) -> float:
+        """Maps a time in the speech-only audio back to a time in the original recording."""
+        if not self.segments:
+            return t_sec
+        sample = int(round(t_sec * config.AUDIO_SAMPLE_RATE))
+        i = max(int(np.searchsorted(self._collected_starts, sample, side="right")) - 1, 0)
+        original = self._original_starts[i] + (sample - self._collected_starts[i])
+        return original / float(config.AUDIO_SAMPLE_RATE)
+
+    def as_dict(self) -> dict:
+        sr = float(config.AUDIO_SAMPLE_RATE)
+        return {
+            "segments": [[round(start / sr, 2), round(end / sr, 2)] for start, end in self.segments],
+            "speech_sec": round(self.speech_sec, 2),
+            "speech_ratio": round(len(self.audio) / self.total_samples, 3) if self.total_samples else 0.0
+        }
+
+class VoiceActivityDetector:
+    def __init__(self, engine: str = None):
+        # "silero" (faster-whisper's bundled ONNX model) or "energy" (frame RMS gate, no model)
+        self.engine = (engine or config.VAD_ENGINE).lower()
+        if self.engine not in ("silero", "energy"):
+            raise ValueError(f"Unknown VAD engine: {self.engine}")
+        self.version = f"vad:{self.engine}:{config.VAD_MIN_SILENCE_MS}:{config.VAD_SPEECH_PAD_MS}"
+        self.features = FastStressFeatures()
+        
+        if self.engine == "silero":
+            from faster_whisper.vad import VadOptions, get_speech_timestamps
+            self._vad_options = VadOptions(
+                min_silence_duration_ms=config.VAD_MIN_SILENCE_MS,
+                speech_pad_ms=config.VAD_SPEECH_PAD_MS
+            )
+            self._get_speech_timestamps = get_speech_timestamps
+
+    def warmup(self):
+        """Runs the detector once so the Silero ONNX session is created before the first request."""
+        self.detect(np.zeros(config.AUDIO_SAMPLE_RATE, dtype=np.float32))
+
+    def detect(self, waveform: np.ndarray) -> SpeechMap:
+        """Finds the speech regions of a decoded 16 kHz waveform."""
+        try:
+            if self.engine == "silero":
+                segments = [
+                    (int(ts["start"]), int(ts["end"]))
+                    for ts in self._get_speech_timestamps(waveform, self._vad_options)
+                ]
+            else:
+                segments = self._energy_segments(waveform)
+        except Exception as e:
+            # Never drop audio because the VAD failed: treat the whole clip as speech
+            logger.error(f"Voice activity detection failed: {e}")
+            segments = [(0, len(waveform))] if len(waveform) else []
+        
+        return SpeechMap(waveform, segments)
+
+    def _energy_segments(self, waveform: np.ndarray) -> list:
+        sr = config.AUDIO_SAMPLE_RATE
+        hop = self.features.hop_length
+        frames = self.features.frames(waveform)
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+        active = FastStressFeatures.energy_gate(rms)
+        if not active.any():
+            return []
+        
+        # Run boundaries of the active mask, in frames
+        edges = np.flatnonzero(np.diff(np.concatenate([[0], active.astype(np.int8), [0]])))
+        runs = edges.reshape(-1, 2)
+        
+        pad = int(config.VAD_SPEECH_PAD_MS / 1000.0 * sr)
+        min_gap = int(config.VAD_MIN_SILENCE_MS / 1000.0 * sr)
+        segments = []
+        for start_frame, end_frame in runs:
+            start = max(int(start_frame) * hop - pad, 0)
+            end = min(int(end_frame) * hop + pad, len(waveform))
+            if segments and start - segments[-1][1] < min_gap:
+                segments[-1] = (segments[-1][0], end)
+            else:
+                segments.append((start, end))
+        return segments
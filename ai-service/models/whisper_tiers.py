@@ -0,0 +1,121 @@
+import logging
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Starting real-time factors (processing sec per audio sec, int8 on CPU, greedy) per model
+# size, replaced by measurements as incidents are transcribed
+PRIOR_RTF = {"tiny": 0.02, "base": 0.04, "small": 0.12, "medium": 0.35, "large": 0.7}
+DEFAULT_PRIOR_RTF = 0.3
+BEAM_COST = 0.1  # extra cost per additional beam, relative to greedy
+RTF_SMOOTHING = 0.2  # weight of the newest measurement in the moving average
+
+class WhisperTier:
+    def __init__(self, name: str, model_size: str, beam_size: int):
+        self.name = name
+        self.model_size = model_size
+        self.beam_size = beam_size
+        prior = next((rtf for size, rtf in PRIOR_RTF.items() if model_size.startswith(size)), DEFAULT_PRIOR_RTF)
+        self.rtf = prior * (1.0 + BEAM_COST * (beam_size - 1))
+        self.observations = 0
+
+    @property
+    def version(self) -> str:
+        return f"faster-whisper:{self.model_size}:int8:beam{self.beam_size}"
+
+    def as_dict(self) -> dict:
+        return {
+            "model": self.model_size,
+            "beam_size": self.beam_size,
+            "rtf": round(self.rtf, 4),
+            "observations": self.observations
+        }
+
+class WhisperTierManager:
+    """
+    Table of transcription tiers (WHISPER_TIERS), most accurate first, and the policy
+    that picks one per incident: the most accurate tier whose predicted latency,
+    measured real-time factor x speech duration x current load, fits WHISPER_TIER_SLO_SEC.
+    Incidents the scheduler marked degraded always get the cheapest tier.
+    Loads no models, so the API process can select tiers for a worker pool.
+    """
+    def __init__(self, spec: str = None, slo_sec: float = None):
+        self.slo_sec = slo_sec or config.WHISPER_TIER_SLO_SEC
+        self.tiers = []
+        for entry in (spec or config.WHISPER_TIERS).split(","):
+            try:
+                name, model_size, beam_size = [part.strip() for part in entry.split(":")]
+                self.tiers.append(WhisperTier(name, model_size, int(beam_size)))
+            except ValueError:
+                raise ValueError(f"Invalid WHISPER_TIERS entry '{entry}', expected name:model_size:beam_size")
+        if not self.tiers:
+            raise ValueError("WHISPER_TIERS defines no tiers")
+        self.by_name = {tier.name: tier for tier in self.tiers}
+        self.selected = {tier.name: 0 for tier in self.tiers}
+
+    @property
+    def default(self) -> WhisperTier:
+        return self.tiers[0]
+
+    @property
+    def model_sizes(self) -> list:
+        return list(dict.fromkeys(tier.model_size for tier in self.tiers))
+
+    def get(self, name: str = None) -> WhisperTier:
+        if name is None:
+            return self.default
+        if name not in self.by_name:
+            raise ValueError(f"Unknown transcription tier: {name}")
+        return self.by_name[name]
+
+    def version_for(self, tier: str = None) -> str:
+        version = self.get(tier).version
+        if config.LONG_AUDIO_WORKERS > 1:
+            # Chunked long-audio transcripts can differ slightly from sequential ones
+            version += f":long{config.LONG_AUDIO_MIN_SEC:g}/{config.LONG_AUDIO_CHUNK_SEC:g}/{config.LONG_AUDIO_OVERLAP_SEC:g}"
+        return version
+
+    def select(self, audio_sec: float, load: float = 0.0, degraded: bool = False) -> dict:
+        """
+        Picks a tier for audio_sec seconds of speech. load is the scheduler's
+        (running + queued) / max_concurrent; above 1 it stretches the predicted latency.
+        Returns the decision, which is also reported in the incident details.
+        """
+        contention = max(1.0, load)
+        chosen = self.tiers[-1]
+        reason = "degraded" if degraded else "slo_exceeded_by_all"
+        if not degraded:
+            for tier in self.tiers:
+                if tier.rtf * audio_sec * contention <= self.slo_sec:
+                    chosen = tier
+                    reason = "fits_slo"
+                    break
+
+        self.selected[chosen.name] += 1
+        return {
+            "tier": chosen.name,
+            "model": chosen.model_size,
+            "beam_size": chosen.beam_size,
+            "predicted_sec": round(chosen.rtf * audio_sec * contention, 3),
+            "slo_sec": self.slo_sec,
+            "load": round(load, 2),
+            "reason": reason
+        }
+
+    def observe(self, tier: str, audio_sec: float, elapsed_sec: float, load: float = 0.0):
+        """
+        Folds a measured transcription time into the tier's real-time factor,
+        normalized by the load it ran under so select() can scale it again.
+        """
+        if audio_sec < 1.0:
+            return  # fixed per-call overhead dominates very short clips
+        tier = self.get(tier)
+        rtf = elapsed_sec / (audio_sec * max(1.0, load))
+        tier.rtf = rtf if tier.observations == 0 else (1 - RTF_SMOOTHING) * tier.rtf + RTF_SMOOTHING * rtf
+        tier.observations += 1
+
+    def report(self) -> dict:
+        return {
+            "slo_sec": self.slo_sec,
+            "tiers": {tier.name: {**tier.as_dict(), "selected": self.selected[tier.name]} for tier in self.tiers}
+        }
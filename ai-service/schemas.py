@@ -31,3 +31,26 @@ class IncidentOutput(BaseModel):
     recommendedAction: RecommendedAction
     modelVersion: str = "v1.0.0"
     details: Optional[Dict[str, Any]] = None
+
+class StreamStart(BaseModel):
+    """First (text) message of a /stream-incident WebSocket session."""
+    incidentId: str = Field(..., description="Unique ID of the incident")
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    timestamp: int = Field(..., description="Unix timestamp")
+    sampleRate: int = Field(16000, gt=0, description="Sample rate of the PCM chunks that follow")
+    sampleFormat: str = Field("pcm_s16le", description="'pcm_s16le' or 'pcm_f32le', mono")
+
+class StreamUpdate(BaseModel):
+    """Interim assessment pushed to the client after each processed chunk window."""
+    type: str = "interim"
+    incidentId: str
+    transcript: str
+    stressScore: float
+    threatType: str
+    keywordScore: float = 0.0
+    severityScore: float
+    finalSeverity: str
+    recommendedAction: RecommendedAction
+    audioSec: float
+    firstCriticalSec: Optional[float] = None
@@ -0,0 +1,51 @@
+import itertools
+import json
+import numpy as np
+import pytest
+from config import config
+from models.fusion import FusionPolicy
+
+THREAT_TYPES = ["ASSAULT", "KIDNAP", "FIRE", "PANIC", "MEDICAL", "FALSE_ALARM", "UNKNOWN", "ROBBERY", ""]
+CONFIDENCES = [0.0, 0.35, 0.5, 0.9, 1.0]
+SCORES = [0.0, 0.25, 0.5, 0.75, 1.0]
+WEIGHTS = [
+    {"stress": 0.4, "threat": 0.3, "keyword": 0.2, "location": 0.1},
+    {"stress": 0.7, "threat": 0.3, "keyword": 0.0, "location": 0.0},
+    {"stress": 0.1, "threat": 0.6, "keyword": 0.2, "location": 0.3},
+    {"stress": 0.33, "threat": 0.33, "keyword": 0.33, "location": 0.33}
+]
+
+def write_policy(tmp_path, weights: dict) -> FusionPolicy:
+    with open(config.FUSION_POLICY_PATH) as f:
+        data = json.load(f)
+    data["weights"] = weights
+    path = tmp_path / "policy.json"
+    path.write_text(json.dumps(data))
+    return FusionPolicy(str(path))
+
+def grid():
+    rows = list(itertools.product(SCORES, THREAT_TYPES, CONFIDENCES, SCORES, SCORES))
+    return [np.array(column) for column in zip(*rows)]
+
+@pytest.mark.parametrize("weights", WEIGHTS)
+@pytest.mark.parametrize("dtype", [str, object])
+def test_score_batch_matches_score(tmp_path, weights, dtype):
+    policy = write_policy(tmp_path, weights)
+    stress, threat_types, confidences, keyword, location = grid()
+    scored = policy.score_batch(stress, threat_types.astype(dtype), confidences, keyword, location)
+    for i in range(len(stress)):
+        expected = policy.score(
+            float(stress[i]), {"threat_type": str(threat_types[i]), "confidence": float(confidences[i])},
+            float(keyword[i]), float(location[i])
+        )
+        assert round(float(scored["final_score"][i]), 2) == expected["final_score"]
+        assert scored["severity_level"][i] == expected["severity_level"]
+        assert scored["recommended_action"][i] == expected["recommended_action"]
+
+def test_score_batch_on_threshold_boundaries(tmp_path):
+    # Scores that land exactly on a level's min_score must pick the same level in both paths
+    policy = write_policy(tmp_path, {"stress": 1.0, "threat": 0.0, "keyword": 0.0, "location": 0.0})
+    stress = np.array([0.0, 0.4, 0.6, 0.8, 0.7999999, 1.0])
+    scored = policy.score_batch(stress, np.array(["UNKNOWN"] * len(stress)), np.zeros(len(stress)))
+    expected = [policy.score(float(s), {"threat_type": "UNKNOWN"})["severity_level"] for s in stress]
+    assert list(scored["severity_level"]) == expected == ["LOW", "MEDIUM", "HIGH", "CRITICAL", "HIGH", "CRITICAL"]
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import threading
+import numpy as np
+import pytest
+from utils.incident_store import IncidentStore
+
+LAT, LON = 28.6139, 77.2090
+
+def sha(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()
+
+def fill(store: IncidentStore, n: int, start: float = 1000.0, **kwargs):
+    for i in range(n):
+        store.add(f"inc-{i}", start + i, LAT, LON, "FIRE", "HIGH", 0.7, **kwargs)
+
+def ids(records) -> list:
+    return [value.decode() for value in records["incident_id"]]
+
+def test_ring_keeps_the_newest_in_insertion_order():
+    store = IncidentStore(capacity=5, path="")
+    fill(store, 8)
+    assert store.count == 5 and store.added == 8
+    assert ids(store.records()) == [f"inc-{i}" for i in range(3, 8)]
+
+def test_time_window_after_wrap():
+    store = IncidentStore(capacity=5, path="")
+    fill(store, 8)
+    # The window spans both halves of the wrapped ring: slots [3, 5) and [0, 1)
+    assert ids(store.window(1004, 1006)) == ["inc-4", "inc-5", "inc-6"]
+    assert ids(store.window(1000, 1002)) == []
+    assert ids(store.window(1006)) == ["inc-6", "inc-7"]
+
+def test_late_timestamps_are_still_found():
+    store = IncidentStore(capacity=4, path="")
+    store.add("a", 100.0, LAT, LON, "FIRE", "HIGH", 0.7)
+    store.add("b", 110.0, LAT, LON, "FIRE", "HIGH", 0.7)
+    store.add("late", 105.0, LAT, LON, "FIRE", "HIGH", 0.7)  # arrives after "b"
+    store.add("c", 120.0, LAT, LON, "FIRE", "HIGH", 0.7)
+    store.add("d", 130.0, LAT, LON, "FIRE", "HIGH", 0.7)  # wraps over "a"
+    assert ids(store.window(104, 111)) == ["b", "late"]
+    assert ids(store.window(0, 106)) == ["late"]
+
+def test_burst_counts_recent_incidents_nearby():
+    store = IncidentStore(capacity=100, path="")
+    store.add("near-critical", 990.0, LAT, LON, "ASSAULT", "CRITICAL", 0.9)
+    store.add("near", 995.0, LAT + 0.001, LON, "FIRE", "HIGH", 0.7)           # ~110 m away
+    store.add("far", 995.0, LAT + 0.1, LON, "FIRE", "HIGH", 0.7)              # ~11 km away
+    store.add("old", 1000.0 - 3600, LAT, LON, "FIRE", "HIGH", 0.7)            # outside the windows
+    store.add("no-location", 996.0, None, None, "FIRE", "HIGH", 0.7)
+    context = store.context(1000.0, LAT, LON)
+    assert context["nearby_recent"] == 2
+    assert context["nearby_critical"] == 1
+    assert context["duplicate_of"] is None
+    assert store.context(1000.0, None, None)["nearby_recent"] == 0
+
+def test_duplicates_by_audio_and_by_transcript():
+    store = IncidentStore(capacity=100, path="")
+    text = "please help there is a fire in the kitchen and my son is trapped upstairs"
+    store.add("by-audio", 900.0, None, None, "FIRE", "HIGH", 0.7, audio_sha256=sha("clip"))
+    store.add("by-text", 950.0, LAT, LON, "FIRE", "HIGH", 0.7, transcript=text)
+    # Same audio counts anywhere; the latest matching incident is reported
+    assert store.context(1000.0, None, None, audio_sha256=sha("clip"))["duplicate_of"] == "by-audio"
+    # A near-identical transcript counts from about the same place only
+    near = "Please help! There is a FIRE in the kitchen, and my son is trapped upstairs."
+    assert store.context(1000.0, LAT, LON, transcript=near)["duplicate_of"] == "by-text"
+    assert store.context(1000.0, LAT + 0.1, LON, transcript=near)["duplicate_of"] is None
+    assert store.context(1000.0, None, None, transcript=near)["duplicate_of"] is None
+    assert store.context(1000.0, LAT, LON, transcript="a car crashed into the wall")["duplicate_of"] is None
+
+def test_long_ids_are_cut_on_a_character_boundary():
+    store = IncidentStore(capacity=4, path="")
+    incident_id = "é" * 30  # 60 bytes of UTF-8
+    store.add(incident_id, 1000.0, LAT, LON, "FIRE", "HIGH", 0.7, audio_sha256=sha("clip"))
+    assert ids(store.records()) == ["é" * 20]
+    assert store.context(1001.0, LAT, LON, audio_sha256=sha("clip"))["duplicate_of"] == "é" * 20
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "incidents.npy")
+    store = IncidentStore(capacity=5, path=path)
+    fill(store, 8, audio_sha256=sha("clip"))
+    store.snapshot()
+    saved = store.records()
+
+    restored = IncidentStore(capacity=5, path=path)
+    assert np.array_equal(restored.records(), saved)
+    assert ids(restored.window(1004, 1006)) == ["inc-4", "inc-5", "inc-6"]
+    # New incidents continue the ring after the restored ones
+    restored.add("next", 1008.0, LAT, LON, "FIRE", "HIGH", 0.7)
+    assert ids(restored.records()) == ["inc-4", "inc-5", "inc-6", "inc-7", "next"]
+
+    smaller = IncidentStore(capacity=3, path=path)
+    assert ids(smaller.records()) == ["inc-5", "inc-6", "inc-7"]
+
+def test_failed_snapshot_is_retried(tmp_path, monkeypatch):
+    path = str(tmp_path / "incidents.npy")
+    store = IncidentStore(capacity=5, path=path)
+    fill(store, 3)
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(os, "replace", fail)
+        with pytest.raises(OSError):
+            store.snapshot()
+    assert not os.path.exists(path)
+    store.snapshot()
+    assert ids(IncidentStore(capacity=5, path=path).records()) == ["inc-0", "inc-1", "inc-2"]
+
+def test_snapshot_under_concurrent_adds_is_consistent(tmp_path):
+    path = str(tmp_path / "incidents.npy")
+    store = IncidentStore(capacity=50, path=path)
+    fill(store, 50, start=1950.0)
+    stop = threading.Event()
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            store.add(f"w-{i}", 2000.0 + i, LAT, LON, "FIRE", "HIGH", 0.7)
+            i += 1
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(20):
+            store.snapshot()
+            saved = np.load(path)
+            # Every snapshot is one ring state: consecutive incidents, oldest first
+            assert len(saved) == 50
+            assert np.all(np.diff(saved["timestamp"]) == 1.0)
+    finally:
+        stop.set()
+        thread.join()
+
+def test_close_waits_for_the_snapshotter(tmp_path, monkeypatch):
+    from config import config
+    monkeypatch.setattr(config, "INCIDENT_STORE_SNAPSHOT_SEC", 0.01)
+    path = str(tmp_path / "incidents.npy")
+    store = IncidentStore(capacity=5, path=path)
+    store.start()
+    fill(store, 8)
+    store.close()
+    assert store._snapshotter is None
+    assert ids(IncidentStore(capacity=5, path=path).records()) == [f"inc-{i}" for i in range(3, 8)]
@@ -0,0 +1,71 @@
+import pytest
+from models.keywords import KeywordMatcher, StreamingKeywordScanner
+
+# The classifier's keyword override before the lexicon existed: plain substring checks
+BASELINE_KEYWORDS = {
+    "fire": "FIRE",
+    "burning": "FIRE",
+    "smoke": "FIRE",
+    "heart attack": "MEDICAL",
+    "ambulance": "MEDICAL",
+    "bleeding": "MEDICAL",
+    "gun": "ASSAULT",
+    "shoot": "ASSAULT",
+    "knife": "ASSAULT",
+    "kill": "ASSAULT",
+    "help me": "PANIC",
+    "kidnap": "KIDNAP",
+    "taken": "KIDNAP"
+}
+
+INFLECTED = [
+    "he killed my brother",
+    "they are killing people",
+    "there are guns everywhere",
+    "i heard a gunshot",
+    "he is holding me at gunpoint",
+    "this is a kidnapping",
+    "the fires are spreading",
+    "the house is on fire",
+    "he shoots at the door",
+    "the room is smoking",
+    "send ambulances",
+    "she had two heart attacks",
+    "help me please"
+]
+
+def baseline_labels(text: str) -> set:
+    return {label for word, label in BASELINE_KEYWORDS.items() if word in text.lower()}
+
+@pytest.fixture(scope="module")
+def matcher():
+    return KeywordMatcher()
+
+@pytest.mark.parametrize("text", INFLECTED)
+def test_recall_matches_substring_baseline(matcher, text):
+    labels = {m["label"] for m in matcher.find(text)}
+    assert baseline_labels(text) <= labels
+
+def test_firing_is_assault(matcher):
+    assert matcher.scan("they are firing at us")["top_label"] == "ASSAULT"
+
+def test_inflections_report_the_lexicon_phrase(matcher):
+    matches = matcher.find("he killed him, he is killing")
+    assert [m["phrase"] for m in matches] == ["kill", "kill"]
+    assert [m["end"] - m["start"] for m in matches] == [len("killed"), len("killing")]
+    # Repeating one phrase in another form does not inflate the score
+    assert matcher.summarize(matches)["keyword_score"] == 0.9
+
+@pytest.mark.parametrize("text", ["that took real skill", "a wildfire far away", "a shotgun"])
+def test_no_match_inside_words(matcher, text):
+    assert matcher.find(text) == []
+
+def test_streaming_scan_matches_full_scan(matcher):
+    scanner = StreamingKeywordScanner(matcher)
+    text = ""
+    for word in "they will kill killing him with guns at gunpoint".split():
+        text = f"{text} {word}".strip()
+        # Grow the last word one character at a time, as tentative transcripts do
+        for end in range(len(text) - len(word) + 1, len(text) + 1):
+            result = scanner.update(text[:end])
+    assert result == matcher.scan(text)
@@ -0,0 +1,122 @@
+import os
+import subprocess
+import sys
+import time
+import pytest
+from config import config
+from utils import resources
+from utils.resources import ResourceManager, WaveformPool, sweep_scratch
+from utils.scheduler import OverloadedError
+
+SECONDS_30 = 30 * config.AUDIO_SAMPLE_RATE  # smallest size class, 1.92 MB of float32
+
+def make_manager(budget_mb: float, pool_mb: float = 64) -> ResourceManager:
+    return ResourceManager(budget_bytes=budget_mb * 1e6, pool=WaveformPool(max_bytes=pool_mb * 1e6, prealloc=0))
+
+def test_admission_is_rejected_while_the_budget_is_spent():
+    manager = make_manager(budget_mb=4)
+    first, second = manager.lease(), manager.lease()
+    first.reserve(2_000_000)
+    manager.check_admission()
+    second.reserve(2_000_000)
+    with pytest.raises(OverloadedError):
+        manager.check_admission()
+    # A reservation that would cross the budget fails without charging anything
+    with pytest.raises(OverloadedError):
+        first.reserve(1)
+    assert manager.in_use == 4_000_000 and first.held == 2_000_000
+    assert manager.rejected == 2
+
+    first.close()
+    manager.check_admission()
+    second.close()
+    assert manager.in_use == 0
+    assert manager.report()["max_request_peak_mb"] == 2.0
+
+def test_unlimited_budget_never_rejects():
+    manager = make_manager(budget_mb=0)
+    with manager.lease() as lease:
+        lease.reserve(10 ** 12)
+        manager.check_admission()
+
+def test_given_back_buffers_are_reused():
+    manager = make_manager(budget_mb=100)
+    with manager.lease() as lease:
+        buffer = lease.buffer(1000)
+        assert len(buffer) == SECONDS_30
+        assert manager.in_use == buffer.nbytes
+        lease.give_back(buffer)
+        assert manager.in_use == 0 and lease.held == 0
+        lease.give_back(buffer)  # not held any more: ignored
+        assert manager.in_use == 0
+        assert lease.buffer(SECONDS_30) is buffer
+        # A larger recording gets the next size class
+        assert len(lease.buffer(SECONDS_30 + 1)) == 2 * SECONDS_30
+        assert lease.peak == 3 * buffer.nbytes
+    # Closing the lease returns every buffer it still holds
+    assert manager.in_use == 0
+    assert manager.pool.report()["reused"] == 1
+    assert manager.pool.report()["allocated"] == 2
+    with manager.lease() as lease:
+        assert len(lease.buffer(1)) == SECONDS_30
+    assert manager.pool.report()["reused"] == 2
+
+def test_buffer_over_budget_goes_back_to_the_pool():
+    manager = make_manager(budget_mb=1)
+    with manager.lease() as lease:
+        with pytest.raises(OverloadedError):
+            lease.buffer(1000)
+        assert lease.held == 0
+    assert manager.in_use == 0
+    assert manager.pool.report()["idle_mb"] == round(SECONDS_30 * 4 / 1e6, 1)
+
+def test_idle_pool_is_capped():
+    pool = WaveformPool(max_bytes=SECONDS_30 * 4, prealloc=0)
+    first, second = pool.acquire(1), pool.acquire(1)
+    pool.release(first)
+    pool.release(second)  # over WAVEFORM_POOL_MAX_MB: dropped
+    assert pool.acquire(1) is first
+    assert pool.acquire(1) is not second
+
+@pytest.fixture
+def scratch(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SCRATCH_DIR", str(tmp_path / "tmp"))
+    monkeypatch.setattr(resources, "SHM_DIR", str(tmp_path / "shm"))
+    os.mkdir(tmp_path / "tmp")
+    os.mkdir(tmp_path / "shm")
+    return tmp_path
+
+def touch(path, age_sec: float = 0):
+    with open(path, "w") as f:
+        f.write("x")
+    mtime = time.time() - age_sec
+    os.utime(path, (mtime, mtime))
+
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def test_sweep_matches_scratch_files_to_their_owner(scratch):
+    live, dead = os.getppid(), dead_pid()
+    keep = [
+        scratch / "tmp" / f"sos_{live}_spool_a",              # live owner, recent
+        scratch / "shm" / f"sos_{live}_0123456789ab",
+        scratch / "tmp" / "sos_spool_b",                      # no owner pid, recent
+        scratch / "tmp" / f"other_{dead}_spool",              # not a scratch file
+    ]
+    remove = [
+        scratch / "tmp" / f"sos_{dead}_spool_c",              # owner gone
+        scratch / "shm" / f"sos_{dead}_0123456789ab",
+        scratch / "tmp" / f"sos_{os.getpid()}_spool_d",       # left by an earlier process with this pid
+        scratch / "tmp" / f"sos_{live}_spool_e",              # live owner, but older than the max age
+        scratch / "tmp" / "sos_spool_f",                      # no owner pid, old
+    ]
+    for path in keep + remove:
+        touch(path)
+    for path in remove[3:]:
+        touch(path, age_sec=7200)
+
+    assert sweep_scratch(max_age_sec=3600) == len(remove)
+    assert all(path.exists() for path in keep)
+    assert not any(path.exists() for path in remove)
@@ -0,0 +1,131 @@
+import asyncio
+import pytest
+from utils.scheduler import (
+    IncidentScheduler, OverloadedError, PRIORITY_CRITICAL, PRIORITY_ELEVATED, PRIORITY_NORMAL
+)
+
+def run(coro):
+    return asyncio.run(coro)
+
+async def settle():
+    # Lets every ready task run up to its next await
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+async def hold(scheduler, release: asyncio.Event, order: list, name: str, priority: int = PRIORITY_NORMAL):
+    async with scheduler.slot(priority) as ticket:
+        order.append((name, ticket.degraded))
+        await release.wait()
+
+def test_waiters_run_by_priority_then_fifo():
+    async def scenario():
+        scheduler = IncidentScheduler(max_concurrent=1, queue_limit=10, degrade_depth=10)
+        order, release = [], asyncio.Event()
+        holder = asyncio.create_task(hold(scheduler, release, order, "holder"))
+        await settle()
+        waiters = [
+            asyncio.create_task(hold(scheduler, release, order, name, priority))
+            for name, priority in [("normal-1", PRIORITY_NORMAL), ("critical", PRIORITY_CRITICAL),
+                                   ("normal-2", PRIORITY_NORMAL), ("elevated", PRIORITY_ELEVATED)]
+        ]
+        await settle()
+        assert scheduler.queue_depth == 4
+        release.set()
+        await asyncio.gather(holder, *waiters)
+        return [name for name, _ in order], scheduler.metrics()
+
+    order, metrics = run(scenario())
+    assert order == ["holder", "critical", "elevated", "normal-1", "normal-2"]
+    assert metrics["running"] == 0 and metrics["queued"] == 0 and metrics["completed"] == 5
+
+def test_admission_sheds_beyond_queue_limit():
+    scheduler = IncidentScheduler(max_concurrent=2, queue_limit=1, degrade_depth=10)
+    with scheduler.admit(), scheduler.admit(), scheduler.admit():
+        assert scheduler.in_flight == 3
+        with pytest.raises(OverloadedError):
+            with scheduler.admit():
+                pass
+        with pytest.raises(OverloadedError):
+            scheduler.check_admission()
+    assert scheduler.in_flight == 0
+    assert scheduler.rejected == 2
+    # Capacity is back once the admitted incidents finish
+    with scheduler.admit():
+        pass
+
+def test_slot_outside_admit_is_also_shed():
+    async def scenario():
+        scheduler = IncidentScheduler(max_concurrent=1, queue_limit=1, degrade_depth=10)
+        order, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(hold(scheduler, release, order, name)) for name in ("running", "queued")]
+        await settle()
+        with pytest.raises(OverloadedError):
+            async with scheduler.slot():
+                pass
+        release.set()
+        await asyncio.gather(*tasks)
+        return scheduler.rejected
+
+    assert run(scenario()) == 1
+
+def test_incidents_entering_a_deep_queue_are_degraded():
+    async def scenario():
+        scheduler = IncidentScheduler(max_concurrent=1, queue_limit=10, degrade_depth=2)
+        order, release = [], asyncio.Event()
+        tasks = []
+        for name in ("first", "second", "third", "fourth"):
+            tasks.append(asyncio.create_task(hold(scheduler, release, order, name)))
+            await settle()
+        release.set()
+        await asyncio.gather(*tasks)
+        return dict(order), scheduler.degraded
+
+    degraded, count = run(scenario())
+    # "fourth" arrived with two incidents already queued
+    assert degraded == {"first": False, "second": False, "third": False, "fourth": True}
+    assert count == 1
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = IncidentScheduler(max_concurrent=1, queue_limit=10, degrade_depth=10)
+        order, release = [], asyncio.Event()
+        holder = asyncio.create_task(hold(scheduler, release, order, "holder"))
+        await settle()
+        waiter = asyncio.create_task(hold(scheduler, release, order, "waiter"))
+        await settle()
+        assert scheduler.queue_depth == 1
+        waiter.cancel()
+        await settle()
+        assert scheduler.queue_depth == 0
+        release.set()
+        await holder
+        return [name for name, _ in order], scheduler.metrics()["running"]
+
+    order, running = run(scenario())
+    assert order == ["holder"]
+    assert running == 0
+
+def test_slot_handed_to_a_cancelled_waiter_passes_on():
+    async def scenario():
+        scheduler = IncidentScheduler(max_concurrent=1, queue_limit=10, degrade_depth=10)
+        order, release = [], asyncio.Event()
+        holder = scheduler.slot()
+        await holder.__aenter__()
+        first = asyncio.create_task(hold(scheduler, release, order, "first"))
+        await settle()
+        second = asyncio.create_task(hold(scheduler, release, order, "second"))
+        await settle()
+        # Hand the slot to "first", then cancel it before it gets to run
+        await holder.__aexit__(None, None, None)
+        first.cancel()
+        await settle()
+        assert scheduler.metrics()["running"] == 1
+        release.set()
+        await second
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return [name for name, _ in order], scheduler.metrics()
+
+    order, metrics = run(scenario())
+    assert order == ["second"]
+    assert metrics["running"] == 0 and metrics["queued"] == 0
@@ -0,0 +1,157 @@
+"""
+Exports the threat classifier to ONNX and verifies the alternative inference backends
+against the fp32 PyTorch model.
+
+Usage (from ai-service/):
+    # Write the dynamic int8 ONNX model to THREAT_ONNX_PATH (add --no-quantize for fp32)
+    python threat_export.py export
+    # Label agreement, latency and memory of each backend against fp32 torch
+    python threat_export.py verify --backends torch torch-int8 onnx --output threat_backends.json
+
+Each backend is measured in its own fresh process, so the reported import/load
+time and resident memory are what a service instance would actually pay.
+Exits 1 if a backend's label agreement is below --min-agreement.
+"""
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+import time
+
+import numpy as np
+
+from config import config
+
+SAMPLE_TRANSCRIPTS = [
+    "help me, there is a fire in the kitchen and the smoke is everywhere",
+    "my father is having a heart attack, please send an ambulance",
+    "someone has a gun and they are shooting at people outside",
+    "a man with a knife is following me, I am scared",
+    "they took my daughter, she was taken into a white van",
+    "I am bleeding a lot after the accident",
+    "sorry, I pressed the button by mistake, everything is fine",
+    "please hurry, I can't breathe",
+    "the building next door is burning",
+    "he said he will kill me if I call anyone",
+    "",
+    "hello? hello? can anyone hear me",
+]
+
+def rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def percentile(values: list, q: float) -> float:
+    return round(float(np.percentile(values, q)), 5) if values else None
+
+def measure_backend(backend: str, texts: list, repeats: int, batch_size: int) -> dict:
+    """Runs in a fresh process: loads one backend and scores the texts."""
+    config.THREAT_BATCHING_ENABLED = False
+    baseline_mb = rss_mb()
+
+    start = time.perf_counter()
+    from models.threat_classifier import ThreatClassifier
+    classifier = ThreatClassifier(backend=backend)
+    load_sec = time.perf_counter() - start
+    classifier.warmup()
+
+    single = []
+    for _ in range(repeats):
+        for text in texts:
+            start = time.perf_counter()
+            classifier.classify_batch([text])
+            single.append(time.perf_counter() - start)
+
+    batched = []
+    for _ in range(repeats):
+        for i in range(0, len(texts), batch_size):
+            start = time.perf_counter()
+            classifier.classify_batch(texts[i:i + batch_size])
+            batched.append((time.perf_counter() - start) / len(texts[i:i + batch_size]))
+
+    results = classifier.classify_batch(texts)
+    return {
+        "backend": backend,
+        "load_sec": round(load_sec, 3),
+        "peak_rss_mb": round(rss_mb(), 1),
+        "model_rss_mb": round(rss_mb() - baseline_mb, 1),
+        "latency_sec": {"p50": percentile(single, 50), "p95": percentile(single, 95)},
+        "batched_latency_per_text_sec": {"p50": percentile(batched, 50), "p95": percentile(batched, 95)},
+        "raw_labels": [r.get("raw_label") for r in results],
+        "threat_types": [r["threat_type"] for r in results],
+        "confidences": [r["confidence"] for r in results],
+    }
+
+def run_isolated(backend: str, texts: list, repeats: int, batch_size: int) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        return pool.apply(measure_backend, (backend, texts, repeats, batch_size))
+
+def verify(args) -> int:
+    texts = SAMPLE_TRANSCRIPTS
+    if args.texts:
+        with open(args.texts) as f:
+            texts = [line.rstrip("\n") for line in f]
+
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    reports = {}
+    for backend in backends:
+        print(f"Measuring {backend}...", file=sys.stderr)
+        reports[backend] = run_isolated(backend, texts, args.repeats, args.batch_size)
+
+    reference = reports["torch"]
+    failed = False
+    for backend, report in reports.items():
+        agree = [a == b for a, b in zip(report["raw_labels"], reference["raw_labels"])]
+        report["label_agreement"] = round(sum(agree) / max(len(agree), 1), 4)
+        report["max_confidence_delta"] = round(
+            max((abs(a - b) for a, b in zip(report["confidences"], reference["confidences"])), default=0.0), 4
+        )
+        report["speedup_p50"] = round(
+            reference["latency_sec"]["p50"] / max(report["latency_sec"]["p50"], 1e-9), 2
+        )
+        report["memory_saved_mb"] = round(reference["model_rss_mb"] - report["model_rss_mb"], 1)
+        report["disagreements"] = [texts[i] for i, ok in enumerate(agree) if not ok]
+        failed = failed or report["label_agreement"] < args.min_agreement
+        print(
+            f"{backend:>11}  agree={report['label_agreement']:.3f}  p50={report['latency_sec']['p50']}s  "
+            f"x{report['speedup_p50']}  model_rss={report['model_rss_mb']}MB",
+            file=sys.stderr
+        )
+
+    text = json.dumps({"benchmark": "threat_backends", "model_id": config.THREAT_MODEL_ID, "results": reports}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 1 if failed else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Export the threat model to ONNX")
+    export.add_argument("--model-id", default=config.THREAT_MODEL_ID)
+    export.add_argument("--path", default=config.THREAT_ONNX_PATH)
+    export.add_argument("--no-quantize", action="store_true", help="Keep the exported graph in fp32")
+
+    check = commands.add_parser("verify", help="Compare backends against fp32 torch")
+    check.add_argument("--backends", nargs="+", default=["torch-int8", "onnx"])
+    check.add_argument("--texts", help="File with one transcript per line (default: built-in samples)")
+    check.add_argument("--repeats", type=int, default=5)
+    check.add_argument("--batch-size", type=int, default=8)
+    check.add_argument("--min-agreement", type=float, default=0.95)
+    check.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        from models.threat_backends import export_onnx
+        path = export_onnx(args.model_id, args.path, quantize=not args.no_quantize)
+        print(f"ONNX threat model written to {path}. Set THREAT_BACKEND=onnx THREAT_ONNX_PATH={path}")
+        return 0
+    return verify(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
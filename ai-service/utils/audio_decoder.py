@@ -0,0 +1,141 @@
+import collections
+import logging
+import threading
+import av
+import numpy as np
+from config import config
+from utils.scheduler import OverloadedError
+
+logger = logging.getLogger(__name__)
+
+class AudioTooLongError(ValueError):
+    """Raised while decoding as soon as the audio exceeds the allowed duration."""
+
+class ChunkPipe:
+    """
+    Read-only, non-seekable file-like object fed with chunks from another thread.
+    Lets PyAV start decoding while the download (or request body) is still arriving:
+    read() blocks until enough data is buffered or the writer finishes.
+    """
+    def __init__(self):
+        self._chunks = collections.deque()
+        self._buffered = 0
+        self._eof = False
+        self._error = None
+        self._discarding = False
+        self._cond = threading.Condition()
+
+    def feed(self, data: bytes):
+        with self._cond:
+            if self._discarding:
+                return
+            self._chunks.append(data)
+            self._buffered += len(data)
+            self._cond.notify_all()
+
+    def finish(self, error: Exception = None):
+        """Marks the end of the stream; with error, pending and future reads raise it."""
+        with self._cond:
+            self._eof = True
+            self._error = error
+            self._cond.notify_all()
+
+    def discard(self):
+        """Drops buffered data and ignores later feeds, once the reader has stopped reading."""
+        with self._cond:
+            self._discarding = True
+            self._chunks.clear()
+            self._buffered = 0
+
+    def read(self, size: int = -1) -> bytes:
+        with self._cond:
+            while not self._eof and (size < 0 or self._buffered < size):
+                self._cond.wait()
+            if self._error:
+                raise self._error
+            
+            out = bytearray()
+            while self._chunks and (size < 0 or len(out) < size):
+                chunk = self._chunks.popleft()
+                take = len(chunk) if size < 0 else min(len(chunk), size - len(out))
+                out += chunk[:take]
+                if take < len(chunk):
+                    self._chunks.appendleft(chunk[take:])
+            self._buffered -= len(out)
+            return bytes(out)
+
+class AudioDecoder:
+    @staticmethod
+    def decode(source, max_duration_sec: float = None, lease=None) -> np.ndarray:
+        """
+        Decodes and resamples audio (a path, a binary file-like object or a ChunkPipe) once
+        into a mono float32 waveform at config.AUDIO_SAMPLE_RATE.
+        Decoding is incremental, so MAX_AUDIO_DURATION_SEC is enforced as samples arrive.
+        With an AudioLease, buffers come from the waveform pool and count against the memory budget.
+        The returned buffer is shared by every model for the incident and must be treated as read-only.
+        Raises AudioTooLongError for over-long audio, OverloadedError when the memory budget is
+        exhausted and ValueError if the audio cannot be decoded.
+        """
+        limit_sec = max_duration_sec or config.MAX_AUDIO_DURATION_SEC
+        try:
+            with av.open(source, mode="r", metadata_errors="ignore") as container:
+                return AudioDecoder._decode_container(container, int(limit_sec * config.AUDIO_SAMPLE_RATE), lease)
+        except (AudioTooLongError, OverloadedError):
+            raise
+        except Exception as e:
+            logger.error(f"Audio decoding failed: {e}")
+            raise ValueError(f"Audio decoding failed: {str(e)}")
+
+    @staticmethod
+    def _decode_container(container, max_samples: int, lease=None) -> np.ndarray:
+        sr = config.AUDIO_SAMPLE_RATE
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=sr)
+        allocate = lease.buffer if lease is not None else (lambda samples: np.empty(samples, dtype=np.float32))
+        buffer = allocate(min(max_samples, 30 * sr))
+        n = 0
+        
+        def append(frames):
+            nonlocal buffer, n
+            for frame in frames:
+                samples = frame.to_ndarray().reshape(-1)
+                end = n + len(samples)
+                if end > max_samples:
+                    raise AudioTooLongError(
+                        f"Audio exceeds maximum duration of {max_samples / sr:.0f} seconds"
+                    )
+                if end > len(buffer):
+                    grown = allocate(min(max(end, 2 * len(buffer)), max_samples))
+                    grown[:n] = buffer[:n]
+                    if lease is not None:
+                        lease.give_back(buffer)
+                    buffer = grown
+                buffer[n:end] = samples
+                n = end
+        
+        try:
+            stream = container.streams.audio[0]
+            packets = iter(container.demux(stream))
+            while True:
+                try:
+                    packet = next(packets)
+                except StopIteration:
+                    break
+                try:
+                    decoded = packet.decode()
+                except av.error.InvalidDataError:
+                    # Same policy as faster-whisper: skip corrupt frames instead of failing the incident
+                    continue
+                for frame in decoded:
+                    append(resampler.resample(frame))
+            append(resampler.resample(None))
+        except BaseException:
+            # A failed attempt (e.g. a pipe decode before the spooled retry) frees its buffer at once
+            if lease is not None:
+                lease.give_back(buffer)
+            raise
+        
+        return buffer[:n]
+
+    @staticmethod
+    def duration_sec(waveform: np.ndarray) -> float:
+        return len(waveform) / float(config.AUDIO_SAMPLE_RATE)
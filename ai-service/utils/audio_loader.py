@@ -1,23 +1,72 @@
+import asyncio
+import contextlib
+import hashlib
+import httpx
 import requests
 import tempfile
 import os
 import logging
 from urllib.parse import urlparse
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import ClientDisconnect
 from config import config
+from utils.audio_decoder import AudioDecoder, AudioTooLongError, ChunkPipe
+from utils.pipeline import stage
+from utils.resources import scratch_dir, scratch_prefix
+from utils.scheduler import OverloadedError
 
 logger = logging.getLogger(__name__)
 
+# File suffix for ffmpeg/whisper format detection, by Content-Type
+CONTENT_TYPE_SUFFIXES = {
+    "audio/wav": ".wav",
+    "audio/x-wav": ".wav",
+    "audio/mpeg": ".mp3",
+    "audio/mp3": ".mp3",
+    "audio/ogg": ".ogg",
+    "audio/opus": ".opus",
+    "audio/webm": ".webm",
+    "audio/mp4": ".m4a",
+    "audio/aac": ".aac",
+}
+
 class AudioLoader:
+    # Shared session so repeated downloads reuse keep-alive connections
+    _session = requests.Session()
+
     @staticmethod
     def validate_url(url: str) -> bool:
         """Basic validation of the signed URL."""
         parsed = urlparse(url)
         return bool(parsed.scheme and parsed.netloc)
 
+    @staticmethod
+    def suffix_for(url: str, content_type: str = "") -> str:
+        """Picks the temp/spool file suffix from the Content-Type, then the URL path extension."""
+        content_type = (content_type or "").split(";")[0].strip().lower()
+        if content_type in CONTENT_TYPE_SUFFIXES:
+            return CONTENT_TYPE_SUFFIXES[content_type]
+        ext = os.path.splitext(urlparse(url).path)[1].lower()
+        if ext in CONTENT_TYPE_SUFFIXES.values() or ext in (".flac", ".3gp", ".amr"):
+            return ext
+        return ".tmp"
+
+    @staticmethod
+    @contextlib.contextmanager
+    def downloaded(url: str):
+        """download_audio() as a context manager: yields the path and deletes the file on exit."""
+        path = AudioLoader.download_audio(url)
+        try:
+            yield path
+        finally:
+            AudioLoader.cleanup_file(path)
+
     @staticmethod
     def download_audio(url: str) -> str:
         """
-        Downloads audio from a signed URL to a temporary file.
+        Downloads audio from a signed URL to a scratch file, which the caller must delete
+        (prefer downloaded()); a failed download deletes its partial file itself, and
+        files orphaned by a crash are removed by the startup sweep (sweep_scratch).
         Returns the path to the temporary file.
         Raises ValueError if download fails or format is invalid.
         """
@@ -26,7 +75,7 @@ class AudioLoader:
 
         try:
             # Stream download to avoid loading large files into memory
-            with requests.get(url, stream=True, timeout=10) as response:
+            with AudioLoader._session.get(url, stream=True, timeout=config.DOWNLOAD_TIMEOUT_SEC) as response:
                 response.raise_for_status()
                 
                 content_type = response.headers.get('Content-Type', '').lower()
@@ -36,14 +85,22 @@ class AudioLoader:
 
                 # Create a temp file
                 # Suffix is important for ffmpeg/whisper to detect format
-                suffix = ".tmp" 
-                if "wav" in url.lower(): suffix = ".wav"
-                elif "mp3" in url.lower(): suffix = ".mp3"
-                elif "ogg" in url.lower(): suffix = ".ogg"
+                suffix = AudioLoader.suffix_for(url, content_type)
                 
-                with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        tmp_file.write(chunk)
+                size = 0
+                with tempfile.NamedTemporaryFile(
+                    delete=False, suffix=suffix, prefix=scratch_prefix("download"), dir=scratch_dir()
+                ) as tmp_file:
+                    try:
+                        for chunk in response.iter_content(chunk_size=config.DOWNLOAD_CHUNK_BYTES):
+                            size += len(chunk)
+                            if size > config.MAX_AUDIO_BYTES:
+                                raise ValueError(f"Audio exceeds maximum size of {config.MAX_AUDIO_BYTES} bytes")
+                            tmp_file.write(chunk)
+                    except BaseException:
+                        tmp_file.close()
+                        AudioLoader.cleanup_file(tmp_file.name)
+                        raise
                     return tmp_file.name
                     
         except requests.RequestException as e:
@@ -58,3 +115,296 @@ class AudioLoader:
                 os.remove(path)
             except Exception as e:
                 logger.error(f"Failed to delete temp file {path}: {e}")
+
+class AudioUpload:
+    """
+    Audio sent in the request body rather than by URL: an async iterator of byte chunks
+    (e.g. Starlette's request.stream()) with the request's Content-Type. The body is either
+    the raw audio or multipart/form-data whose UPLOAD_FIELD part is the audio.
+    """
+    UPLOAD_FIELD = "audio"
+
+    def __init__(self, chunks, content_type: str = "", declared_bytes: int = 0):
+        self.chunks = chunks
+        self.content_type = content_type or ""  # not lowercased: multipart boundaries are case-sensitive
+        self.declared_bytes = declared_bytes
+        self.is_multipart = self.content_type.lower().startswith("multipart/form-data")
+        self.audio_content_type = "" if self.is_multipart else self.content_type.lower()
+
+    async def audio_chunks(self):
+        """Yields the audio bytes as they arrive; multipart bodies are parsed incrementally."""
+        if not self.is_multipart:
+            async for chunk in self.chunks:
+                yield chunk
+            return
+
+        _, params = parse_options_header(self.content_type)
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise ValueError("Multipart upload without a boundary")
+
+        part = {"field": b"", "headers": {}, "name": None}
+        pending = []  # audio slices parsed out of the current chunk
+        found = False
+
+        def on_part_begin():
+            part["headers"] = {}
+
+        def on_header_field(data, start, end):
+            part["field"] += data[start:end]
+
+        def on_header_value(data, start, end):
+            key = part["field"].lower()
+            part["headers"][key] = part["headers"].get(key, b"") + data[start:end]
+
+        def on_header_end():
+            part["field"] = b""
+
+        def on_headers_finished():
+            _, disposition = parse_options_header(part["headers"].get(b"content-disposition", b""))
+            part["name"] = disposition.get(b"name", b"").decode("latin-1")
+            if part["name"] == self.UPLOAD_FIELD:
+                self.audio_content_type = part["headers"].get(b"content-type", b"").decode("latin-1").lower()
+
+        def on_part_data(data, start, end):
+            if part["name"] == self.UPLOAD_FIELD:
+                # A view into the received chunk: the audio is not copied out of the request body
+                pending.append(memoryview(data)[start:end])
+
+        parser = MultipartParser(boundary, {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+        })
+        async for chunk in self.chunks:
+            parser.write(chunk)
+            for piece in pending:
+                found = True
+                yield piece
+            pending.clear()
+        parser.finalize()
+        if not found:
+            raise ValueError(f"Multipart upload has no '{self.UPLOAD_FIELD}' part")
+
+class StreamingDecode:
+    """
+    Tees an incoming audio body into a spooled copy (in memory below AUDIO_SPOOL_MAX_BYTES),
+    its sha256 and a ChunkPipe that the decoder consumes on the pipeline executor, so decoding
+    overlaps the transfer and MAX_AUDIO_DURATION_SEC stops it early.
+    """
+    def __init__(self, executor, timings: dict, suffix: str, lease=None):
+        self.executor = executor
+        self.timings = timings
+        self.lease = lease
+        self.pipe = ChunkPipe()
+        self.digest = hashlib.sha256()
+        self.size = 0
+        # Spilled spools are unlinked on creation, so they cannot outlive the process
+        self.spool = tempfile.SpooledTemporaryFile(
+            max_size=config.AUDIO_SPOOL_MAX_BYTES,
+            prefix=scratch_prefix("audio"),
+            suffix=suffix,
+            dir=scratch_dir()
+        )
+        self.decode_task = asyncio.ensure_future(
+            executor.run_stage("decode", timings, AudioDecoder.decode, self.pipe, lease=lease)
+        )
+
+    def feed(self, chunk):
+        if self.size + len(chunk) > config.MAX_AUDIO_BYTES:
+            raise ValueError(f"Audio exceeds maximum size of {config.MAX_AUDIO_BYTES} bytes")
+        if self.lease is not None:
+            self.lease.reserve(len(chunk))  # the spooled copy is held until decoding finishes
+        self.size += len(chunk)
+        self.spool.write(chunk)
+        self.digest.update(chunk)
+        if not self.decode_task.done():
+            self.pipe.feed(chunk)
+            return
+        
+        # The decoder has stopped reading; unread chunks would hold the body a second time
+        self.pipe.discard()
+        # Stop receiving as soon as the decoder knows the clip is too long or out of budget
+        if isinstance(self.decode_task.exception(), (AudioTooLongError, OverloadedError)):
+            raise self.decode_task.exception()
+
+    def finish(self):
+        self.pipe.finish()
+
+    def _close_spool(self):
+        self.pipe.discard()
+        self.spool.close()
+        if self.lease is not None:
+            self.lease.release(self.size)
+
+    async def abort(self):
+        self.pipe.finish(ValueError("Download aborted"))
+        await asyncio.gather(self.decode_task, return_exceptions=True)
+        self._close_spool()
+
+    async def result(self, content_type: str) -> tuple:
+        """Waits for the decoder; returns (waveform, info) like AsyncAudioLoader.fetch()."""
+        streamed = True
+        try:
+            waveform = await self.decode_task
+        except (AudioTooLongError, OverloadedError):
+            raise
+        except ValueError as e:
+            # Containers that need seeking (e.g. MP4 with a trailing moov atom, as recorded
+            # by the Android app) cannot be decoded from a pipe; decode the spooled copy instead
+            logger.info(f"Streaming decode failed ({e}); decoding spooled copy")
+            streamed = False
+            self.spool.seek(0)
+            waveform = await self.executor.run_stage(
+                "decode", self.timings, AudioDecoder.decode, self.spool, lease=self.lease
+            )
+        finally:
+            self._close_spool()
+        
+        return waveform, {
+            "bytes": self.size,
+            "content_type": content_type,
+            "sha256": self.digest.hexdigest(),
+            "streamed_decode": streamed
+        }
+
+class AsyncAudioLoader:
+    """
+    Async downloader for the request path.
+    One pooled httpx client (keep-alive, HTTP/2 when h2 is installed) is shared by all
+    incidents. The body is streamed through a StreamingDecode, so decoding overlaps the download.
+    """
+    _client = None
+
+    @classmethod
+    def client(cls) -> httpx.AsyncClient:
+        if cls._client is None:
+            limits = httpx.Limits(
+                max_connections=config.DOWNLOAD_MAX_CONNECTIONS,
+                max_keepalive_connections=config.DOWNLOAD_MAX_CONNECTIONS,
+                keepalive_expiry=30.0
+            )
+            timeout = httpx.Timeout(config.DOWNLOAD_TIMEOUT_SEC, connect=5.0)
+            try:
+                cls._client = httpx.AsyncClient(http2=True, limits=limits, timeout=timeout, follow_redirects=True)
+            except ImportError:
+                logger.warning("h2 is not installed; audio downloads use HTTP/1.1 keep-alive only")
+                cls._client = httpx.AsyncClient(limits=limits, timeout=timeout, follow_redirects=True)
+        return cls._client
+
+    @classmethod
+    async def close(cls):
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+
+    @classmethod
+    async def load(cls, source, executor, timings: dict, lease=None) -> tuple:
+        """
+        fetch() for http(s) URLs and receive() for an AudioUpload. Any other string is treated
+        as a local file path (batch replay of stored recordings), which is hashed and decoded
+        on the executor. Returns (waveform, info) like fetch(); with an AudioLease, the body
+        and waveform count against the memory budget.
+        """
+        if isinstance(source, AudioUpload):
+            return await cls.receive(source, executor, timings, lease)
+        if source.startswith(("http://", "https://")):
+            return await cls.fetch(source, executor, timings, lease)
+        return await executor.run_stage("decode", timings, cls._read_local, source, lease)
+
+    @staticmethod
+    def _read_local(path: str, lease=None) -> tuple:
+        try:
+            size = os.path.getsize(path)
+        except OSError as e:
+            raise ValueError(f"Failed to read audio file {path}: {e}")
+        if size > config.MAX_AUDIO_BYTES:
+            raise ValueError(f"Audio exceeds maximum size of {config.MAX_AUDIO_BYTES} bytes")
+        
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(config.DOWNLOAD_CHUNK_BYTES), b""):
+                digest.update(chunk)
+        
+        return AudioDecoder.decode(path, lease=lease), {
+            "bytes": size,
+            "content_type": "",
+            "sha256": digest.hexdigest(),
+            "streamed_decode": False
+        }
+
+    @staticmethod
+    def _check_content_type(content_type: str):
+        if content_type and content_type.split(";")[0] not in config.ALLOWED_AUDIO_TYPES and "octet-stream" not in content_type:
+            logger.warning(f"Warning: Unexpected Content-Type {content_type}")
+
+    @classmethod
+    async def fetch(cls, url: str, executor, timings: dict, lease=None) -> tuple:
+        """
+        Downloads and decodes the audio at url.
+        Returns (waveform, info) where info has the byte count, content type, the sha256
+        of the raw bytes and whether decoding ran while streaming.
+        Raises ValueError if the download fails, the audio is too large/long or undecodable.
+        """
+        if not AudioLoader.validate_url(url):
+            raise ValueError("Invalid audio URL format.")
+        
+        body = None
+        content_type = ""
+        
+        with stage("download", timings):
+            try:
+                async with cls.client().stream("GET", url) as response:
+                    response.raise_for_status()
+                    
+                    content_type = response.headers.get("Content-Type", "").lower()
+                    cls._check_content_type(content_type)
+                    
+                    declared = int(response.headers.get("Content-Length") or 0)
+                    if declared > config.MAX_AUDIO_BYTES:
+                        raise ValueError(f"Audio exceeds maximum size of {config.MAX_AUDIO_BYTES} bytes")
+                    
+                    body = StreamingDecode(executor, timings, AudioLoader.suffix_for(url, content_type), lease)
+                    async for chunk in response.aiter_bytes(config.DOWNLOAD_CHUNK_BYTES):
+                        body.feed(chunk)
+                
+                body.finish()
+                
+            except BaseException as e:
+                # Also on cancellation: the decoder must stop reading before the lease is closed
+                if body:
+                    await body.abort()
+                if isinstance(e, httpx.HTTPError):
+                    logger.error(f"Failed to download audio: {e}")
+                    raise ValueError(f"Failed to download audio: {str(e)}")
+                raise
+        
+        return await body.result(content_type)
+
+    @classmethod
+    async def receive(cls, upload: AudioUpload, executor, timings: dict, lease=None) -> tuple:
+        """
+        Decodes audio from the request body while it is still arriving, with the same limits,
+        spooled fallback and (waveform, info) result as fetch(), minus the storage round-trip.
+        """
+        if upload.declared_bytes > config.MAX_AUDIO_BYTES:
+            raise ValueError(f"Audio exceeds maximum size of {config.MAX_AUDIO_BYTES} bytes")
+        if not upload.is_multipart:
+            cls._check_content_type(upload.audio_content_type)
+        
+        body = StreamingDecode(executor, timings, AudioLoader.suffix_for("", upload.audio_content_type), lease)
+        with stage("upload", timings):
+            try:
+                async for chunk in upload.audio_chunks():
+                    body.feed(chunk)
+                body.finish()
+            except BaseException as e:
+                await body.abort()
+                if isinstance(e, ClientDisconnect):
+                    raise ValueError("Audio upload aborted by the client")
+                raise
+        
+        return await body.result(upload.audio_content_type)
@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import time
+from models.fusion import FusionEngine
+from models.keywords import KeywordMatcher
+from models.location_risk import LocationRiskIndex
+from schemas import IncidentOutput
+from utils.audio_decoder import AudioDecoder
+from utils import metrics, tracing
+from utils.audio_loader import AsyncAudioLoader
+from utils.incident_store import IncidentStore
+from utils.pipeline import stage
+from utils.resources import ResourceManager
+from utils.result_cache import ResultCache
+from utils.scheduler import OverloadedError, priority_from_stress
+from utils.worker_pool import ModelWorkerPool, PooledModel, RemoteTranscriptionInfo, pool_size
+
+logger = logging.getLogger(__name__)
+
+def load_pipeline_models(registry) -> tuple:
+    """
+    Loads and warms the registry's models (blocking). In worker-pool mode the inference
+    models are wrapped in proxies backed by a started ModelWorkerPool; with fork workers,
+    call it on the main thread before starting any other thread (see ModelWorkerPool.start).
+    Returns (models, pool) where models maps transcription/emotion/threat/vad to instances.
+    """
+    loaded = registry.load_all()
+    models = {"vad": loaded.get("vad")}
+    pool = None
+    if pool_size():
+        # Inference moves to forked worker processes; VAD and triage stay in this process.
+        # Classification never runs here, so the batcher thread goes before the fork
+        loaded["threat"].stop_batcher()
+        pool = ModelWorkerPool(inherited={"emotion": loaded["emotion"], "threat": loaded["threat"]})
+        pool.start()
+        models["transcription"] = PooledModel(pool, RemoteTranscriptionInfo())
+        models["emotion"] = PooledModel(pool, loaded["emotion"])
+        models["threat"] = PooledModel(pool, loaded["threat"])
+    else:
+        models["transcription"] = loaded["transcription"]
+        models["emotion"] = loaded["emotion"]
+        models["threat"] = loaded["threat"]
+    # Load the risk map and fusion policy now rather than on the first incident;
+    # after the fork, as they start their reload threads
+    LocationRiskIndex.shared()
+    FusionEngine.policy()
+    return models, pool
+
+class IncidentPipeline:
+    """
+    The per-incident pipeline: download + decode, voice activity, triage, transcription and
+    stress analysis in parallel, keyword scan and threat classification, then fusion.
+    Shared by the /process-incident endpoint and the batch replay CLI (batch_process.py);
+    the scheduler bounds how many incidents run the models at once.
+    """
+    def __init__(self, executor, transcription_service, audio_stress_detector, threat_classifier,
+                 scheduler, voice_activity_detector=None, result_cache: ResultCache = None,
+                 incident_store: IncidentStore = None, resources: ResourceManager = None, mode: str = "http"):
+        self.mode = mode  # metrics label: "http" or "batch"
+        self.executor = executor
+        self.transcription_service = transcription_service
+        self.audio_stress_detector = audio_stress_detector
+        self.threat_classifier = threat_classifier
+        self.voice_activity_detector = voice_activity_detector
+        self.scheduler = scheduler
+        self.result_cache = result_cache
+        self.incident_store = incident_store
+        self.resources = resources
+
+    async def run(self, incident_id: str, audio_source, latitude: float = None, longitude: float = None,
+                  timestamp: float = None) -> IncidentOutput:
+        """
+        Processes one incident. audio_source is an http(s) URL, an AudioUpload (audio in the
+        request body) or, for batch replay, a local path.
+        The coordinates and timestamp feed location risk; without them it is 0.
+        """
+        start = time.perf_counter()
+        with tracing.span("incident", **{"incident.id": incident_id, "incident.mode": self.mode}) as span:
+            try:
+                output = await self._run(incident_id, audio_source, latitude, longitude, timestamp)
+            except OverloadedError:
+                metrics.observe_incident(self.mode, time.perf_counter() - start, outcome="rejected")
+                raise
+            except Exception:
+                metrics.observe_incident(self.mode, time.perf_counter() - start, outcome="error")
+                raise
+            if span is not None:
+                span.set_attribute("incident.severity", output.finalSeverity)
+        metrics.observe_incident(self.mode, time.perf_counter() - start, output)
+        return output
+
+    async def _run(self, incident_id: str, audio_source, latitude: float, longitude: float,
+                   timestamp: float) -> IncidentOutput:
+        # Reject before downloading anything if the queue is already full or the audio memory budget is spent;
+        # an admitted incident counts against the queue from here until it finishes
+        with self.scheduler.admit():
+            if self.resources is None:
+                return await self._process(incident_id, audio_source, latitude, longitude, timestamp)
+            self.resources.check_admission()
+            # The lease returns the incident's buffers to the pool once every stage is done with the waveform
+            with self.resources.lease() as lease:
+                return await self._process(incident_id, audio_source, latitude, longitude, timestamp, lease)
+
+    async def _process(self, incident_id: str, audio_source, latitude: float, longitude: float,
+                       timestamp: float, lease=None) -> IncidentOutput:
+        start_time = time.time()
+        stage_timings = {}
+        executor = self.executor
+        transcription_service = self.transcription_service
+        audio_stress_detector = self.audio_stress_detector
+        threat_classifier = self.threat_classifier
+
+        # All blocking stages run on the pipeline executor so the event loop stays responsive
+        # 1. Download + decode Audio
+        # Decoding starts while the download streams in; every model shares the resulting
+        # in-memory 16 kHz waveform
+        logger.info("Step 1: Downloading and decoding audio...")
+        waveform, download_info = await AsyncAudioLoader.load(audio_source, executor, stage_timings, lease)
+        audio_hash = download_info["sha256"]
+
+        # Voice activity: speech regions are found once and both models only process those
+        speech_map = None
+        speech_version = "vad:off"
+        if self.voice_activity_detector:
+            speech_map = await executor.run_stage(
+                "vad", stage_timings, self.voice_activity_detector.detect, waveform
+            )
+            speech_version = self.voice_activity_detector.version
+
+        # Triage: a cheap stress score on the first seconds of speech decides queue priority,
+        # so likely-critical incidents reach the models first
+        prelim_stress = await executor.run_stage(
+            "triage", stage_timings, audio_stress_detector.quick_score,
+            speech_map.audio if speech_map else waveform
+        )
+
+        async with self.scheduler.slot(priority_from_stress(prelim_stress), admitted=True) as ticket:
+            # Under overload, degraded incidents use the cheapest Whisper tier and the fast stress engine
+            degraded = ticket.degraded
+            pitch_engine = "fast" if degraded else audio_stress_detector.pitch_engine
+            
+            # Whisper tier: the most accurate one predicted to meet the latency SLO for this much speech at this load
+            speech_sec = speech_map.speech_sec if speech_map else AudioDecoder.duration_sec(waveform)
+            load = self.scheduler.load
+            tier = transcription_service.select_tier(speech_sec, load, degraded)
+            metrics.observe_tier(tier["tier"], tier["reason"])
+
+            # 2 + 3. Transcription and Emotion/Stress Analysis run in parallel on the same waveform
+            # Results are cached by audio content, so re-submitted recordings skip the models
+            logger.info("Step 2/3: Transcribing audio and analyzing emotion/stress...")
+            results = await asyncio.gather(
+                executor.run_stage(
+                    "transcription", stage_timings, self._cached, "transcription",
+                    ResultCache.key(audio_hash, f"{transcription_service.version_for(tier['tier'])}|{speech_version}"),
+                    transcription_service.transcribe, waveform, tier["tier"], speech_map
+                ),
+                executor.run_stage(
+                    "emotion", stage_timings, self._cached, "emotion",
+                    ResultCache.key(audio_hash, f"{audio_stress_detector.version_for(pitch_engine)}|{speech_version}"),
+                    audio_stress_detector.analyze, waveform, pitch_engine, speech_map
+                ),
+                return_exceptions=True
+            )
+            # Both stages read the pooled waveform: if one fails, wait for the other before the lease can close
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            (transcription_result, transcription_hit), (emotion_result, emotion_hit) = results
+            if not transcription_hit:
+                transcription_service.observe_tier(tier["tier"], speech_sec, stage_timings["transcription"], load)
+            transcript_text = transcription_result["text"]
+            stress_score = emotion_result["stress_score"]
+
+            # Critical-phrase scan: one compiled regex pass, cheap enough to run ahead of DistilBERT
+            with stage("keywords", stage_timings):
+                keyword_result = KeywordMatcher.shared().scan(transcript_text)
+
+            # 4. Threat Classification
+            logger.info("Step 4: Classifying threat...")
+            threat_result, threat_hit = await executor.run_stage(
+                "threat", stage_timings, self._cached, "threat",
+                ResultCache.key(
+                    audio_hash,
+                    f"{transcription_service.version_for(tier['tier'])}|{speech_version}|{threat_classifier.version}"
+                ),
+                threat_classifier.classify, transcript_text
+            )
+
+        # 5. Fusion
+        logger.info("Step 5: Computing fusion score...")
+        with stage("fusion", stage_timings):
+            # Location risk: static risk map plus recent incidents nearby (this one counts for later ones)
+            location_index = LocationRiskIndex.shared()
+            location_result = location_index.lookup(latitude, longitude, timestamp)
+            location_index.record(latitude, longitude, timestamp)
+            # History: bursts nearby and earlier submissions of the same call
+            incident_time = LocationRiskIndex.normalize_timestamp(timestamp)
+            history = None
+            if self.incident_store is not None:
+                history = self.incident_store.context(incident_time, latitude, longitude, audio_hash, transcript_text)
+            fusion_result = FusionEngine.compute_severity(
+                stress_score=stress_score,
+                threat_data=threat_result,
+                keyword_score=keyword_result["keyword_score"],
+                location_risk=location_result["location_risk"]
+            )
+            if self.incident_store is not None:
+                self.incident_store.add(
+                    incident_id, incident_time, latitude, longitude, threat_result["threat_type"],
+                    fusion_result["severity_level"], fusion_result["final_score"], audio_hash, transcript_text
+                )
+
+        return incident_output(
+            incident_id,
+            transcript_text,
+            emotion_result,
+            threat_result,
+            fusion_result,
+            details={
+                "processing_time_sec": round(time.time() - start_time, 2),
+                "audio_duration_sec": round(AudioDecoder.duration_sec(waveform), 2),
+                "audio_bytes": download_info["bytes"],
+                "stage_timings": stage_timings,
+                "scheduling": {**ticket.as_dict(), "prelim_stress": prelim_stress},
+                "transcription_tier": tier,
+                "vad": speech_map.as_dict() if speech_map else None,
+                "keywords": keyword_result,
+                "location": location_result,
+                "history": history,
+                "memory": lease.report() if lease else None,
+                "cache_hits": {
+                    "transcription": transcription_hit,
+                    "emotion": emotion_hit,
+                    "threat": threat_hit
+                }
+            }
+        )
+
+    def _cached(self, namespace: str, key: str, compute, *args) -> tuple:
+        """Runs compute(*args) through the result cache; returns (result, cache_hit)."""
+        if self.result_cache is None:
+            return compute(*args), False
+        return self.result_cache.get_or_compute(namespace, key, compute, *args)
+
+def incident_output(incident_id: str, transcript_text: str, emotion_result: dict, threat_result: dict,
+                    fusion_result: dict, details: dict) -> IncidentOutput:
+    details = dict(details)
+    details["emotion_details"] = emotion_result.get("details")
+    details["fusion_breakdown"] = fusion_result.get("breakdown")
+    details["fusion_policy"] = fusion_result.get("policy_version")
+    details["threat_source"] = threat_result.get("source")
+    return IncidentOutput(
+        incidentId=incident_id,
+        transcript=transcript_text,
+        stressScore=emotion_result["stress_score"],
+        threatType=threat_result["threat_type"],
+        severityScore=fusion_result["final_score"],
+        finalSeverity=fusion_result["severity_level"],
+        confidence=threat_result["confidence"],
+        recommendedAction=fusion_result["recommended_action"],
+        details=details
+    )
@@ -0,0 +1,252 @@
+import hashlib
+import logging
+import math
+import os
+import re
+import threading
+import time
+import numpy as np
+from config import config
+
+logger = logging.getLogger(__name__)
+
+THREAT_TYPES = ("UNKNOWN", "FALSE_ALARM", "MEDICAL", "FIRE", "ASSAULT", "KIDNAP", "PANIC")
+SEVERITIES = ("LOW", "MEDIUM", "HIGH", "CRITICAL")
+_THREAT_CODES = {name: code for code, name in enumerate(THREAT_TYPES)}
+_SEVERITY_CODES = {name: code for code, name in enumerate(SEVERITIES)}
+_WORDS = re.compile(r"\w+")
+METERS_PER_DEGREE = 111195.0  # on a 6371 km sphere
+# SimHash bits two transcripts may differ in and still count as the same call. Unrelated texts
+# differ in ~32 of 64; short transcripts are too coarse for more than near-verbatim repeats
+SIMHASH_MAX_DISTANCE = 4
+
+# One incident is ~90 bytes, so the default 100k-incident ring is ~9 MB
+RECORD_DTYPE = np.dtype([
+    ("incident_id", "S40"),
+    ("timestamp", "f8"),      # incident time, Unix seconds
+    ("index_time", "f8"),     # non-decreasing along the ring: max(timestamp, previous index_time)
+    ("latitude", "f4"),       # NaN when unknown
+    ("longitude", "f4"),
+    ("threat", "u1"),         # index into THREAT_TYPES
+    ("severity", "u1"),       # index into SEVERITIES
+    ("severity_score", "f4"),
+    ("audio_hash", "u8"),     # first 8 bytes of the audio sha256: exact re-submissions
+    ("text_hash", "u8"),      # 64-bit SimHash of the transcript: near-duplicate calls
+])
+
+def text_simhash(text: str) -> int:
+    """64-bit SimHash of the transcript's words; similar transcripts differ in few bits."""
+    words = _WORDS.findall(text.lower())
+    if not words:
+        return 0
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little") for word in words],
+        dtype=np.uint64
+    )
+    bits = (hashes[:, None] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)
+    votes = 2 * bits.sum(axis=0).astype(np.int32) - len(words)
+    return int(np.packbits((votes > 0)[::-1]).view(">u8")[0])
+
+def _id_bytes(incident_id: str) -> bytes:
+    """UTF-8 incident id cut to the 40-byte column on a character boundary."""
+    return incident_id.encode()[:RECORD_DTYPE["incident_id"].itemsize].decode(errors="ignore").encode()
+
+def _hamming(values: np.ndarray, target: int) -> np.ndarray:
+    # SWAR popcount of each uint64 lane
+    x = values ^ np.uint64(target)
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+class IncidentStore:
+    """
+    Bounded history of processed incidents: one fixed-size numpy column per RECORD_DTYPE
+    field, used as a ring buffer, so memory is capped at INCIDENT_STORE_CAPACITY and the
+    oldest incidents are overwritten first. Slots stay in insertion order and index_time is
+    non-decreasing along the ring, so a time window is a binary search per ring half.
+    Spatial and duplicate filters then run vectorized over just the window's slots, which
+    costs microseconds for the minutes-long windows used to correlate bursts.
+    If INCIDENT_STORE_PATH is set, the ring is snapshotted to that .npy file every
+    INCIDENT_STORE_SNAPSHOT_SEC and reloaded (memory-mapped) on startup.
+    """
+    def __init__(self, capacity: int = None, path: str = None):
+        self.capacity = capacity or config.INCIDENT_STORE_CAPACITY
+        self.path = path if path is not None else config.INCIDENT_STORE_PATH
+        self.columns = {name: np.zeros(self.capacity, dtype=RECORD_DTYPE[name]) for name in RECORD_DTYPE.names}
+        self.head = 0  # next slot to write
+        self.count = 0
+        self.added = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._snapshotter = None
+        if self.path and os.path.exists(self.path):
+            self._restore()
+
+    def start(self):
+        """Starts periodic snapshots (no-op without INCIDENT_STORE_PATH)."""
+        if self.path and self._snapshotter is None:
+            self._snapshotter = threading.Thread(target=self._snapshot_loop, name="incident-store-snapshot", daemon=True)
+            self._snapshotter.start()
+
+    def close(self):
+        self._stop.set()
+        if self._snapshotter is not None:
+            # A periodic snapshot may be writing the same tmp file
+            self._snapshotter.join()
+            self._snapshotter = None
+        if self.path:
+            self.snapshot()
+
+    def add(self, incident_id: str, timestamp: float, latitude: float, longitude: float, threat_type: str,
+            severity: str, severity_score: float, audio_sha256: str = None, transcript: str = ""):
+        text_hash = text_simhash(transcript)
+        columns = self.columns
+        with self._lock:
+            slot = self.head
+            previous = columns["index_time"][slot - 1] if self.count else -math.inf
+            columns["incident_id"][slot] = _id_bytes(incident_id)
+            columns["timestamp"][slot] = timestamp
+            columns["index_time"][slot] = max(timestamp, previous)
+            columns["latitude"][slot] = np.nan if latitude is None else latitude
+            columns["longitude"][slot] = np.nan if longitude is None else longitude
+            columns["threat"][slot] = _THREAT_CODES.get(threat_type, 0)
+            columns["severity"][slot] = _SEVERITY_CODES.get(severity, 0)
+            columns["severity_score"][slot] = severity_score
+            columns["audio_hash"][slot] = int(audio_sha256[:16], 16) if audio_sha256 else 0
+            columns["text_hash"][slot] = text_hash
+            self.head = (slot + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+            self.added += 1
+            self._dirty = True
+
+    def _slots(self, since: float, until: float = None) -> np.ndarray:
+        """Slot indices of the incidents with since <= timestamp <= until, oldest first."""
+        index_time = self.columns["index_time"]
+        with self._lock:
+            # In insertion order the ring is [head, capacity) then [0, head) once full
+            ranges = ((self.head, self.capacity), (0, self.head)) if self.count == self.capacity else ((0, self.count),)
+            # index_time >= timestamp and is sorted, so nothing before the first index_time >= since qualifies;
+            # after it, out-of-order inserts can still hold earlier timestamps and are filtered exactly below
+            slots = np.concatenate([
+                np.arange(lo + int(np.searchsorted(index_time[lo:hi], since, side="left")), hi) for lo, hi in ranges
+            ])
+        timestamps = self.columns["timestamp"][slots]
+        mask = timestamps >= since
+        if until is not None:
+            mask &= timestamps <= until
+        return slots[mask]
+
+    def records(self, slots: np.ndarray = None) -> np.ndarray:
+        """The given slots (default: all incidents, oldest first) as RECORD_DTYPE records."""
+        if slots is None:
+            slots = self._slots(-math.inf)
+        out = np.empty(len(slots), dtype=RECORD_DTYPE)
+        for name, column in self.columns.items():
+            out[name] = column[slots]
+        return out
+
+    def window(self, since: float, until: float = None) -> np.ndarray:
+        """Records with since <= timestamp <= until, oldest first."""
+        return self.records(self._slots(since, until))
+
+    def _close_to(self, slots: np.ndarray, latitude: float, longitude: float, radius_m: float) -> np.ndarray:
+        """Mask of the slots within radius_m of a point (equirectangular distance, exact at city scale)."""
+        y = self.columns["latitude"][slots] - np.float32(latitude)
+        x = (self.columns["longitude"][slots] - np.float32(longitude)) * np.float32(math.cos(math.radians(latitude)))
+        return x * x + y * y <= np.float32((radius_m / METERS_PER_DEGREE) ** 2)  # NaN coordinates compare False
+
+    def nearby(self, latitude: float, longitude: float, radius_m: float, since: float, until: float = None) -> np.ndarray:
+        """Records within radius_m of a point in a time window."""
+        slots = self._slots(since, until)
+        if latitude is None or longitude is None:
+            return self.records(slots[:0])
+        return self.records(slots[self._close_to(slots, latitude, longitude, radius_m)])
+
+    def context(self, timestamp: float, latitude: float, longitude: float, audio_sha256: str = None,
+                transcript: str = "") -> dict:
+        """
+        History for a new incident: recent incidents nearby (a burst) and earlier
+        incidents that look like the same call (same audio, or a near-identical transcript
+        from about the same place) within INCIDENT_DUPLICATE_WINDOW_SEC.
+        """
+        columns = self.columns
+        slots = self._slots(timestamp - config.INCIDENT_DUPLICATE_WINDOW_SEC, timestamp)
+        has_location = latitude is not None and longitude is not None
+        close = (
+            self._close_to(slots, latitude, longitude, config.INCIDENT_BURST_RADIUS_M) if has_location
+            else np.zeros(len(slots), dtype=bool)
+        )
+        nearby = slots[close & (columns["timestamp"][slots] >= timestamp - config.INCIDENT_BURST_WINDOW_SEC)]
+
+        same = np.zeros(len(slots), dtype=bool)
+        if audio_sha256:
+            same |= columns["audio_hash"][slots] == np.uint64(int(audio_sha256[:16], 16))
+        # Near-identical transcripts only count from about the same place: without a location,
+        # two callers saying "help me" are not the same call
+        text_hash = text_simhash(transcript)
+        if text_hash and close.any():
+            hashes = columns["text_hash"][slots[close]]
+            same[close] |= (hashes != 0) & (_hamming(hashes, text_hash) <= SIMHASH_MAX_DISTANCE)
+        duplicate = columns["incident_id"][slots[same][-1]].decode(errors="replace") if same.any() else None
+
+        return {
+            "nearby_recent": len(nearby),
+            "nearby_critical": int(np.sum(columns["severity"][nearby] == _SEVERITY_CODES["CRITICAL"])),
+            "burst_window_sec": config.INCIDENT_BURST_WINDOW_SEC,
+            "duplicate_of": duplicate
+        }
+
+    def snapshot(self):
+        """Writes the ring, oldest first, to a memory-mappable .npy file (atomic replace)."""
+        start = time.perf_counter()
+        with self._lock:
+            if not self._dirty:
+                return
+            # Copied under the lock, so concurrent adds overwriting a full ring cannot tear it
+            ordered = self.records(np.arange(self.head - self.count, self.head) % self.capacity)
+            self._dirty = False
+        tmp = f"{self.path}.tmp.npy"
+        try:
+            out = np.lib.format.open_memmap(tmp, mode="w+", dtype=RECORD_DTYPE, shape=ordered.shape)
+            out[:] = ordered
+            out.flush()
+            del out
+            os.replace(tmp, self.path)
+        except BaseException:
+            with self._lock:
+                self._dirty = True  # retried by the next snapshot
+            raise
+        logger.info(f"Incident store snapshot: {len(ordered)} incidents in {time.perf_counter() - start:.3f}s")
+
+    def _restore(self):
+        try:
+            saved = np.load(self.path, mmap_mode="r")
+            if saved.dtype != RECORD_DTYPE:
+                raise ValueError(f"record layout {saved.dtype} does not match this version")
+        except (OSError, ValueError) as e:
+            logger.error(f"Ignoring incident store snapshot {self.path}: {e}")
+            return
+        keep = saved[-self.capacity:]
+        for name, column in self.columns.items():
+            column[:len(keep)] = keep[name]
+        self.count = len(keep)
+        self.head = self.count % self.capacity
+        logger.info(f"Incident store restored {self.count} incidents from {self.path}")
+
+    def _snapshot_loop(self):
+        while not self._stop.wait(config.INCIDENT_STORE_SNAPSHOT_SEC):
+            try:
+                self.snapshot()
+            except OSError as e:
+                logger.error(f"Incident store snapshot failed: {e}")
+
+    def report(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "stored": self.count,
+            "added": self.added,
+            "memory_mb": round(sum(column.nbytes for column in self.columns.values()) / 1e6, 1),
+            "snapshot_path": self.path
+        }
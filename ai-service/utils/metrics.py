@@ -0,0 +1,137 @@
+import logging
+from collections import deque
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Prometheus instruments for the pipeline, exposed on GET /metrics.
+# Stage wall times are measured in the API process, around the IPC call in worker-pool mode.
+# Observations made inside a model worker process (micro-batch sizes) are buffered there
+# and shipped back with each result, so /metrics covers the workers too.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+
+STAGE_LATENCY = Histogram(
+    "sos_stage_latency_seconds", "Wall time of one pipeline stage", ["stage"], buckets=LATENCY_BUCKETS
+)
+INCIDENT_LATENCY = Histogram(
+    "sos_incident_latency_seconds", "End-to-end processing time of one incident", ["mode", "outcome"],
+    buckets=LATENCY_BUCKETS
+)
+DOWNLOAD_BYTES = Histogram(
+    "sos_download_bytes", "Size of downloaded incident audio",
+    buckets=(16e3, 64e3, 256e3, 1e6, 4e6, 16e6, 64e6)
+)
+REQUEST_AUDIO_MEMORY = Histogram(
+    "sos_request_audio_peak_bytes", "Peak audio memory (spooled body + decode buffers) held by one incident",
+    buckets=(1e6, 2e6, 4e6, 8e6, 16e6, 32e6, 64e6, 128e6)
+)
+AUDIO_DURATION = Histogram(
+    "sos_audio_duration_seconds", "Duration of decoded incident audio",
+    buckets=(1, 2.5, 5, 10, 20, 30, 60, 120, 180, 300)
+)
+REAL_TIME_FACTOR = Histogram(
+    "sos_real_time_factor", "Stage processing time divided by audio duration", ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+)
+QUEUE_WAIT = Histogram(
+    "sos_queue_wait_seconds", "Time an incident waited for an inference slot", ["priority"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+BATCH_SIZE = Histogram(
+    "sos_model_batch_size", "Items per micro-batched forward pass", ["model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+TRANSCRIPTION_TIERS = Counter(
+    "sos_transcription_tier_total", "Transcription tier chosen per incident", ["tier", "reason"]
+)
+INCIDENTS = Counter("sos_incidents_total", "Processed incidents", ["mode", "outcome", "severity"])
+CACHE_LOOKUPS = Counter("sos_result_cache_lookups_total", "Result cache lookups per stage", ["stage", "hit"])
+THREAT_SOURCES = Counter(
+    "sos_threat_source_total", "Threat classifications by source: text cache (lru), kNN index or model", ["source"]
+)
+QUEUE_DEPTH = Gauge("sos_scheduler_queue_depth", "Incidents waiting for an inference slot")
+RUNNING = Gauge("sos_scheduler_running", "Incidents currently in the model stages")
+IN_FLIGHT = Gauge("sos_scheduler_in_flight", "Admitted incidents, from download until done")
+AUDIO_MEMORY_IN_USE = Gauge("sos_audio_memory_in_use_bytes", "Audio memory held by in-flight incidents")
+
+# Set in model worker processes by defer(); None in the API process
+_deferred = None
+
+def defer():
+    """Called once in a model worker process: buffer observations for the API process instead of recording them."""
+    global _deferred
+    _deferred = deque()
+
+def drain() -> list:
+    """Returns and clears the observations buffered in this worker process."""
+    observations = []
+    while _deferred:
+        observations.append(_deferred.popleft())
+    return observations
+
+def replay(observations: list):
+    """Records observations drained in a worker process, in the API process."""
+    for model, size in observations:
+        observe_batch(model, size)
+
+def observe_stage(stage: str, seconds: float):
+    if config.METRICS_ENABLED:
+        STAGE_LATENCY.labels(stage).observe(seconds)
+
+def observe_batch(model: str, size: int):
+    if _deferred is not None:
+        _deferred.append((model, size))
+    elif config.METRICS_ENABLED:
+        BATCH_SIZE.labels(model).observe(size)
+
+def observe_tier(tier: str, reason: str):
+    if config.METRICS_ENABLED:
+        TRANSCRIPTION_TIERS.labels(tier, reason).inc()
+
+def observe_queue_wait(priority: str, wait_sec: float):
+    if config.METRICS_ENABLED:
+        QUEUE_WAIT.labels(priority).observe(wait_sec)
+
+def observe_incident(mode: str, seconds: float, output=None, outcome: str = "ok"):
+    """
+    Records one finished incident (outcome "ok", "error" or "rejected"). output is the
+    IncidentOutput; its details supply the audio size, duration, real-time factors and cache hits.
+    """
+    if not config.METRICS_ENABLED:
+        return
+    INCIDENT_LATENCY.labels(mode, outcome).observe(seconds)
+    if output is None:
+        INCIDENTS.labels(mode, outcome, "none").inc()
+        return
+
+    INCIDENTS.labels(mode, outcome, output.finalSeverity).inc()
+    details = output.details or {}
+    if details.get("audio_bytes"):
+        DOWNLOAD_BYTES.observe(details["audio_bytes"])
+    if details.get("memory"):
+        REQUEST_AUDIO_MEMORY.observe(details["memory"]["peak_audio_mb"] * 1e6)
+    duration = details.get("audio_duration_sec") or 0.0
+    if duration > 0:
+        AUDIO_DURATION.observe(duration)
+        for stage in ("decode", "transcription", "emotion"):
+            seconds_spent = details.get("stage_timings", {}).get(stage)
+            if seconds_spent is not None:
+                REAL_TIME_FACTOR.labels(stage).observe(seconds_spent / duration)
+    for stage, hit in (details.get("cache_hits") or {}).items():
+        CACHE_LOOKUPS.labels(stage, str(bool(hit)).lower()).inc()
+    # Counted where the incident finishes, so shortcuts taken inside worker processes are included;
+    # a result-cache hit replays an earlier classification and is not counted again
+    if details.get("threat_source") and not (details.get("cache_hits") or {}).get("threat"):
+        THREAT_SOURCES.labels(details["threat_source"]).inc()
+
+def render(scheduler=None, resources=None) -> tuple:
+    """Returns (body, content_type) for the /metrics endpoint, sampling the scheduler and memory gauges first."""
+    if scheduler is not None:
+        QUEUE_DEPTH.set(scheduler.queue_depth)
+        RUNNING.set(scheduler.metrics()["running"])
+        IN_FLIGHT.set(scheduler.in_flight)
+    if resources is not None:
+        AUDIO_MEMORY_IN_USE.set(resources.in_use)
+    return generate_latest(), CONTENT_TYPE_LATEST
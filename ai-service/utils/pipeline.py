@@ -0,0 +1,58 @@
+import asyncio
+import contextlib
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import config
+from utils import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+@contextlib.contextmanager
+def stage(name: str, timings: dict):
+    """
+    Instruments one pipeline stage: a tracing span, the sos_stage_latency_seconds
+    histogram and its wall time (in seconds) under timings[name], even if the stage fails.
+    """
+    start = time.perf_counter()
+    with tracing.span(f"stage.{name}"):
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            timings[name] = round(elapsed, 3)
+            metrics.observe_stage(name, elapsed)
+
+class PipelineExecutor:
+    """
+    Runs the blocking pipeline stages (download, Whisper, stress analysis, DistilBERT)
+    on a bounded worker pool so the uvicorn event loop is never blocked by inference.
+    """
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or config.PIPELINE_MAX_WORKERS
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline")
+        logger.info(f"Pipeline executor started with {self.max_workers} workers")
+
+    async def run_stage(self, name: str, timings: dict, func, *args, **kwargs):
+        """
+        Runs func(*args, **kwargs) on the worker pool as the stage called name (see stage()).
+        A running thread cannot be interrupted, so if the caller is cancelled this waits for
+        func to return before re-raising: callers may then free what func reads (the pooled waveform).
+        """
+        future = self._pool.submit(functools.partial(func, *args, **kwargs))
+        waiter = asyncio.wrap_future(future)
+        with stage(name, timings):
+            try:
+                return await asyncio.shield(waiter)
+            except asyncio.CancelledError:
+                if not future.cancel():
+                    while not waiter.done():
+                        with contextlib.suppress(asyncio.CancelledError):
+                            await asyncio.wait([waiter])
+                    if not waiter.cancelled():
+                        waiter.exception()  # retrieved, so it is not logged as unhandled
+                raise
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
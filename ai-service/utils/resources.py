@@ -0,0 +1,247 @@
+import glob
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+import numpy as np
+from config import config
+from utils.scheduler import OverloadedError
+
+logger = logging.getLogger(__name__)
+
+# Scratch files and shared-memory segments are named sos_<pid>_..., so a sweep can tell
+# which process owned them
+SCRATCH_PREFIX = "sos_"
+_SCRATCH_OWNER = re.compile(rf"^{SCRATCH_PREFIX}(\d+)_")
+SHM_DIR = "/dev/shm"
+
+def scratch_dir() -> str:
+    return config.SCRATCH_DIR or tempfile.gettempdir()
+
+def scratch_prefix(kind: str) -> str:
+    """tempfile prefix for a scratch file of this process."""
+    return f"{SCRATCH_PREFIX}{os.getpid()}_{kind}_"
+
+def shared_memory_name() -> str:
+    """Unique POSIX shared-memory name owned by this process."""
+    return f"{SCRATCH_PREFIX}{os.getpid()}_{uuid.uuid4().hex[:12]}"
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def sweep_scratch(max_age_sec: float = None) -> int:
+    """
+    Deletes scratch files and shared-memory segments whose owning process is gone, or that
+    are older than SCRATCH_MAX_AGE_SEC. Run at startup: a crashed or OOM-killed instance
+    leaves them behind, and on Cloud Run both directories are memory.
+    Returns the number of entries removed.
+    """
+    max_age_sec = max_age_sec if max_age_sec is not None else config.SCRATCH_MAX_AGE_SEC
+    now = time.time()
+    removed = 0
+    freed = 0
+    for directory in (scratch_dir(), SHM_DIR):
+        for path in glob.glob(os.path.join(directory, f"{SCRATCH_PREFIX}*")):
+            owner = _SCRATCH_OWNER.match(os.path.basename(path))
+            try:
+                stat = os.stat(path)
+                if owner and int(owner.group(1)) != os.getpid() and _process_alive(int(owner.group(1))) \
+                        and now - stat.st_mtime < max_age_sec:
+                    continue
+                if not owner and now - stat.st_mtime < max_age_sec:
+                    continue
+                os.remove(path)
+                removed += 1
+                freed += stat.st_size
+            except OSError as e:
+                logger.warning(f"Could not sweep scratch file {path}: {e}")
+    if removed:
+        logger.info(f"Swept {removed} stale scratch files ({freed / 1e6:.1f} MB)")
+    return removed
+
+class WaveformPool:
+    """
+    Reusable float32 decode buffers in size classes (30 s of audio, doubling, capped at
+    MAX_AUDIO_DURATION_SEC). Large numpy arrays are mmap'd and unmapped on every request,
+    so each new one page-faults its way in again; pooled buffers stay resident and warm.
+    Idle buffers are kept up to WAVEFORM_POOL_MAX_MB.
+    """
+    def __init__(self, max_bytes: float = None, prealloc: int = None):
+        self.max_bytes = max_bytes if max_bytes is not None else config.WAVEFORM_POOL_MAX_MB * 1e6
+        sr = config.AUDIO_SAMPLE_RATE
+        max_samples = int(config.MAX_AUDIO_DURATION_SEC * sr)
+        self.classes = []
+        size = 30 * sr
+        while size < max_samples:
+            self.classes.append(size)
+            size *= 2
+        self.classes.append(max_samples)
+        self._free = {size: [] for size in self.classes}
+        self._idle_bytes = 0
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.allocated = 0
+        for _ in range(prealloc if prealloc is not None else config.WAVEFORM_POOL_PREALLOC):
+            buffer = np.empty(self.classes[0], dtype=np.float32)
+            buffer.fill(0.0)  # fault the pages in now rather than on the first incident
+            self.release(buffer)
+
+    def size_for(self, samples: int) -> int:
+        """The smallest size class holding samples (or samples itself beyond the largest class)."""
+        for size in self.classes:
+            if size >= samples:
+                return size
+        return samples
+
+    def acquire(self, samples: int) -> np.ndarray:
+        size = self.size_for(samples)
+        with self._lock:
+            free = self._free.get(size)
+            if free:
+                self.reused += 1
+                self._idle_bytes -= size * 4
+                return free.pop()
+            self.allocated += 1
+        return np.empty(size, dtype=np.float32)
+
+    def release(self, buffer: np.ndarray):
+        with self._lock:
+            free = self._free.get(len(buffer))
+            if free is not None and self._idle_bytes + buffer.nbytes <= self.max_bytes:
+                free.append(buffer)
+                self._idle_bytes += buffer.nbytes
+
+    def report(self) -> dict:
+        return {
+            "idle_mb": round(self._idle_bytes / 1e6, 1),
+            "reused": self.reused,
+            "allocated": self.allocated
+        }
+
+class AudioLease:
+    """
+    One incident's share of the audio memory budget: its spooled body bytes and decode
+    buffers. Buffers come from the WaveformPool and go back to it when the lease closes,
+    after the last stage that reads the waveform has finished.
+    """
+    def __init__(self, manager: "ResourceManager"):
+        self.manager = manager
+        self.held = 0
+        self.peak = 0
+        self._buffers = []
+        self._lock = threading.Lock()
+
+    def reserve(self, nbytes: int):
+        """Raises OverloadedError when the process-wide budget cannot cover nbytes more."""
+        self.manager.reserve(nbytes)
+        with self._lock:
+            self.held += nbytes
+            self.peak = max(self.peak, self.held)
+
+    def release(self, nbytes: int):
+        with self._lock:
+            nbytes = min(nbytes, self.held)
+            self.held -= nbytes
+        self.manager.release(nbytes)
+
+    def buffer(self, samples: int) -> np.ndarray:
+        """A float32 buffer of at least samples, charged to the budget until given back."""
+        buffer = self.manager.pool.acquire(samples)
+        try:
+            self.reserve(buffer.nbytes)
+        except OverloadedError:
+            self.manager.pool.release(buffer)
+            raise
+        with self._lock:
+            self._buffers.append(buffer)
+        return buffer
+
+    def give_back(self, buffer: np.ndarray):
+        with self._lock:
+            for i, held in enumerate(self._buffers):
+                if held is buffer:
+                    del self._buffers[i]
+                    break
+            else:
+                return
+        self.manager.pool.release(buffer)
+        self.release(buffer.nbytes)
+
+    def close(self):
+        self.manager.observe(self)
+        for buffer in list(self._buffers):
+            self.give_back(buffer)
+        self.release(self.held)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def report(self) -> dict:
+        return {
+            "peak_audio_mb": round(self.peak / 1e6, 2),
+            "budget_in_use_mb": round(self.manager.in_use / 1e6, 1)
+        }
+
+class ResourceManager:
+    """
+    Process-wide cap (AUDIO_MEMORY_BUDGET_MB) on the audio held by in-flight incidents:
+    request bodies as they are spooled and decoded waveforms. An incident that would push
+    the total over the budget is shed with OverloadedError (503, retryable) instead of
+    letting concurrent long recordings OOM-kill the instance.
+    """
+    def __init__(self, budget_bytes: float = None, pool: WaveformPool = None):
+        self.budget_bytes = budget_bytes if budget_bytes is not None else config.AUDIO_MEMORY_BUDGET_MB * 1e6
+        self.pool = pool or WaveformPool()
+        self.in_use = 0
+        self.peak = 0
+        self.request_peak = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def lease(self) -> AudioLease:
+        return AudioLease(self)
+
+    def check_admission(self):
+        """Rejects a new incident up front while the budget is already spent."""
+        if self.budget_bytes and self.in_use >= self.budget_bytes:
+            with self._lock:
+                self.rejected += 1
+            raise OverloadedError(f"Audio memory budget of {self.budget_bytes / 1e6:.0f} MB is in use")
+
+    def reserve(self, nbytes: int):
+        with self._lock:
+            if self.budget_bytes and self.in_use + nbytes > self.budget_bytes:
+                self.rejected += 1
+                raise OverloadedError(f"Audio memory budget of {self.budget_bytes / 1e6:.0f} MB exhausted")
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+
+    def release(self, nbytes: int):
+        with self._lock:
+            self.in_use -= nbytes
+
+    def observe(self, lease: AudioLease):
+        with self._lock:
+            self.request_peak = max(self.request_peak, lease.peak)
+
+    def report(self) -> dict:
+        return {
+            "budget_mb": round(self.budget_bytes / 1e6, 1),
+            "in_use_mb": round(self.in_use / 1e6, 1),
+            "peak_mb": round(self.peak / 1e6, 1),
+            "max_request_peak_mb": round(self.request_peak / 1e6, 1),
+            "rejected": self.rejected,
+            "waveform_pool": self.pool.report()
+        }
@@ -0,0 +1,167 @@
+import asyncio
+import collections
+import json
+import logging
+import os
+import threading
+import time
+from config import config
+
+logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """
+    Content-addressed cache for per-model results.
+    Keys combine a namespace ("transcription", "emotion", "threat"), the sha256 of the
+    raw audio bytes and the model version, so a retried or re-uploaded recording only
+    recomputes fusion, and a model change never serves stale results.
+    Entries live in an in-memory LRU with a TTL and, if disk_dir is set, are also written
+    as JSON files so they survive restarts and are shared between worker processes.
+    """
+    def __init__(self, max_entries: int = None, ttl_sec: float = None, disk_dir: str = None):
+        self.max_entries = max_entries or config.RESULT_CACHE_MAX_ENTRIES
+        self.ttl_sec = ttl_sec or config.RESULT_CACHE_TTL_SEC
+        self.disk_dir = disk_dir if disk_dir is not None else config.RESULT_CACHE_DIR
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+
+    @staticmethod
+    def key(audio_sha256: str, model_version: str) -> str:
+        return f"{audio_sha256}:{model_version}"
+
+    def get(self, namespace: str, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end((namespace, key))
+                    return value
+                del self._entries[(namespace, key)]
+        
+        if self.disk_dir:
+            value = self._read_disk(namespace, key, now)
+            if value is not None:
+                self._put_memory(namespace, key, value, now)
+                return value
+        return None
+
+    def put(self, namespace: str, key: str, value: dict):
+        now = time.time()
+        self._put_memory(namespace, key, value, now)
+        if self.disk_dir:
+            self._write_disk(namespace, key, value)
+
+    def get_or_compute(self, namespace: str, key: str, compute, *args) -> tuple:
+        """
+        Returns (result, hit). On a miss runs compute(*args) and caches the result
+        unless it is an error fallback (a dict carrying an "error" key).
+        """
+        value = self.get(namespace, key)
+        if value is not None:
+            self.hits[namespace] += 1
+            return value, True
+        
+        self.misses[namespace] += 1
+        value = compute(*args)
+        if not (isinstance(value, dict) and "error" in value):
+            self.put(namespace, key, value)
+        return value, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        return {"entries": size, "hits": dict(self.hits), "misses": dict(self.misses)}
+
+    def _put_memory(self, namespace: str, key: str, value, now: float):
+        with self._lock:
+            self._entries[(namespace, key)] = (now + self.ttl_sec, value)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _path(self, namespace: str, key: str) -> str:
+        return os.path.join(self.disk_dir, namespace, key.replace(":", "_").replace("/", "_") + ".json")
+
+    def _read_disk(self, namespace: str, key: str, now: float):
+        path = self._path(namespace, key)
+        try:
+            if os.path.getmtime(path) + self.ttl_sec < now:
+                os.remove(path)
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+
+    def _write_disk(self, namespace: str, key: str, value):
+        path = self._path(namespace, key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write-then-rename so concurrent readers never see a partial file
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to write cache entry {path}: {e}")
+
+class IdempotencyRegistry:
+    """
+    Makes /process-incident idempotent per incidentId.
+    A retry that arrives while the first attempt is still running awaits the same result;
+    a retry after it finished gets the stored response until the TTL expires.
+    Failed attempts are not remembered, so they can be retried.
+    """
+    def __init__(self, ttl_sec: float = None, max_entries: int = None):
+        self.ttl_sec = ttl_sec or config.IDEMPOTENCY_TTL_SEC
+        self.max_entries = max_entries or config.RESULT_CACHE_MAX_ENTRIES
+        self._completed = collections.OrderedDict()
+        self._in_flight = {}
+
+    async def run_once(self, incident_id: str, process) -> tuple:
+        """
+        Runs the coroutine function process() at most once per incident_id.
+        Returns (result, replayed) where replayed is True if the result was shared.
+        If the running attempt is cancelled (its client went away), a waiting retry runs process() itself.
+        """
+        while True:
+            entry = self._completed.get(incident_id)
+            if entry and entry[0] > time.time():
+                return entry[1], True
+            
+            in_flight = self._in_flight.get(incident_id)
+            if not in_flight:
+                break
+            try:
+                return await asyncio.shield(in_flight), True
+            except asyncio.CancelledError:
+                if not in_flight.cancelled():
+                    raise  # this retry itself was cancelled
+        
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[incident_id] = future
+        try:
+            result = await process()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when no retry is waiting
+            raise
+        finally:
+            self._in_flight.pop(incident_id, None)
+        
+        future.set_result(result)
+        self._completed[incident_id] = (time.time() + self.ttl_sec, result)
+        self._completed.move_to_end(incident_id)
+        while len(self._completed) > self.max_entries:
+            self._completed.popitem(last=False)
+        return result, False
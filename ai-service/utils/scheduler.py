@@ -0,0 +1,171 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import time
+from config import config
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, lower runs first
+PRIORITY_CRITICAL = 0
+PRIORITY_ELEVATED = 1
+PRIORITY_NORMAL = 2
+PRIORITY_NAMES = {PRIORITY_CRITICAL: "critical", PRIORITY_ELEVATED: "elevated", PRIORITY_NORMAL: "normal"}
+
+class OverloadedError(Exception):
+    """Raised when the scheduler queue is full and a new incident cannot be admitted."""
+
+class SchedulerTicket:
+    def __init__(self, priority: int, degraded: bool, queue_wait_sec: float):
+        self.priority = priority
+        self.degraded = degraded
+        self.queue_wait_sec = queue_wait_sec
+
+    def as_dict(self) -> dict:
+        return {
+            "priority": PRIORITY_NAMES.get(self.priority, self.priority),
+            "degraded": self.degraded,
+            "queue_wait_sec": round(self.queue_wait_sec, 3)
+        }
+
+class IncidentScheduler:
+    """
+    In-process admission control and priority scheduling for the inference stages.
+    At most max_concurrent incidents run the models at once; the rest wait in a bounded
+    priority queue (likely-critical incidents first, FIFO within a class). Incidents are
+    admitted before their download and decode and count until they finish, so at most
+    max_concurrent + queue_limit are in flight; the rest are rejected. Incidents entering
+    a slot while the queue is deeper than degrade_depth are marked degraded so the
+    pipeline can take cheaper model paths.
+    Must only be used from the event loop thread.
+    """
+    def __init__(self, max_concurrent: int = None, queue_limit: int = None, degrade_depth: int = None):
+        self.max_concurrent = max_concurrent or config.SCHEDULER_MAX_CONCURRENT
+        self.queue_limit = queue_limit if queue_limit is not None else config.SCHEDULER_QUEUE_LIMIT
+        self.degrade_depth = degrade_depth if degrade_depth is not None else config.SCHEDULER_DEGRADE_DEPTH
+        self._running = 0
+        self._in_flight = 0  # admitted incidents, from before their download until they finish
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        
+        self.admitted = 0
+        self.rejected = 0
+        self.degraded = 0
+        self.completed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._admitted_by_priority = {name: 0 for name in PRIORITY_NAMES.values()}
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def load(self) -> float:
+        """(running + queued) incidents per inference slot; above 1 means incidents are waiting."""
+        return (self._running + self.queue_depth) / float(self.max_concurrent)
+
+    @property
+    def in_flight(self) -> int:
+        return max(self._in_flight, self._running + self.queue_depth)
+
+    def check_admission(self):
+        """Fails fast (before any download) when the queue is already full."""
+        if self.in_flight >= self.max_concurrent + self.queue_limit:
+            self.rejected += 1
+            raise OverloadedError(f"Incident queue is full ({self.in_flight} incidents in flight)")
+
+    @contextlib.contextmanager
+    def admit(self):
+        """
+        Admits an incident for its whole lifetime, including download, decode and triage
+        ahead of its slot. Raises OverloadedError when too many are already in flight.
+        """
+        self.check_admission()
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_NORMAL, admitted: bool = False):
+        """
+        Waits for an inference slot in priority order; yields a SchedulerTicket.
+        admitted=True inside admit(), which already counted the incident.
+        """
+        if not admitted:
+            self.check_admission()
+        degraded = self.queue_depth >= self.degrade_depth
+        start = time.perf_counter()
+        
+        if self._running < self.max_concurrent and not self._waiters:
+            self._running += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            entry = (priority, next(self._seq), future)
+            heapq.heappush(self._waiters, entry)
+            try:
+                # The releasing incident hands its slot over directly (see _release)
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release()
+                else:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                raise
+        
+        wait = time.perf_counter() - start
+        self._record_admission(priority, degraded, wait)
+        try:
+            yield SchedulerTicket(priority, degraded, wait)
+        finally:
+            self.completed += 1
+            self._release()
+
+    def _release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)  # slot passes to the waiter, _running unchanged
+                return
+        self._running -= 1
+
+    def _record_admission(self, priority: int, degraded: bool, wait: float):
+        self.admitted += 1
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        self._admitted_by_priority[name] = self._admitted_by_priority.get(name, 0) + 1
+        if degraded:
+            self.degraded += 1
+        self._wait_total += wait
+        self._wait_max = max(self._wait_max, wait)
+        metrics.observe_queue_wait(name, wait)
+
+    def metrics(self) -> dict:
+        return {
+            "running": self._running,
+            "queued": self.queue_depth,
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "queue_limit": self.queue_limit,
+            "degrade_depth": self.degrade_depth,
+            "admitted": self.admitted,
+            "admitted_by_priority": dict(self._admitted_by_priority),
+            "rejected": self.rejected,
+            "degraded": self.degraded,
+            "completed": self.completed,
+            "avg_queue_wait_sec": round(self._wait_total / self.admitted, 4) if self.admitted else 0.0,
+            "max_queue_wait_sec": round(self._wait_max, 4)
+        }
+
+def priority_from_stress(stress_score: float) -> int:
+    """Maps a cheap preliminary stress score to a priority class."""
+    if stress_score >= 0.8:
+        return PRIORITY_CRITICAL
+    if stress_score >= 0.4:
+        return PRIORITY_ELEVATED
+    return PRIORITY_NORMAL
@@ -0,0 +1,237 @@
+import json
+import logging
+import threading
+import time
+import numpy as np
+from scipy.signal import resample_poly
+from config import config
+from models.emotion import StreamingStressAnalyzer
+from models.fusion import FusionEngine
+from models.keywords import StreamingKeywordScanner
+from models.location_risk import LocationRiskIndex
+from utils.audio_decoder import AudioTooLongError
+
+logger = logging.getLogger(__name__)
+
+class StreamProtocolError(ValueError):
+    """Raised for a malformed stream message; the WebSocket is closed with 1007."""
+
+def control_event(text: str):
+    """The "event" of a text control message such as {"event": "end"}."""
+    try:
+        message = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise StreamProtocolError(f"Invalid control message: {e}")
+    if not isinstance(message, dict):
+        raise StreamProtocolError("Control message must be a JSON object")
+    return message.get("event")
+
+class StreamingIncidentSession:
+    """
+    State of one live incident stream.
+    Raw PCM chunks are appended to a 16 kHz buffer that grows in pooled size classes and,
+    with an AudioLease, counts against the audio memory budget. Each update() re-transcribes
+    only the uncommitted tail of the recording (a sliding window), folds the new audio into
+    the incremental stress features, and re-runs threat classification and fusion so that
+    interim severity can be pushed to the client while the caller is still recording.
+    """
+    SAMPLE_FORMATS = {"pcm_s16le": np.int16, "pcm_f32le": np.float32}
+
+    def __init__(self, incident_id: str, transcription_service, audio_stress_detector, threat_classifier,
+                 sample_rate: int = None, sample_format: str = "pcm_s16le",
+                 latitude: float = None, longitude: float = None, timestamp: float = None, lease=None):
+        if sample_format not in self.SAMPLE_FORMATS:
+            raise ValueError(f"Unsupported sample format: {sample_format}")
+        
+        self.incident_id = incident_id
+        self.latitude = latitude
+        self.longitude = longitude
+        # The caller's position is fixed for the stream, so location risk is looked up once
+        self.location = LocationRiskIndex.shared().lookup(latitude, longitude, timestamp)
+        self.timestamp = timestamp
+        self.sample_rate = int(sample_rate or config.AUDIO_SAMPLE_RATE)
+        self.dtype = self.SAMPLE_FORMATS[sample_format]
+        
+        self.transcription_service = transcription_service
+        self.threat_classifier = threat_classifier
+        self.stress = StreamingStressAnalyzer(audio_stress_detector)
+        self.keywords = StreamingKeywordScanner()
+        
+        self.lease = lease
+        self.max_samples = int(config.MAX_AUDIO_DURATION_SEC * config.AUDIO_SAMPLE_RATE)
+        self.buffer = self._allocate(min(self.max_samples, 30 * config.AUDIO_SAMPLE_RATE))
+        self.n_samples = 0
+        # Buffers outgrown while an update may still be reading them; given back once none is running
+        self._retired = []
+        self._readers = 0
+        self._buffer_lock = threading.Lock()
+        self._remainder = b""  # partial sample carried over between chunks
+        
+        # Sliding-window transcription state
+        self.commit_offset = 0  # samples before this are transcribed and final
+        self.committed_segments = []
+        self._last_update_samples = 0
+        
+        self.stress_score = 0.0  # latest stress score, sets the priority of the next update
+        self.updates = 0
+        self.started_at = time.time()
+        self.first_critical_sec = None  # seconds of audio received when CRITICAL was first reached
+
+    @property
+    def audio_sec(self) -> float:
+        return self.n_samples / float(config.AUDIO_SAMPLE_RATE)
+
+    def append(self, chunk: bytes):
+        """
+        Appends a raw mono PCM chunk, resampling to 16 kHz if needed.
+        Raises AudioTooLongError once the recording exceeds MAX_AUDIO_DURATION_SEC.
+        """
+        data = self._remainder + chunk
+        itemsize = np.dtype(self.dtype).itemsize
+        usable = len(data) - len(data) % itemsize
+        self._remainder = data[usable:]
+        
+        samples = np.frombuffer(data[:usable], dtype=self.dtype)
+        if self.dtype == np.int16:
+            samples = samples.astype(np.float32) / 32768.0
+        if self.sample_rate != config.AUDIO_SAMPLE_RATE:
+            samples = resample_poly(samples, config.AUDIO_SAMPLE_RATE, self.sample_rate).astype(np.float32)
+        
+        end = self.n_samples + len(samples)
+        if end > self.max_samples:
+            raise AudioTooLongError(f"Audio stream exceeds {config.MAX_AUDIO_DURATION_SEC} seconds")
+        if end > len(self.buffer):
+            self._grow(end)
+        self.buffer[self.n_samples:end] = samples
+        self.n_samples = end
+
+    def _allocate(self, samples: int) -> np.ndarray:
+        """Raises OverloadedError when the lease's budget cannot cover the buffer."""
+        if self.lease is not None:
+            return self.lease.buffer(samples)
+        return np.empty(samples, dtype=np.float32)
+
+    def _grow(self, samples: int):
+        grown = self._allocate(min(max(samples, 2 * len(self.buffer)), self.max_samples))
+        grown[:self.n_samples] = self.buffer[:self.n_samples]
+        with self._buffer_lock:
+            self._retired.append(self.buffer)
+            self.buffer = grown
+            if not self._readers:
+                self._give_back_retired()
+
+    def _give_back_retired(self):
+        if self.lease is not None:
+            for buffer in self._retired:
+                self.lease.give_back(buffer)
+        self._retired = []
+
+    def ready_for_update(self) -> bool:
+        pending = self.n_samples - self._last_update_samples
+        return pending >= config.STREAM_UPDATE_SEC * config.AUDIO_SAMPLE_RATE
+
+    def update(self, final: bool = False) -> dict:
+        """
+        Processes all audio received so far. Runs on the pipeline executor.
+        With final=True every remaining segment is committed.
+        Returns the interim (or final) assessment.
+        """
+        with self._buffer_lock:
+            end = self.n_samples
+            audio = self.buffer[:end]
+            self._readers += 1
+        try:
+            return self._update(audio, final)
+        finally:
+            with self._buffer_lock:
+                self._readers -= 1
+                if not self._readers:
+                    self._give_back_retired()
+
+    def _update(self, audio: np.ndarray, final: bool) -> dict:
+        end = len(audio)
+        self._last_update_samples = end
+        self.updates += 1
+        
+        emotion_result = self.stress.update(audio)
+        self.stress_score = emotion_result["stress_score"]
+        transcript_text, segments = self._transcribe_window(audio, final)
+        # Only the changed tail of the partial transcript is re-scanned
+        keyword_result = self.keywords.update(transcript_text)
+        # Interim transcripts are fragments: only the final one may enter the threat text cache and index
+        threat_result = self.threat_classifier.classify(transcript_text, remember=final)
+        
+        fusion_result = FusionEngine.compute_severity(
+            stress_score=emotion_result["stress_score"],
+            threat_data=threat_result,
+            keyword_score=keyword_result["keyword_score"],
+            location_risk=self.location["location_risk"]
+        )
+        if final:
+            LocationRiskIndex.shared().record(self.latitude, self.longitude, self.timestamp)
+        
+        if fusion_result["severity_level"] == "CRITICAL" and self.first_critical_sec is None:
+            self.first_critical_sec = round(end / float(config.AUDIO_SAMPLE_RATE), 2)
+        
+        return {
+            "transcript": transcript_text,
+            "segments": segments,
+            "emotion_result": emotion_result,
+            "threat_result": threat_result,
+            "keyword_result": keyword_result,
+            "location_result": self.location,
+            "fusion_result": fusion_result,
+            "audio_sec": round(end / float(config.AUDIO_SAMPLE_RATE), 2),
+            "first_critical_sec": self.first_critical_sec,
+            "update": self.updates
+        }
+
+    def _transcribe_window(self, audio: np.ndarray, final: bool) -> tuple:
+        """
+        Transcribes audio[commit_offset:]. Segments ending more than STREAM_COMMIT_LAG_SEC
+        before the end of the window are committed and the window start moves past them;
+        the rest stay tentative and are re-decoded on the next update with more context.
+        """
+        sr = config.AUDIO_SAMPLE_RATE
+        window = audio[self.commit_offset:]
+        tentative = []
+        
+        if len(window) >= int(config.STREAM_MIN_WINDOW_SEC * sr):
+            result = self.transcription_service.transcribe(window)
+            window_sec = len(window) / float(sr)
+            offset_sec = self.commit_offset / float(sr)
+            
+            # Bound the re-decoded tail: past STREAM_MAX_WINDOW_SEC keep only the last segment tentative
+            force = window_sec > config.STREAM_MAX_WINDOW_SEC
+            segments = result["segments"]
+            for i, segment in enumerate(segments):
+                stable = segment["end"] <= window_sec - config.STREAM_COMMIT_LAG_SEC
+                if final or stable or (force and i < len(segments) - 1):
+                    committed = {
+                        "start": round(segment["start"] + offset_sec, 2),
+                        "end": round(segment["end"] + offset_sec, 2),
+                        "text": segment["text"]
+                    }
+                    self.committed_segments.append(committed)
+                else:
+                    tentative = [
+                        {
+                            "start": round(s["start"] + offset_sec, 2),
+                            "end": round(s["end"] + offset_sec, 2),
+                            "text": s["text"]
+                        }
+                        for s in segments[i:]
+                    ]
+                    break
+            
+            if self.committed_segments:
+                self.commit_offset = max(
+                    self.commit_offset, int(self.committed_segments[-1]["end"] * sr)
+                )
+            if force and not segments:
+                # A long stretch without speech: drop it from the window
+                self.commit_offset += len(window) - int(config.STREAM_COMMIT_LAG_SEC * sr)
+        
+        segments = self.committed_segments + tentative
+        text = " ".join(s["text"] for s in segments).strip()
+        return text, segments
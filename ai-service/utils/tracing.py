@@ -0,0 +1,60 @@
+import contextlib
+import logging
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Optional OpenTelemetry tracing. With TRACING_ENABLED the pipeline emits one "incident"
+# span per request with a child span per stage, exported over OTLP to a local collector.
+# The SDK is not a hard dependency: without it (or with tracing off) span() is a no-op.
+_tracer = None
+_provider = None
+_initialized = False
+
+def setup():
+    global _tracer, _provider, _initialized
+    if _initialized:
+        return
+    _initialized = True
+    if not config.TRACING_ENABLED:
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logger.warning(
+            "TRACING_ENABLED is set but opentelemetry-sdk / opentelemetry-exporter-otlp are not installed; tracing is off"
+        )
+        return
+    
+    _provider = TracerProvider(resource=Resource.create({"service.name": config.OTEL_SERVICE_NAME}))
+    _provider.add_span_processor(
+        BatchSpanProcessor(OTLPSpanExporter(endpoint=config.OTEL_EXPORTER_OTLP_ENDPOINT, insecure=True))
+    )
+    trace.set_tracer_provider(_provider)
+    _tracer = trace.get_tracer(__name__)
+    logger.info(f"Exporting traces to {config.OTEL_EXPORTER_OTLP_ENDPOINT}")
+
+def shutdown():
+    """Flushes buffered spans."""
+    if _provider is not None:
+        _provider.shutdown()
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """
+    Opens a span as a child of the current one. Works across awaits and asyncio.gather,
+    since the current span lives in a contextvar. Exceptions are recorded on the span.
+    """
+    if not _initialized:
+        setup()
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(
+        name, attributes={k: v for k, v in attributes.items() if v is not None}
+    ) as current:
+        yield current
@@ -0,0 +1,248 @@
+import importlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from config import config
+from utils import metrics
+from utils.resources import shared_memory_name
+
+logger = logging.getLogger(__name__)
+
+# Models loaded by the API process before the pool forks. Forked workers inherit them
+# copy-on-write, so the (read-only) DistilBERT weights are shared, not duplicated.
+_inherited = {}
+# Models owned by the current worker process
+_worker_models = {}
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def pool_size() -> int:
+    """Resolves config.WORKER_POOL_SIZE: 0 disables the pool, "auto" uses one worker per WORKER_THREADS cores."""
+    value = str(config.WORKER_POOL_SIZE).strip().lower()
+    if value == "auto":
+        return max(1, available_cores() // max(1, config.WORKER_THREADS))
+    return max(0, int(value))
+
+def pool_start_method() -> str:
+    """
+    Resolves config.WORKER_START_METHOD. With LAZY_MODEL_LOADING the pool starts while the
+    server is already serving on other threads, which is never safe to fork, so it uses forkserver.
+    """
+    if config.LAZY_MODEL_LOADING and config.WORKER_START_METHOD == "fork":
+        return "forkserver"
+    return config.WORKER_START_METHOD
+
+class SharedWaveform:
+    """
+    Copies a waveform into POSIX shared memory once, so worker processes can map it
+    instead of receiving a pickled copy over the pipe. Use as a context manager;
+    the segment is unlinked on exit, or by the startup sweep if the process dies first.
+    """
+    def __init__(self, waveform: np.ndarray):
+        self.shm = shared_memory.SharedMemory(name=shared_memory_name(), create=True, size=max(waveform.nbytes, 1))
+        np.ndarray(waveform.shape, dtype=np.float32, buffer=self.shm.buf)[:] = waveform
+        self.handle = (self.shm.name, len(waveform))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shm.close()
+        self.shm.unlink()
+
+def _attach(handle: tuple):
+    name, length = handle
+    shm = shared_memory.SharedMemory(name=name)
+    # The API process owns (and unlinks) the segment; stop this process's tracker from claiming it too
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm, np.ndarray((length,), dtype=np.float32, buffer=shm.buf)
+
+def _init_worker(threads: int, names: tuple):
+    """Runs once in every worker process right after it is started."""
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    config.WHISPER_CPU_THREADS = threads
+    config.TORCH_NUM_THREADS = threads
+    metrics.defer()
+    
+    from models.registry import MODEL_SPECS
+    for name in names:
+        model = _inherited.get(name)
+        if model is None:
+            # forkserver workers start from a clean interpreter and load their own copy
+            module_name, class_name = MODEL_SPECS[name]
+            model = getattr(importlib.import_module(module_name), class_name)()
+        elif name == "threat":
+            model.start_batcher()  # batcher thread does not survive fork
+        _worker_models[name] = model
+    if "threat" in _worker_models:
+        _worker_models["threat"].set_threads(threads)
+    
+    # CTranslate2 owns its thread pool, which cannot be forked: every worker loads its own Whisper
+    from models.transcription import TranscriptionService
+    _worker_models["transcription"] = TranscriptionService()
+    
+    if config.MODEL_WARMUP:
+        for model in _worker_models.values():
+            model.warmup()
+    logger.info(f"Model worker {os.getpid()} ready with {threads} threads")
+
+def _worker_info(_=None) -> dict:
+    return {"pid": os.getpid(), "models": sorted(_worker_models)}
+
+def _transcribe(handle: tuple, segments: list, tier: str) -> dict:
+    from models.vad import SpeechMap
+    shm, waveform = _attach(handle)
+    speech_map = None
+    try:
+        speech_map = SpeechMap(waveform, segments) if segments is not None else None
+        return _worker_models["transcription"].transcribe(waveform, tier, speech_map), metrics.drain()
+    finally:
+        del speech_map, waveform
+        shm.close()
+
+def _analyze(handle: tuple, segments: list, pitch_engine: str) -> dict:
+    from models.vad import SpeechMap
+    shm, waveform = _attach(handle)
+    speech_map = None
+    try:
+        speech_map = SpeechMap(waveform, segments) if segments is not None else None
+        return _worker_models["emotion"].analyze(waveform, pitch_engine, speech_map), metrics.drain()
+    finally:
+        del speech_map, waveform
+        shm.close()
+
+def _classify(text: str, remember: bool) -> dict:
+    return _worker_models["threat"].classify(text, remember), metrics.drain()
+
+class ModelWorkerPool:
+    """
+    Pool of model-serving processes fed over IPC by the API process.
+    Each worker runs Whisper, the stress detector and DistilBERT with its own
+    torch / CTranslate2 thread budget, so CPU inference is no longer serialized
+    behind one interpreter's GIL. Waveforms travel through shared memory.
+    """
+    def __init__(self, inherited: dict, size: int = None, threads: int = None, start_method: str = None):
+        self.size = size or pool_size()
+        self.threads = threads or config.WORKER_THREADS
+        self.start_method = start_method or pool_start_method()
+        self.names = tuple(inherited)
+        _inherited.clear()
+        if self.start_method == "fork":
+            _inherited.update(inherited)
+        self._lock = threading.Lock()
+        self._pool = self._create(self.start_method)
+        self.restarts = 0
+        self.started_sec = None
+
+    def _create(self, start_method: str) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.size,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_worker,
+            initargs=(self.threads, self.names)
+        )
+
+    def start(self):
+        """
+        Starts every worker and waits until one has loaded and warmed its models.
+        With fork, call it from the process's only thread: a forked worker inherits every
+        lock as it was, including ones held by threads it does not have. The service and the
+        replay CLI call it on the main thread, after the model-loader threads have been joined
+        and before the port binds or any background thread starts.
+        """
+        start = time.perf_counter()
+        self._pool.submit(_worker_info).result()
+        self.started_sec = round(time.perf_counter() - start, 3)
+        logger.info(
+            f"Model worker pool started: {self.size} workers x {self.threads} threads "
+            f"({self.start_method}) in {self.started_sec}s"
+        )
+
+    def _call(self, fn, *args):
+        pool = self._pool
+        try:
+            result, observations = pool.submit(fn, *args).result()
+        except BrokenProcessPool as e:
+            self._restart(pool)
+            raise ValueError(f"Model worker process died ({e}); the worker pool is restarting")
+        # Metrics observed in the worker since its last result
+        metrics.replay(observations)
+        return result
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        """Replaces a pool whose worker was killed (e.g. out of memory); the executor never recovers on its own."""
+        with self._lock:
+            if self._pool is not broken:
+                return  # a concurrent caller already replaced it
+            # By now the pipeline, batcher and watcher threads are running, so the replacements start
+            # from a clean forkserver interpreter and load their own models instead of forking this process
+            self._pool = self._create("forkserver")
+            self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        logger.error(f"Model worker pool broken, restarted it with forkserver workers (restart {self.restarts})")
+        self._pool.submit(_worker_info)  # start loading models before the next incident arrives
+
+    def transcribe(self, waveform: np.ndarray, tier: str = None, speech_map=None) -> dict:
+        segments = speech_map.segments if speech_map is not None else None
+        with SharedWaveform(waveform) as shared:
+            return self._call(_transcribe, shared.handle, segments, tier)
+
+    def analyze(self, waveform: np.ndarray, pitch_engine: str = None, speech_map=None) -> dict:
+        segments = speech_map.segments if speech_map is not None else None
+        with SharedWaveform(waveform) as shared:
+            return self._call(_analyze, shared.handle, segments, pitch_engine)
+
+    def classify(self, text: str, remember: bool = True) -> dict:
+        return self._call(_classify, text, remember)
+
+    def report(self) -> dict:
+        return {
+            "workers": self.size,
+            "threads_per_worker": self.threads,
+            "start_method": self.start_method,
+            "restarts": self.restarts,
+            "available_cores": available_cores(),
+            "start_sec": self.started_sec
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+class RemoteTranscriptionInfo:
+    """
+    Version info and tier selection for the pooled Whisper models, which are never loaded
+    in the API process. Tier latencies are learned here, from the stage times seen by the pipeline.
+    """
+    def __init__(self):
+        from models.whisper_tiers import WhisperTierManager
+        self.tiers = WhisperTierManager()
+        self.version = self.tiers.version_for()
+        self.version_for = self.tiers.version_for
+        self.select_tier = self.tiers.select
+        self.observe_tier = self.tiers.observe
+
+class PooledModel:
+    """
+    Stands in for a model object in the API process: inference methods are sent to the
+    worker pool, everything else (versions, settings, cheap helpers) is served locally.
+    """
+    REMOTE_METHODS = {"transcribe", "analyze", "classify"}
+
+    def __init__(self, pool: ModelWorkerPool, local):
+        self._pool = pool
+        self._local = local
+
+    def __getattr__(self, name):
+        if name in self.REMOTE_METHODS:
+            return getattr(self._pool, name)
+        return getattr(self._local, name)
@@ -22,9 +22,12 @@ required_files = [
     "Dockerfile",
     "requirements.txt",
     "utils/audio_loader.py",
+    "utils/audio_decoder.py",
+    "utils/pipeline.py",
     "models/transcription.py",
     "models/emotion.py",
     "models/threat_classifier.py",
+    "models/threat_backends.py",
     "models/fusion.py"
 ]
 missing = []